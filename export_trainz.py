@@ -2,7 +2,7 @@
 
 __author__ = ["uschi0815"]
 __url__ = ("https://sourceforge.net/projects/blenderextrainz/")
-__version__ = "0.96"
+__version__ = "0.97"
 __bpydoc__ = """\
 
 Blender Exporter for Trainz
@@ -65,6 +65,78 @@ legal:
 #   see use_alpha - check
 
 
+### changes in 0.97
+# - animation export: a dependency analysis decides for every Trainz Bone if
+#   its parents, constraints or drivers change within the frame range; static
+#   bones are sampled only once
+# - objects sharing one mesh (linked duplicates) reuse the extracted
+#   topology, uvs, material ids and bone influences; only the world
+#   transformation is applied per object
+# - new option "ApplyModifiers" exports meshes with modifiers applied; the
+#   extracted meshes are cached by content, so unchanged objects skip the
+#   evaluation on repeated exports
+# - polygons are triangulated from bulk read loop arrays (ngons by ear
+#   clipping) instead of calling calc_tessface on every export
+# - bone weights are collected once per mesh in a sparse weight matrix used
+#   by the influence check and the export; in "correct" mode vertices with
+#   more than 4 influences keep only the 4 strongest ones (renormalized)
+# - diagnostic vertex groups are removed and filled by the data API
+#   (one call per group) instead of operators
+# - material usage and surfaceless polygons are determined from bulk read
+#   polygon arrays
+# - all checks are declared as validation rules sharing one traversal of the
+#   collected data; every rule can be switched off in export_trainz.cfg
+#   ("Check<Rule> = False") and its runtime is logged
+# - new option "ValidateOnly" runs the checks without writing export files
+#   and writes a JSON report; objects and materials which passed a rule are
+#   not checked again by that rule until their content changes; the scene
+#   is left unchanged, "ErrorCorrection = correct" collects instead
+# - image files are checked concurrently and only their headers are read;
+#   the results are kept in export_trainz_textures.json and reused as long
+#   as mtime and size of a file don't change
+# - the estimated texture memory (mip mapped, DXT compressed) is logged;
+#   non power of two and oversized images are reported
+# - new option "PackageTextures" copies all images into the asset folder,
+#   resizes them to a power of two (written as TGA), writes their
+#   texture.txt files and exports the packaged paths; unchanged images are
+#   skipped
+# - identical image files (content hash, cached with the texture checks)
+#   are exported under one canonical path; the savings are logged
+# - new option "AtlasTextures" packs the images of compatible onetex
+#   materials (same properties, uvs inside the image) into texture atlases
+#   (each image with a gutter of repeated edge pixels) and merges those
+#   materials
+# - new option "MergeMaterials" exports materials which differ only by name
+#   (same decoration, properties and textures) as one material
+# - "LODRatios" in export_trainz.cfg (e.g. "0.5, 0.25") writes an XML/IM per
+#   level of detail, decimated by quadric error edge collapses which keep
+#   uv seams, material boundaries and bone influences
+# - new option "OptimizeVertexCache" reorders the triangles of each material
+#   run for the vertex cache (Forsyth); the ACMR before and after is logged
+# - new options "GroupByMaterial" and "MergeStaticObjects" write the
+#   triangles in contiguous runs per material and object/bone; the estimated
+#   draw calls are logged
+# - new option "ShadowRatio" writes a welded, decimated shadow mesh with one
+#   material and the skeleton of the asset (0 = no shadow mesh)
+# - new options "ChunkSize" and "ChunkTriangles" split static geometry into
+#   separately written meshes for culling; bounds and sizes are logged
+# - new option "BonePalette" splits the triangles of each material into
+#   groups using at most that many bones, each written as its own material
+#   (0 = no limit)
+# - the unique vertices of each material group are counted before writing;
+#   new option "VertexLimit" splits larger ones into separately written
+#   material groups (default 65535, 0 = no limit)
+# - new option "RemoveRedundantTriangles" removes triangles without area at
+#   the written precision and exact duplicates, with counts per object
+# - new option "BudgetReport" writes triangles, vertices, materials, draw
+#   calls, bones, keyframes, texture memory and file sizes per asset and
+#   object as JSON and HTML; "BudgetProfile" (traincar, scenery) and
+#   "BudgetLimits" (e.g. "triangles=20000, draw_calls=16") set limits
+#   which are logged as warnings, or errors beyond twice the limit
+# - new option "CompactNumbers" writes the vertices without trailing zeros;
+#   "NormalDigits" and "UVDigits" may reduce the places of normals and uvs
+
+
 ### changes in 0.96
 # - Blenders texture option Image:Use Alpha is now also utilized to trigger
 #   the Alpha= line in texture.txt file
@@ -99,7 +171,7 @@ bl_info = {
     "name": "TRAINZ Exporter",
     "description": "Export objects as XML/IM/KIN file to import into Trainz",
     "author": "uschi0815",
-    "version": (0, 96),
+    "version": (0, 97),
     "blender": (2, 59, 4),
     "api": 40968,
     "location": "File > Export",
@@ -113,6 +185,16 @@ import os
 import sys
 import time
 import math
+import collections
+import array
+import hashlib
+import heapq
+import json
+import re
+import html
+import struct
+import zlib
+import concurrent.futures
 import datetime
 import mathutils
 import subprocess
@@ -133,11 +215,13 @@ blender_version = (bpy.app.version[0] * pow(10, 6) +
 # state values
 class STATUS:
     OK, WARNING, ERROR = range(3)
+    NAMES = ('OK', 'WARNING', 'ERROR')
 
 
 # log severities
 class LOG:
     INFO, WARNING, ERROR, ADDINFO = range(4)
+    NAMES = ('INFO', 'WARNING', 'ERROR', 'ADDINFO')
 
 
 # attachement- und bone recognition for trainz
@@ -195,6 +279,52 @@ class SAFE:
     ACTIVEOBJECT = 'a'
 
 
+# validation rule names
+class RULE:
+    ROOT_BONE = 'RootBone'
+    SURFACELESS_POLYGONS = 'SurfacelessPolygons'
+    UV_LAYERS = 'UVLayers'
+    DOUBLE_SIDED = 'DoubleSided'
+    MATERIAL_NAMES = 'MaterialNames'
+    MATERIAL_SIDES = 'MaterialSides'
+    TEXTURES = 'Textures'
+    TEXTURE_MAPPING = 'TextureMapping'
+    HIERARCHY = 'Hierarchy'
+    INFLUENCES = 'Influences'
+    NAMES = 'Names'
+    TEXTURE_BUDGET = 'TextureBudget'
+
+
+# what a validation rule is applied to
+class SCOPE:
+    SCENE = 'scene'  # once per export
+    OBJECT = 'object'  # every exported mesh object
+    MATERIAL = 'material'  # every exported material
+
+
+# validation rules in order of execution: (name, scope, method)
+VALIDATION_RULES = (
+    (RULE.ROOT_BONE, SCOPE.SCENE, 'rule_root_bone'),
+    (RULE.SURFACELESS_POLYGONS, SCOPE.OBJECT, 'rule_surfaceless_polygons'),
+    (RULE.UV_LAYERS, SCOPE.OBJECT, 'rule_uv_layers'),
+    (RULE.DOUBLE_SIDED, SCOPE.OBJECT, 'rule_double_sided'),
+    (RULE.MATERIAL_NAMES, SCOPE.SCENE, 'rule_material_names'),
+    (RULE.MATERIAL_SIDES, SCOPE.SCENE, 'rule_material_sides'),
+    (RULE.TEXTURES, SCOPE.MATERIAL, 'rule_textures'),
+    (RULE.TEXTURE_MAPPING, SCOPE.MATERIAL, 'rule_texture_mapping'),
+    (RULE.HIERARCHY, SCOPE.OBJECT, 'rule_hierarchy'),
+    (RULE.INFLUENCES, SCOPE.OBJECT, 'rule_influences'),
+    (RULE.NAMES, SCOPE.SCENE, 'rule_names'),
+    (RULE.TEXTURE_BUDGET, SCOPE.SCENE, 'rule_texture_budget'))
+
+
+# validation data dictionary keys
+class VD:
+    TEXTURE_SLOTS = 't'  # enabled texture slots per exported material
+    MATERIAL_OBJECTS = 'o'  # mesh objects per exported material
+    BONE_NAMES = 'b'  # names of all trainz bones
+
+
 # configuration
 class CONFIG:
     selection_method = SELECTIONMETHOD.VISIBLE
@@ -207,10 +337,44 @@ class CONFIG:
     write_log = True
     only_xml = False
     error_correction = ERRORHANDLING.COLLECT
+    apply_modifiers = False
+    rules = dict()  # validation rule name -> enabled
+    validate_only = False
+    package_textures = False
+    atlas_textures = False
+    merge_materials = False
+    lod_ratios = ()  # triangle ratio per level of detail
+    optimize_vertex_cache = False
+    group_by_material = False
+    merge_static_objects = False
+    shadow_ratio = 0.0
+    chunk_size = 0.0
+    chunk_triangles = 0
+    bone_palette = 0
+    vertex_limit = 65535
+    budget_report = False
+    budget_profile = 'none'  # key of BUDGET_PROFILES
+    budget_limits = dict()  # limit per budget report total
+    compact_numbers = False
+    normal_digits = 4  # places of compact normals (up to FPM.NDIGITS)
+    uv_digits = 4  # places of compact uvs (up to FPM.NDIGITS)
+    remove_redundant_triangles = False
     FILENAME = "export_trainz.cfg"
     LOGFILE_EXT = ".log"
     TMI_LOGFILE_EXT = "_TMI.log"
+    BUDGETFILE_EXT = "_budget"
+    IMFILE_EXT = ".im"
     XMLFILE_EXT = ".xml"
+    LOD_SUFFIX = "_lod%i"
+    SHADOW_SUFFIX = "_shadow"
+    CHUNK_SUFFIX = "_chunk%i"
+    SHADOW_DETAIL_SIZE = 0.05  # smallest shadow part relative to the mesh
+    VERTEX_CACHE_SIZE = 32  # entries of the simulated vertex cache
+    REPORTFILE_EXT = "_validation.json"
+    TEXTURE_CACHE_FILENAME = "export_trainz_textures.json"
+    TEXTURE_THREADS = 8  # concurrent file checks (slow network shares)
+    PACKAGE_MANIFEST_FILENAME = "export_trainz_package.json"
+    ATLAS_PADDING = 4  # gutter pixels around atlas images (one DXT block)
 
 
 # option names
@@ -225,6 +389,28 @@ class OPTION:
     ONLY_XML = 'OnlyXML'
     ERROR_CORRECTION = 'ErrorCorrection'
     SELECTION_METHOD = 'SelectionMethod'
+    APPLY_MODIFIERS = 'ApplyModifiers'
+    CHECK_PREFIX = 'Check'  # followed by the validation rule name
+    VALIDATE_ONLY = 'ValidateOnly'
+    PACKAGE_TEXTURES = 'PackageTextures'
+    ATLAS_TEXTURES = 'AtlasTextures'
+    MERGE_MATERIALS = 'MergeMaterials'
+    LOD_RATIOS = 'LODRatios'
+    OPTIMIZE_VERTEX_CACHE = 'OptimizeVertexCache'
+    GROUP_BY_MATERIAL = 'GroupByMaterial'
+    MERGE_STATIC_OBJECTS = 'MergeStaticObjects'
+    SHADOW_RATIO = 'ShadowRatio'
+    CHUNK_SIZE = 'ChunkSize'
+    CHUNK_TRIANGLES = 'ChunkTriangles'
+    BONE_PALETTE = 'BonePalette'
+    VERTEX_LIMIT = 'VertexLimit'
+    BUDGET_REPORT = 'BudgetReport'
+    BUDGET_PROFILE = 'BudgetProfile'
+    BUDGET_LIMITS = 'BudgetLimits'
+    COMPACT_NUMBERS = 'CompactNumbers'
+    NORMAL_DIGITS = 'NormalDigits'
+    UV_DIGITS = 'UVDigits'
+    REMOVE_REDUNDANT_TRIANGLES = 'RemoveRedundantTriangles'
 
 
 # config file
@@ -240,7 +426,35 @@ class CONFIGFILE:
          OPTION.EXPORT_DIFFUSE_AS_AMBIENT: CONFIG.export_diffuse_as_ambient,
          OPTION.EXPORT_SCALED: CONFIG.export_scaled,
          OPTION.EXPORT_ANIM: CONFIG.export_animation,
-         OPTION.EXPORT_MESH: CONFIG.export_mesh})
+         OPTION.EXPORT_MESH: CONFIG.export_mesh,
+         OPTION.APPLY_MODIFIERS: CONFIG.apply_modifiers,
+         OPTION.VALIDATE_ONLY: CONFIG.validate_only,
+         OPTION.PACKAGE_TEXTURES: CONFIG.package_textures,
+         OPTION.ATLAS_TEXTURES: CONFIG.atlas_textures,
+         OPTION.MERGE_MATERIALS: CONFIG.merge_materials,
+         OPTION.LOD_RATIOS: ', '.join(str(r) for r in CONFIG.lod_ratios),
+         OPTION.OPTIMIZE_VERTEX_CACHE: CONFIG.optimize_vertex_cache,
+         OPTION.GROUP_BY_MATERIAL: CONFIG.group_by_material,
+         OPTION.MERGE_STATIC_OBJECTS: CONFIG.merge_static_objects,
+         OPTION.SHADOW_RATIO: CONFIG.shadow_ratio,
+         OPTION.CHUNK_SIZE: CONFIG.chunk_size,
+         OPTION.CHUNK_TRIANGLES: CONFIG.chunk_triangles,
+         OPTION.BONE_PALETTE: CONFIG.bone_palette,
+         OPTION.VERTEX_LIMIT: CONFIG.vertex_limit,
+         OPTION.BUDGET_REPORT: CONFIG.budget_report,
+         OPTION.BUDGET_PROFILE: CONFIG.budget_profile,
+         OPTION.BUDGET_LIMITS: '',
+         OPTION.COMPACT_NUMBERS: CONFIG.compact_numbers,
+         OPTION.NORMAL_DIGITS: CONFIG.normal_digits,
+         OPTION.UV_DIGITS: CONFIG.uv_digits,
+         OPTION.REMOVE_REDUNDANT_TRIANGLES: CONFIG.remove_redundant_triangles})
+
+
+## every validation rule is enabled by default
+for _rule in VALIDATION_RULES:
+    CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                          OPTION.CHECK_PREFIX + _rule[0],
+                          str(True))
 
 
 # constants for floating point math
@@ -251,6 +465,78 @@ class FPM:
     LIMIT = 10 ** - NDIGITS  # distance within "double" vertices will welded
 
 
+# polygon array dictionary keys (faces before 2.63)
+class PA:
+    MATERIAL = 'm'  # material index per polygon
+    NORMAL = 'n'  # normal components, 3 per polygon
+    AREA = 'a'  # area per polygon
+    VERTICES = 'v'  # tuple of vertex indices per polygon
+
+
+# texture info dictionary keys
+class TI:
+    EXISTS = 'e'
+    MTIME = 'm'  # modification time of the image file
+    SIZE = 's'  # size of the image file
+    FORMAT = 'f'  # PNG, TGA, BMP or JPEG; missing if not recognized
+    WIDTH = 'w'
+    HEIGHT = 'h'
+    BITS = 'b'  # bits per pixel
+    ALPHA = 'a'  # image has an alpha plane
+    HASH = 'c'  # content hash of the image file
+
+
+# texture packaging results
+class PACKAGE:
+    SKIPPED = 'skipped'  # unchanged since the last packaging
+    COPIED = 'copied'
+    CONVERTED = 'converted'  # resized and written as TGA
+    NOT_RESIZED = 'not resized'  # copied, format unknown to the resampler
+
+
+# limits given by Trainz
+class TRAINZLIMIT:
+    INFLUENCES = 4  # bone influences (streams) per vertex
+    TEXTURE_SIZE = 2048  # largest texture width or height
+
+
+# budget report keys
+class BUDGET:
+    TRIANGLES = 'triangles'
+    VERTICES = 'vertices'
+    MATERIALS = 'materials'
+    DRAW_CALLS = 'draw_calls'
+    BONES = 'bones'
+    KEYFRAMES = 'keyframes'
+    TEXTURE_MEMORY = 'texture_memory'
+    OUTPUT_SIZE = 'output_size'
+    NONE = 'none'
+    ERROR_FACTOR = 2.0  # a budget exceeded by this factor is an error
+
+
+# budget limits per kind of asset
+BUDGET_PROFILES = {
+    BUDGET.NONE: {},
+    'traincar': {BUDGET.TRIANGLES: 30000,
+                 BUDGET.VERTICES: 40000,
+                 BUDGET.MATERIALS: 24,
+                 BUDGET.DRAW_CALLS: 32,
+                 BUDGET.BONES: 64,
+                 BUDGET.TEXTURE_MEMORY: 16 * 1024 * 1024},
+    'scenery': {BUDGET.TRIANGLES: 5000,
+                BUDGET.VERTICES: 8000,
+                BUDGET.MATERIALS: 8,
+                BUDGET.DRAW_CALLS: 8,
+                BUDGET.BONES: 16,
+                BUDGET.TEXTURE_MEMORY: 4 * 1024 * 1024}}
+
+
+# weight matrix dictionary keys
+class WM:
+    ROWS = 'r'  # normalized (bone id, weight) tuples per vertex
+    OVERINFLUENCED = 'o'  # vertices with too much bone influences
+
+
 # material dictionary keys
 class MAT:
     MATERIAL = 'm'
@@ -269,6 +555,7 @@ class AB:
     STARTFRAME = 's'
     ENDFRAME = 'e'
     FPS = 'f'
+    ANIMATED = 'a'  # ids of trainz bones moving within the frame range
 
 
 # indentations
@@ -286,7 +573,38 @@ class OBJ:
     LOC = 'l'  # object location
     ROT = 'r'  # object rotation
     SCA = 's'  # object scale
-    UVL = 'u'  # active uv-layer
+
+
+# extracted mesh data dictionary keys; triangle corner lists hold
+# three entries per triangle
+class MD:
+    CO = 'c'  # local vertex coordinates
+    GROUPS = 'g'  # (vertex group index, weight) tuples per vertex
+    TRI_MAT = 'm'  # material slot index per triangle
+    TRI_VERT = 'v'  # vertex index per triangle corner
+    NO = 'n'  # local normal per triangle corner
+    UV = 'u'  # texture coordinates per triangle corner (v inverted)
+    UV_STR = 's'  # texcoord strings per triangle corner (created on demand)
+    KEY = 'k'  # content key the data is cached with
+
+
+# triangle list dictionary keys
+class TL:
+    VERTICES = 'v'  # welded (position, normal, uv, influence) strings
+    POSITIONS = 'p'  # world location per vertex
+    TRIANGLES = 't'  # [material id, vertex id, vertex id, vertex id]
+    OBJECTS = 'o'  # index into self.meshes per triangle
+    PALETTES = 'b'  # bone palette per triangle (optional)
+    MATERIALS = 'm'  # written materials if not the exported ones (optional)
+    SPLITS = 's'  # part of an oversized draw call per triangle (optional)
+
+
+# exported material dictionary keys
+class EM:
+    NAME = 'n'  # decorated material name
+    PROPS = 'p'  # values of STRINGF.MATERIAL_PROPS except name and id
+    TEXTURES = 't'  # values of STRINGF.TEXTURE per texture node
+    MATERIALS = 'm'  # indices of the merged entries of self.materials
 
 
 # format strings
@@ -301,6 +619,7 @@ class STRINGF:
     TRI_START = IND3 + "<triangle><materialId>%i</materialId>"
     VERTEX = "<vertex>%(p)s%(b)s</vertex>"
     TRI_END = "%s</triangle>\n"
+    BLEND_VALUE = re.compile(r"(?<=\">)[-0-9.]+(?=</blend>)")
     ATTACHMENT = IND3 + ("<attachment>"
                          "<name>{n}</name>"
                          "<position>{p}</position>"
@@ -412,6 +731,14 @@ class TMI:
     FILENAME = "TrainzMeshImporter.exe"
 
 
+# data kept between exports as long as the script stays loaded;
+# all keys are content hashes, so entries never get outdated
+class CACHE:
+    MESH_DATA = dict()  # extracted mesh data
+    VALIDATION = set()  # (rule, content key) of results without messages
+    TEXTURES = None  # texture info per absolute path, loaded on demand
+
+
 #### global functions #########################################################
 
 def convert_forbidden_chars(s):
@@ -475,6 +802,32 @@ def get_autosmooth_normal(mesh, fop, mesh_vi):
     return result
 
 
+def transform_locations(obj_prop, coords):
+    '''return the local coordinates coords transformed into world space'''
+    loc = obj_prop[OBJ.LOC]
+    rot = obj_prop[OBJ.ROT]
+    sx, sy, sz = obj_prop[OBJ.SCA]
+    ## multiplication order changed with version 2.59.0
+    if blender_version < 2059000:
+        return [loc + (mathutils.Vector([c[0] * sx, c[1] * sy, c[2] * sz]) *
+                       rot)
+                for c in coords]
+    else:
+        return [loc + mathutils.Vector(
+            rot * mathutils.Vector([c[0] * sx, c[1] * sy, c[2] * sz]))
+            for c in coords]
+
+
+def transform_normals(obj_prop, normals):
+    '''return the local normals rotated into world space'''
+    rot = obj_prop[OBJ.ROT]
+    ## multiplication order changed with version 2.59.0
+    if blender_version < 2059000:
+        return [mathutils.Vector(n) * rot for n in normals]
+    else:
+        return [mathutils.Vector(rot * mathutils.Vector(n)) for n in normals]
+
+
 def tupel_to_float_str(t):
     '''return the items of t as string of rounded values'''
     result = []
@@ -483,41 +836,1424 @@ def tupel_to_float_str(t):
     return ', '.join(result)
 
 
+def compact_float_str(s, ndigits):
+    '''return the comma separated numbers of s rounded to ndigits places
+    without trailing zeros; integral values are written as integers'''
+    result = []
+    for value in s.split(','):
+        value = "{:.{p}f}".format(float(value), p=ndigits)
+        if '.' in value:
+            value = value.rstrip('0').rstrip('.')
+        if value == '-0':
+            value = '0'
+        result.append(value)
+    return ', '.join(result)
+
+
 def quat_to_jet_quat_str(q):
     '''return a Blender quaternion(w,x,y,z) rounded as
     quaternion string in Jet order(x,y,z,w)'''
     return STRINGF.Q_TO_JQ.format(q.x, q.y, q.z, q.w)
 
 
-def add_fops_to_vertexgroup(group_name, objct, foplist):
-    '''add vertices of FaceOrPolylist to vertexgroup group_name'''
-    #print("VG_NAME.ERROR_NO_MATERIAL_ASSIGNED:\t",
-    #      VG_NAME.ERROR_NO_MATERIAL_ASSIGNED)
-    #print("group_name:\t", group_name)
-    #print("objct:\t", objct)
-    #print("foplist:\t", foplist)
-
-    ## create or return the vertexgroup group_name
+def read_image_header(filepath):
+    '''return format, size, bits per pixel and presence of an alpha plane
+    of a PNG, TGA, BMP or JPEG file by reading its header only; None if
+    the format isn't recognized'''
+    with open(filepath, 'rb') as f:
+        data = f.read(32)
+        if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR':
+            width, height, bit_depth, color_type = (
+                struct.unpack('>IIBB', data[16:26]))
+            channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(color_type, 4)
+            return {TI.FORMAT: 'PNG',
+                    TI.WIDTH: width,
+                    TI.HEIGHT: height,
+                    TI.BITS: channels * bit_depth,
+                    TI.ALPHA: color_type in (4, 6)}
+        if data[:2] == b'BM' and len(data) >= 30:
+            width, height, planes, bits = (
+                struct.unpack('<iiHH', data[18:30]))
+            return {TI.FORMAT: 'BMP',
+                    TI.WIDTH: width,
+                    TI.HEIGHT: abs(height),
+                    TI.BITS: bits,
+                    TI.ALPHA: bits == 32}
+        if data[:2] == b'\xff\xd8':
+            ## walk the segments up to the first start of frame
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xff:
+                    return None
+                while marker[1] == 0xff:  # fill bytes
+                    marker = marker[1:] + f.read(1)
+                length = struct.unpack('>H', f.read(2))[0]
+                if (0xc0 <= marker[1] <= 0xcf and
+                        marker[1] not in (0xc4, 0xc8, 0xcc)):
+                    precision, height, width, components = (
+                        struct.unpack('>BHHB', f.read(6)))
+                    return {TI.FORMAT: 'JPEG',
+                            TI.WIDTH: width,
+                            TI.HEIGHT: height,
+                            TI.BITS: precision * components,
+                            TI.ALPHA: False}
+                f.seek(length - 2, 1)
+        ## TGA has no signature, so we trust the extension
+        if filepath.lower().endswith('.tga') and len(data) >= 18:
+            image_type = data[2]
+            width, height, bits, descriptor = (
+                struct.unpack('<HHBB', data[12:18]))
+            if image_type in (1, 2, 3, 9, 10, 11):
+                return {TI.FORMAT: 'TGA',
+                        TI.WIDTH: width,
+                        TI.HEIGHT: height,
+                        TI.BITS: bits,
+                        TI.ALPHA: bits == 32 or (descriptor & 0x0f) > 0}
+    return None
+
+
+def get_texture_info(filepath, cached):
+    '''stat the image file filepath and return its texture info; header
+    and content hash are only read if cached doesn't match the files mtime
+    and size'''
     try:
-        vertex_group = objct.vertex_groups[group_name]
-        #print("vertex group gab's schon")
-    except:
-        vertex_group = objct.vertex_groups.new(name=group_name)
-        #print("vertex group neu angelegt")
-    ## append vertices of polylist to found/created vertexgroup
-    for fop in foplist:
-        vertex_group.add(tuple(fop.vertices), 0.0, 'ADD')
+        st = os.stat(filepath)
+    except OSError:
+        return {TI.EXISTS: False}
+    if (cached is not None and
+            cached.get(TI.MTIME) == st.st_mtime and
+            cached.get(TI.SIZE) == st.st_size and
+            TI.HASH in cached):
+        return cached
+    info = {TI.EXISTS: True,
+            TI.MTIME: st.st_mtime,
+            TI.SIZE: st.st_size}
+    try:
+        header = read_image_header(filepath)
+        h = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        info[TI.HASH] = h.hexdigest()
+    except (IOError, OSError, struct.error):
+        header = None
+    if header is not None:
+        info.update(header)
+    return info
+
+
+def load_texture_cache():
+    '''read the persistent texture cache once per session'''
+    if CACHE.TEXTURES is None:
+        CACHE.TEXTURES = dict()
+        try:
+            with open(SCRIPT.PATH + CONFIG.TEXTURE_CACHE_FILENAME,
+                      mode='r', encoding='utf-8') as f:
+                CACHE.TEXTURES = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+    return CACHE.TEXTURES
 
 
-def add_vertex_to_vertexgroup(group_name, objct, vertex_id):
-    '''add vertices of facelist to vertexgroup group_name'''
-    ## create or return the vertexgroup group_name
+def save_texture_cache():
+    '''write the texture cache (existing files only) to disk'''
     try:
-        vertex_group = objct.vertex_groups[group_name]
-    except:
+        with open(SCRIPT.PATH + CONFIG.TEXTURE_CACHE_FILENAME,
+                  mode='w', encoding='utf-8') as f:
+            json.dump(dict((p, i) for p, i in CACHE.TEXTURES.items()
+                           if i[TI.EXISTS]), f, indent=1, sort_keys=True)
+    except (IOError, OSError):
+        pass
+
+
+def get_error_correction():
+    '''return the error handling of the checks; a validation only run
+    never changes the scene, so it collects instead of correcting'''
+    if (CONFIG.validate_only and
+            CONFIG.error_correction == ERRORHANDLING.CORRECT):
+        return ERRORHANDLING.COLLECT
+    return CONFIG.error_correction
+
+
+def get_texture_slots(material):
+    '''return the enabled texture slots of material'''
+    return [ts for i, ts in enumerate(material.texture_slots)
+            if material.use_textures[i] and (ts is not None)]
+
+
+def uses_alpha(tex_slot, trainz_tex_type):
+    '''True if Trainz shall use the alpha plane of the slots image'''
+    # change from 0.95 to 0.96
+    #return trainz_tex_type == TTT.OPACITY
+    return ((trainz_tex_type == TTT.OPACITY) or
+            tex_slot.texture.image.use_alpha)
+
+
+def get_texture_maps(tex_slot):
+    '''return the (Trainz texture type, amount) of every texture node the
+    image texture slot is exported as'''
+    maps = []
+    if tex_slot.use_map_ambient:
+        maps.append((TTT.AMBIENT, abs(tex_slot.ambient_factor)))
+    if tex_slot.use_map_color_diffuse and tex_slot.texture_coords == 'UV':
+        maps.append((TTT.DIFFUSE, tex_slot.diffuse_color_factor))
+    if tex_slot.use_map_color_spec:
+        maps.append((TTT.SPECULAR, tex_slot.specular_color_factor))
+    if tex_slot.use_map_specular:
+        maps.append((TTT.SHINE, abs(tex_slot.specular_factor)))
+    if tex_slot.use_map_hardness:
+        maps.append((TTT.SHINESTRENGTH, abs(tex_slot.hardness_factor)))
+    if tex_slot.use_map_emit:
+        maps.append((TTT.SELFILLUM, abs(tex_slot.emit_factor)))
+    if tex_slot.use_map_alpha:
+        maps.append((TTT.OPACITY, abs(tex_slot.alpha_factor)))
+    if tex_slot.use_map_translucency:
+        maps.append((TTT.FILTERCOLOR, abs(tex_slot.translucency_factor)))
+    if tex_slot.use_map_normal:
+        # "abs()"ed and scaled
+        maps.append((TTT.BUMP, abs(tex_slot.normal_factor) / 5.0))
+    # use tex_coordinates to check for a reflection texture
+    if (tex_slot.use_map_color_diffuse and
+            tex_slot.texture_coords == 'REFLECTION'):
+        # the reflection map influences the diffuse color,
+        # so we use diffuse_color_factor
+        maps.append((TTT.REFLECT, tex_slot.diffuse_color_factor))
+    # vvv ???? same as max refraction ???? vvv
+    #if tex_slot.use_map_colortransmission:
+    #    maps.append((TTT.REFRACT, tex_slot.colortransmission_factor))
+    if tex_slot.use_map_displacement:
+        maps.append((TTT.DISPLACEMENT, abs(tex_slot.displacement_factor)))
+    return maps
+
+
+def slot_uses_alpha(tex_slot):
+    '''True if any texture node of the slot uses the alpha plane'''
+    return any(uses_alpha(tex_slot, trainz_tex_type)
+               for trainz_tex_type, amount in get_texture_maps(tex_slot))
+
+
+def get_power_of_two_size(n, limit):
+    '''return the power of two nearest to n, but not larger than limit'''
+    p = 1
+    while p * 2 <= n:
+        p *= 2
+    if n - p > p * 2 - n:
+        p *= 2
+    return min(p, limit)
+
+
+def decode_image(data, extension):
+    '''decode an 8 bit PNG, an uncompressed or RLE TGA or an uncompressed
+    BMP; return width, height, channels (3 or 4) and the RGB(A) pixels top
+    down, None for all other formats'''
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return decode_png(data)
+    if data[:2] == b'BM':
+        return decode_bmp(data)
+    if extension.lower() == '.tga':
+        return decode_tga(data)
+    return None
+
+
+def decode_png(data):
+    '''decode a not interlaced 8 bit gray, RGB or RGBA PNG'''
+    pos = 8
+    idat = []
+    header = None
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        if chunk_type == b'IHDR':
+            header = struct.unpack('>IIBBBBB', chunk)
+        elif chunk_type == b'IDAT':
+            idat.append(chunk)
+        elif chunk_type == b'IEND':
+            break
+        pos += length + 12
+    if header is None:
+        return None
+    width, height, bit_depth, color_type, comp, filt, interlace = header
+    channels = {0: 1, 2: 3, 4: 2, 6: 4}.get(color_type)
+    if bit_depth != 8 or channels is None or interlace != 0:
+        return None
+    raw = zlib.decompress(b''.join(idat))
+    stride = width * channels
+    pixels = bytearray(height * stride)
+    prev = bytearray(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        filter_type = raw[start]
+        line = bytearray(raw[start + 1:start + 1 + stride])
+        if filter_type == 1:
+            for x in range(channels, stride):
+                line[x] = (line[x] + line[x - channels]) & 0xff
+        elif filter_type == 2:
+            for x in range(stride):
+                line[x] = (line[x] + prev[x]) & 0xff
+        elif filter_type == 3:
+            for x in range(stride):
+                a = line[x - channels] if x >= channels else 0
+                line[x] = (line[x] + ((a + prev[x]) >> 1)) & 0xff
+        elif filter_type == 4:
+            for x in range(stride):
+                a = line[x - channels] if x >= channels else 0
+                b = prev[x]
+                c = prev[x - channels] if x >= channels else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                if pa <= pb and pa <= pc:
+                    predictor = a
+                elif pb <= pc:
+                    predictor = b
+                else:
+                    predictor = c
+                line[x] = (line[x] + predictor) & 0xff
+        pixels[y * stride:(y + 1) * stride] = line
+        prev = line
+    ## expand gray (alpha) to RGB(A)
+    if channels < 3:
+        gray = pixels
+        channels += 2
+        pixels = bytearray(width * height * channels)
+        src_channels = channels - 2
+        for c in range(3):
+            pixels[c::channels] = gray[0::src_channels]
+        if channels == 4:
+            pixels[3::4] = gray[1::2]
+    return width, height, channels, pixels
+
+
+def decode_tga(data):
+    '''decode an uncompressed or RLE compressed 24 or 32 bit TGA'''
+    id_length, color_map_type, image_type = data[0], data[1], data[2]
+    width, height, bits, descriptor = struct.unpack('<HHBB', data[12:18])
+    if (color_map_type != 0 or image_type not in (2, 10) or
+            bits not in (24, 32)):
+        return None
+    channels = bits // 8
+    size = width * height * channels
+    pos = 18 + id_length
+    if image_type == 2:
+        pixels = bytearray(data[pos:pos + size])
+    else:
+        pixels = bytearray()
+        while len(pixels) < size:
+            packet = data[pos]
+            count = (packet & 0x7f) + 1
+            if packet & 0x80:
+                pixels += data[pos + 1:pos + 1 + channels] * count
+                pos += 1 + channels
+            else:
+                pixels += data[pos + 1:pos + 1 + count * channels]
+                pos += 1 + count * channels
+        del pixels[size:]
+    ## BGR(A) to RGB(A)
+    pixels[0::channels], pixels[2::channels] = (pixels[2::channels],
+                                                pixels[0::channels])
+    if not descriptor & 0x20:  # bottom up
+        stride = width * channels
+        pixels = bytearray(b''.join(
+            pixels[y * stride:(y + 1) * stride]
+            for y in range(height - 1, -1, -1)))
+    return width, height, channels, pixels
+
+
+def decode_bmp(data):
+    '''decode an uncompressed 24 or 32 bit BMP'''
+    offset = struct.unpack('<I', data[10:14])[0]
+    width, height, planes, bits, compression = (
+        struct.unpack('<iiHHI', data[18:34]))
+    if compression != 0 or bits not in (24, 32):
+        return None
+    channels = bits // 8
+    stride = width * channels
+    row_size = ((bits * width + 31) // 32) * 4
+    rows = [data[offset + y * row_size:offset + y * row_size + stride]
+            for y in range(abs(height))]
+    if height > 0:  # bottom up
+        rows.reverse()
+    pixels = bytearray(b''.join(rows))
+    pixels[0::channels], pixels[2::channels] = (pixels[2::channels],
+                                                pixels[0::channels])
+    return width, abs(height), channels, pixels
+
+
+def pad_image(width, height, channels, pixels, padding):
+    '''return the pixels grown by padding pixels on every side, the gutter
+    repeating the edge pixels (no bleeding of neighbours into the mip maps
+    or filtered samples of an atlas)'''
+    row_size = width * channels
+    rows = []
+    for row in range(height):
+        line = pixels[row * row_size:(row + 1) * row_size]
+        first = line[:channels]
+        last = line[-channels:]
+        rows.append(first * padding + line + last * padding)
+    rows = [rows[0]] * padding + rows + [rows[-1]] * padding
+    return bytearray(b''.join(rows))
+
+
+def encode_tga(width, height, channels, pixels):
+    '''encode RGB(A) pixels (top down) as uncompressed TGA'''
+    bgr = bytearray(pixels)
+    bgr[0::channels], bgr[2::channels] = (pixels[2::channels],
+                                          pixels[0::channels])
+    descriptor = 0x20 | (8 if channels == 4 else 0)  # top down
+    return (struct.pack('<BBBHHBHHHHBB', 0, 0, 2, 0, 0, 0, 0, 0,
+                        width, height, channels * 8, descriptor) +
+            bytes(bgr))
+
+
+def get_resample_taps(src_size, dst_size):
+    '''return the (source index, weight) pairs of a triangle filter for
+    every destination pixel'''
+    scale = float(src_size) / dst_size
+    support = max(scale, 1.0)
+    taps = []
+    for i in range(dst_size):
+        center = (i + 0.5) * scale - 0.5
+        weights = []
+        for j in range(int(math.floor(center - support)) + 1,
+                       int(math.ceil(center + support))):
+            w = 1.0 - abs(j - center) / support
+            if w > 0.0:
+                weights.append((min(max(j, 0), src_size - 1), w))
+        total = sum(w for j, w in weights)
+        taps.append([(j, w / total) for j, w in weights])
+    return taps
+
+
+def resample_image(width, height, channels, pixels, new_width, new_height):
+    '''scale the pixels to new_width x new_height (separable triangle
+    filter, pure python)'''
+    x_taps = get_resample_taps(width, new_width)
+    y_taps = get_resample_taps(height, new_height)
+    ## horizontal pass, one list of floats per row and channel
+    rows = []
+    for y in range(height):
+        row = pixels[y * width * channels:(y + 1) * width * channels]
+        rows.append([[sum(src[j] * w for j, w in taps) for taps in x_taps]
+                     for src in [row[c::channels] for c in range(channels)]])
+    ## vertical pass
+    result = bytearray(new_width * new_height * channels)
+    for y, taps in enumerate(y_taps):
+        line_start = y * new_width * channels
+        for c in range(channels):
+            columns = [rows[j][c] for j, w in taps]
+            weights = [w for j, w in taps]
+            result[line_start + c:line_start + new_width * channels:
+                   channels] = bytearray(
+                       min(255, max(0, int(sum(col[x] * w for col, w in
+                                               zip(columns, weights)) +
+                                           0.5)))
+                       for x in range(new_width))
+    return result
+
+
+def package_texture(source, folder, stem, size, previous):
+    '''copy the image file source as stem into folder or convert it to a
+    TGA of size (width, height); return the file name written, the content
+    key and the PACKAGE state; nothing is written if previous holds the
+    same content key and the file still exists'''
+    with open(source, 'rb') as f:
+        data = f.read()
+    extension = os.path.splitext(source)[1]
+    key = hashlib.sha1(data).hexdigest()
+    if size is not None:
+        key += '-%ix%i' % size
+    if (previous is not None and previous[0] == key and
+            os.path.exists(os.path.join(folder, previous[1]))):
+        return previous[1], key, PACKAGE.SKIPPED
+    image = None
+    if size is not None:
+        image = decode_image(data, extension)
+    if image is None:
+        filename = stem + extension
+        state = PACKAGE.COPIED if size is None else PACKAGE.NOT_RESIZED
+    else:
+        width, height, channels, pixels = image
+        pixels = resample_image(width, height, channels, pixels,
+                                size[0], size[1])
+        data = encode_tga(size[0], size[1], channels, pixels)
+        filename = stem + '.tga'
+        state = PACKAGE.CONVERTED
+    with open(os.path.join(folder, filename), 'wb') as f:
+        f.write(data)
+    return filename, key, state
+
+
+def shelf_pack(sizes, order, width, limit):
+    '''place the rectangles sizes (in order) row by row into an area of
+    width x limit pixels; return the positions of all placed rectangles and
+    the used height'''
+    x = y = shelf = 0
+    placed = {}
+    for i in order:
+        w, h = sizes[i]
+        if x + w > width:
+            y += shelf
+            x = shelf = 0
+        if w > width or y + h > limit:
+            continue
+        placed[i] = (x, y)
+        x += w
+        shelf = max(shelf, h)
+    return placed, y + shelf
+
+
+def pack_rectangles(sizes, limit):
+    '''pack the (width, height) sizes into as few power of two atlases of
+    at most limit x limit pixels as possible; return a list of (width,
+    height, {index: (x, y)}) tuples'''
+    remaining = sorted(range(len(sizes)),
+                       key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    atlases = []
+    while len(remaining) > 0:
+        best = None
+        width = get_power_of_two_size(max(sizes[i][0] for i in remaining),
+                                      limit)
+        while width <= limit:
+            placed, used_height = shelf_pack(sizes, remaining, width, limit)
+            height = 1
+            while height < used_height:
+                height *= 2
+            if ((best is None) or
+                    (len(placed), -width * height) >
+                    (len(best[2]), -best[0] * best[1])):
+                best = (width, height, placed)
+            width *= 2
+        if best is None or len(best[2]) == 0:
+            break
+        atlases.append(best)
+        remaining = [i for i in remaining if i not in best[2]]
+    return atlases
+
+
+def count_runs(keys):
+    '''return the number of runs of equal consecutive keys'''
+    return sum(1 for i, key in enumerate(keys)
+               if i == 0 or key != keys[i - 1])
+
+
+def get_acmr(triangles, cache_size):
+    '''return the average cache miss ratio (transformed vertices per
+    triangle) of triangles for a FIFO vertex cache of cache_size entries'''
+    if len(triangles) == 0:
+        return 0.0
+    cache = collections.deque()
+    cached = set()
+    misses = 0
+    for triangle in triangles:
+        for v in triangle:
+            if v not in cached:
+                misses += 1
+                cache.append(v)
+                cached.add(v)
+                if len(cache) > cache_size:
+                    cached.discard(cache.popleft())
+    return float(misses) / len(triangles)
+
+
+def optimize_vertex_cache(triangles, cache_size):
+    '''return the order of triangles (vertex id triples) which makes best
+    use of a post transform vertex cache (Tom Forsyth's linear-speed vertex
+    cache optimisation)'''
+
+    def score(v, position):
+        if remaining[v] == 0:
+            return -1.0
+        if position < 0:
+            s = 0.0
+        elif position < 3:
+            s = 0.75  # the vertices of the last triangle
+        else:
+            s = (1.0 - float(position - 3) / (cache_size - 3)) ** 1.5
+        ## boost vertices with only a few triangles left
+        return s + 2.0 * remaining[v] ** -0.5
+
+    vertex_triangles = collections.defaultdict(list)
+    for t, triangle in enumerate(triangles):
+        for v in triangle:
+            vertex_triangles[v].append(t)
+    remaining = dict((v, len(ts)) for v, ts in vertex_triangles.items())
+    vertex_score = dict((v, score(v, -1)) for v in vertex_triangles)
+    added = [False] * len(triangles)
+    order = []
+    cache = []
+    next_unadded = 0
+    best = None
+    if len(triangles) > 0:
+        best = max(range(len(triangles)),
+                   key=lambda t: sum(vertex_score[v] for v in triangles[t]))
+    while len(order) < len(triangles):
+        if best is None:
+            while added[next_unadded]:
+                next_unadded += 1
+            best = next_unadded
+        added[best] = True
+        order.append(best)
+        front = []
+        for v in triangles[best]:
+            remaining[v] -= 1
+            vertex_triangles[v].remove(best)
+            if v not in front:
+                front.append(v)
+        cache = front + [v for v in cache if v not in front]
+        evicted = cache[cache_size:]
+        del cache[cache_size:]
+        ## rescore the vertices whose cache position changed and pick the
+        ## best triangle using one of them
+        touched = set()
+        for position, v in enumerate(cache):
+            vertex_score[v] = score(v, position)
+            touched.update(vertex_triangles[v])
+        for v in evicted:
+            vertex_score[v] = score(v, -1)
+            touched.update(vertex_triangles[v])
+        best = None
+        best_score = -1.0
+        for t in touched:
+            s = sum(vertex_score[v] for v in triangles[t])
+            if s > best_score:
+                best, best_score = t, s
+    return order
+
+
+def parse_limits(s):
+    '''return the comma separated "name=value" budget limits in s'''
+    limits = {}
+    for item in s.split(','):
+        name, sep, value = item.partition('=')
+        try:
+            value = float(value)
+        except ValueError:
+            continue
+        limits[name.strip().lower()] = (int(value) if value.is_integer()
+                                        else value)
+    return limits
+
+
+def parse_ratios(s):
+    '''return the comma separated ratios in s which are between 0 and 1'''
+    ratios = []
+    for r in s.split(','):
+        try:
+            r = float(r)
+        except ValueError:
+            continue
+        if 0.0 < r < 1.0:
+            ratios.append(r)
+    return tuple(ratios)
+
+
+def get_plane_quadric(p0, p1, p2):
+    '''return the area weighted error quadric (10 coefficients of the
+    symmetric 4x4 matrix) of the plane through p0, p1, p2'''
+    ux, uy, uz = p1[0] - p0[0], p1[1] - p0[1], p1[2] - p0[2]
+    vx, vy, vz = p2[0] - p0[0], p2[1] - p0[1], p2[2] - p0[2]
+    a, b, c = uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+    length = math.sqrt(a * a + b * b + c * c)
+    if length == 0.0:
+        return [0.0] * 10
+    a, b, c = a / length, b / length, c / length
+    d = -(a * p0[0] + b * p0[1] + c * p0[2])
+    w = length / 2.0  # area
+    return [w * a * a, w * a * b, w * a * c, w * a * d,
+            w * b * b, w * b * c, w * b * d,
+            w * c * c, w * c * d,
+            w * d * d]
+
+
+def get_quadric_error(q, p):
+    '''return the error of the point p measured by the quadric q'''
+    x, y, z = p
+    return (q[0] * x * x + 2 * q[1] * x * y + 2 * q[2] * x * z +
+            2 * q[3] * x + q[4] * y * y + 2 * q[5] * y * z + 2 * q[6] * y +
+            q[7] * z * z + 2 * q[8] * z + q[9])
+
+
+def get_triangle_normal(p0, p1, p2):
+    '''return the (not normalized) normal of a triangle'''
+    ux, uy, uz = p1[0] - p0[0], p1[1] - p0[1], p1[2] - p0[2]
+    vx, vy, vz = p2[0] - p0[0], p2[1] - p0[1], p2[2] - p0[2]
+    return (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+
+
+def decimate_triangle_list(tl, target_count):
+    '''reduce the triangle list tl to about target_count triangles by edge
+    collapses ordered by a quadric error metric; uv seams, material
+    boundaries, open borders and changes of the bone influences are kept
+    as they are; return the reduced triangle list'''
+    ## nodes: vertices welded without their normal, so smooth and flat
+    ## shaded surfaces are reduced the same way
+    node_ids = {}
+    node_keys = []
+    positions = []
+    vertex_nodes = []
+    for vertex_id, (co, no, uv, bb) in enumerate(tl[TL.VERTICES]):
+        node = node_ids.get((co, uv, bb))
+        if node is None:
+            node = node_ids[(co, uv, bb)] = len(node_keys)
+            node_keys.append((co, uv, bb))
+            positions.append(tl[TL.POSITIONS][vertex_id])
+        vertex_nodes.append(node)
+    triangles = [[vertex_nodes[v] for v in t[1:]] for t in tl[TL.TRIANGLES]]
+    normals = [[tl[TL.VERTICES][v][1] for v in t[1:]]
+               for t in tl[TL.TRIANGLES]]
+    alive = [len(set(t)) == 3 for t in triangles]
+    count = sum(alive)
+    node_triangles = [set() for n in node_keys]
+    for t, triangle in enumerate(triangles):
+        if alive[t]:
+            for n in triangle:
+                node_triangles[n].add(t)
+    ## lock nodes on uv seams or influence borders (several nodes at one
+    ## position), on material boundaries and on open or non manifold edges
+    locked = [False] * len(node_keys)
+    at_position = collections.Counter(key[0] for key in node_keys)
+    for n, key in enumerate(node_keys):
+        if at_position[key[0]] > 1:
+            locked[n] = True
+        elif len(set(tl[TL.TRIANGLES][t][0]
+                     for t in node_triangles[n])) > 1:
+            locked[n] = True
+    edges = collections.Counter()
+    for t, triangle in enumerate(triangles):
+        if alive[t]:
+            for k in range(3):
+                edges[frozenset((triangle[k], triangle[k - 1]))] += 1
+    for edge, users in edges.items():
+        if users != 2:
+            for n in edge:
+                locked[n] = True
+    ## error quadrics
+    quadrics = [[0.0] * 10 for n in node_keys]
+    for t, triangle in enumerate(triangles):
+        if alive[t]:
+            q = get_plane_quadric(*[positions[n] for n in triangle])
+            for n in triangle:
+                quadrics[n] = [a + b for a, b in zip(quadrics[n], q)]
+    versions = [0] * len(node_keys)
+    heap = []
+
+    def neighbours(n):
+        return set(m for t in node_triangles[n]
+                   for m in triangles[t]) - set([n])
+
+    def push_candidates(n):
+        for m in neighbours(n):
+            for src, dst in ((n, m), (m, n)):
+                if not locked[src]:
+                    q = [a + b for a, b in zip(quadrics[src], quadrics[dst])]
+                    heapq.heappush(heap, (get_quadric_error(q, positions[dst]),
+                                          src, dst,
+                                          versions[src], versions[dst]))
+
+    def can_collapse(src, dst):
+        ## the only common neighbours are the tips of the shared triangles
+        shared = [t for t in node_triangles[src] if dst in triangles[t]]
+        tips = set(n for t in shared for n in triangles[t]) - set([src, dst])
+        if (neighbours(src) & neighbours(dst)) != tips:
+            return False
+        ## no triangle may flip over
+        for t in node_triangles[src]:
+            if dst in triangles[t]:
+                continue
+            old = [positions[n] for n in triangles[t]]
+            new = [positions[dst] if n == src else positions[n]
+                   for n in triangles[t]]
+            a = get_triangle_normal(*old)
+            b = get_triangle_normal(*new)
+            ## reject flips and sharp turns (cos 60 degrees)
+            dot = a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+            if dot <= 0.5 * math.sqrt((a[0] * a[0] + a[1] * a[1] +
+                                       a[2] * a[2]) *
+                                      (b[0] * b[0] + b[1] * b[1] +
+                                       b[2] * b[2])):
+                return False
+        return True
+
+    for n in range(len(node_keys)):
+        if not locked[n]:
+            push_candidates(n)
+    while count > target_count and len(heap) > 0:
+        error, src, dst, src_version, dst_version = heapq.heappop(heap)
+        if (versions[src] != src_version or versions[dst] != dst_version or
+                len(node_triangles[src]) == 0 or
+                not can_collapse(src, dst)):
+            continue
+        for t in list(node_triangles[src]):
+            if dst in triangles[t]:
+                alive[t] = False
+                count -= 1
+                for n in triangles[t]:
+                    node_triangles[n].discard(t)
+            else:
+                triangles[t][triangles[t].index(src)] = dst
+                node_triangles[dst].add(t)
+        node_triangles[src].clear()
+        quadrics[dst] = [a + b for a, b in zip(quadrics[src], quadrics[dst])]
+        for n in neighbours(dst) | set([src, dst]):
+            versions[n] += 1
+        for n in neighbours(dst) | set([dst]):
+            push_candidates(n)
+    ## rebuild the triangle list; corners keep their normal
+    result = {TL.VERTICES: [],
+              TL.POSITIONS: [],
+              TL.TRIANGLES: [],
+              TL.OBJECTS: []}
+    vertex_ids = {}
+    for t, triangle in enumerate(triangles):
+        if not alive[t]:
+            continue
+        new_triangle = [tl[TL.TRIANGLES][t][0]]
+        for n, no in zip(triangle, normals[t]):
+            co, uv, bb = node_keys[n]
+            key = (co, no, uv, bb)
+            vertex_id = vertex_ids.get(key)
+            if vertex_id is None:
+                vertex_id = vertex_ids[key] = len(result[TL.VERTICES])
+                result[TL.VERTICES].append(key)
+                result[TL.POSITIONS].append(positions[n])
+            new_triangle.append(vertex_id)
+        result[TL.TRIANGLES].append(new_triangle)
+        result[TL.OBJECTS].append(tl[TL.OBJECTS][t])
+    return result
+
+
+def find_redundant_triangles(tl):
+    '''return the ids of the triangles of tl without area at the exported
+    precision and the ids of exact duplicates (same material, same welded
+    corners and facing) of earlier triangles'''
+    ## rounded corners as written, so rounding can't hide anything
+    precision = 10.0 ** -FPM.NDIGITS
+    corners = [tuple(round(c, FPM.NDIGITS) for c in p)
+               for p in tl[TL.POSITIONS]]
+    degenerated = []
+    duplicates = []
+    faces = set()
+    for t, triangle in enumerate(tl[TL.TRIANGLES]):
+        n = get_triangle_normal(*[corners[v] for v in triangle[1:]])
+        if n[0] * n[0] + n[1] * n[1] + n[2] * n[2] < precision ** 4:
+            degenerated.append(t)
+            continue
+        ## welded vertex ids include normal, uv and influences, so
+        ## coincident faces of differently moving parts are kept
+        key = triangle[1:]
+        i = key.index(min(key))
+        key = (triangle[0],) + tuple(key[i:] + key[:i])
+        if key in faces:
+            duplicates.append(t)
+        else:
+            faces.add(key)
+    return degenerated, duplicates
+
+
+def get_material_part_name(name, part):
+    '''return the name of the part-th copy of the decorated material name'''
+    i = name.find(DECO.DOT + DECO.MARKER)
+    if i < 0:
+        return name + "_%i" % part
+    return name[:i] + "_%i" % part + name[i:]
+
+
+def reorder_triangles(tl, order):
+    '''return the triangle list tl with its triangles in order'''
+    result = dict(tl)
+    for key in (TL.TRIANGLES, TL.OBJECTS, TL.PALETTES, TL.SPLITS):
+        if key in tl:
+            result[key] = [tl[key][t] for t in order]
+    return result
+
+
+def partition_bone_palettes(triangle_bones, max_bones):
+    '''split triangles given by the set of their bone ids into palettes of
+    at most max_bones bones; triangles with the same bones always share a
+    palette, so only vertices between different bone sets get duplicated;
+    return the palette index per triangle and the bones per palette'''
+    groups = collections.OrderedDict()  # triangles per set of bones
+    for t, bones in enumerate(triangle_bones):
+        groups.setdefault(bones, []).append(t)
+    palette_ids = [0] * len(triangle_bones)
+    palettes = []
+    while len(groups) > 0:
+        ## start with the most used bone set and add the sets which need
+        ## the fewest new bones
+        bones = max(groups, key=lambda b: len(groups[b]))
+        palette = set(bones)
+        members = groups.pop(bones)
+        while True:
+            best = None
+            for bones in groups:
+                new_bones = len(bones - palette)
+                if len(palette) + new_bones <= max_bones:
+                    rank = (new_bones, -len(groups[bones]))
+                    if best is None or rank < best[0]:
+                        best = (rank, bones)
+            if best is None:
+                break
+            palette |= best[1]
+            members.extend(groups.pop(best[1]))
+        for t in members:
+            palette_ids[t] = len(palettes)
+        palettes.append(tuple(sorted(palette)))
+    return palette_ids, palettes
+
+
+def extract_triangles(tl, triangle_ids):
+    '''return the triangle list of the triangles triangle_ids of tl with
+    only the vertices they use'''
+    result = {TL.VERTICES: [],
+              TL.POSITIONS: [],
+              TL.TRIANGLES: [],
+              TL.OBJECTS: []}
+    ids = {}
+    for t in triangle_ids:
+        triangle = tl[TL.TRIANGLES][t]
+        for v in triangle[1:]:
+            if v not in ids:
+                ids[v] = len(result[TL.VERTICES])
+                result[TL.VERTICES].append(tl[TL.VERTICES][v])
+                result[TL.POSITIONS].append(tl[TL.POSITIONS][v])
+        result[TL.TRIANGLES].append([triangle[0]] +
+                                    [ids[v] for v in triangle[1:]])
+        result[TL.OBJECTS].append(tl[TL.OBJECTS][t])
+    return result
+
+
+def get_bounds(positions):
+    '''return the lower and upper corner of the bounding box of
+    positions'''
+    return (tuple(min(p[axis] for p in positions) for axis in range(3)),
+            tuple(max(p[axis] for p in positions) for axis in range(3)))
+
+
+def split_triangle_list(tl, triangle_ids, max_size, max_triangles):
+    '''split the triangles triangle_ids of tl at the median of their
+    centers (a bounding volume hierarchy) until no part is larger than
+    max_size or has more than max_triangles triangles (0 = no limit);
+    return the triangle ids per part'''
+    centers = {}
+    for t in triangle_ids:
+        p = [tl[TL.POSITIONS][v] for v in tl[TL.TRIANGLES][t][1:]]
+        centers[t] = tuple(sum(c[axis] for c in p) / 3.0
+                           for axis in range(3))
+    parts = []
+    stack = [list(triangle_ids)]
+    while len(stack) > 0:
+        part = stack.pop()
+        low, high = get_bounds([tl[TL.POSITIONS][v] for t in part
+                                for v in tl[TL.TRIANGLES][t][1:]])
+        if (((max_size <= 0.0) or
+             (max(high[a] - low[a] for a in range(3)) <= max_size)) and
+                ((max_triangles <= 0) or (len(part) <= max_triangles))):
+            parts.append(part)
+            continue
+        ## split along the longest axis of the triangle centers
+        c_low, c_high = get_bounds([centers[t] for t in part])
+        axis = max(range(3), key=lambda a: c_high[a] - c_low[a])
+        if c_high[axis] - c_low[axis] <= 0.0:
+            parts.append(part)  # a stack of triangles can't be split
+            continue
+        part.sort(key=lambda t: centers[t][axis])
+        stack.append(part[len(part) // 2:])
+        stack.append(part[:len(part) // 2])
+    return parts
+
+
+def build_shadow_triangle_list(tl, detail_size):
+    '''return the triangle list tl prepared for a shadow mesh: vertices
+    welded by position and influence only, one material, interior faces
+    removed as well as parts smaller than detail_size (a fraction of the
+    size of the whole mesh)'''
+    ## weld the vertices, uvs and normals don't matter for shadows
+    vertex_ids = {}
+    weld = []
+    positions = []
+    influences = []
+    for v, (co, no, uv, bb) in enumerate(tl[TL.VERTICES]):
+        vertex_id = vertex_ids.setdefault((co, bb), len(vertex_ids))
+        weld.append(vertex_id)
+        if vertex_id == len(positions):
+            positions.append(tl[TL.POSITIONS][v])
+            influences.append((co, bb))
+
+    def face_key(v):
+        i = v.index(min(v))
+        return tuple(v[i:] + v[:i])
+
+    ## drop degenerated and duplicate triangles; faces existing with both
+    ## orientations are inner walls between touching parts
+    welded = []
+    for t, object_id in zip(tl[TL.TRIANGLES], tl[TL.OBJECTS]):
+        v = [weld[i] for i in t[1:]]
+        if len(set(v)) == 3:
+            welded.append((v, object_id))
+    faces = set(face_key(v) for v, object_id in welded)
+    kept = []
+    for v, object_id in welded:
+        key = face_key(v)
+        if key in faces and face_key(v[::-1]) not in faces:
+            faces.discard(key)
+            kept.append((v, object_id))
+    ## connected parts; small details cast no noticeable shadow
+    parent = list(range(len(positions)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for v, object_id in kept:
+        for i in v[1:]:
+            parent[find(i)] = find(v[0])
+    bounds = {}
+    for v, object_id in kept:
+        for i in v:
+            part = bounds.setdefault(find(i), ([], []))
+            if len(part[0]) == 0:
+                part[0].extend(positions[i])
+                part[1].extend(positions[i])
+            for axis in range(3):
+                part[0][axis] = min(part[0][axis], positions[i][axis])
+                part[1][axis] = max(part[1][axis], positions[i][axis])
+
+    def get_size(low, high):
+        return math.sqrt(sum((high[a] - low[a]) ** 2 for a in range(3)))
+
+    if len(bounds) > 0:
+        size = get_size([min(b[0][a] for b in bounds.values())
+                         for a in range(3)],
+                        [max(b[1][a] for b in bounds.values())
+                         for a in range(3)])
+        kept = [(v, object_id) for v, object_id in kept
+                if get_size(*bounds[find(v[0])]) >= detail_size * size]
+    ## the remaining vertices get the averaged normal of their faces
+    normals = {}
+    for v, object_id in kept:
+        n = get_triangle_normal(*[positions[i] for i in v])
+        for i in v:
+            s = normals.setdefault(i, [0.0, 0.0, 0.0])
+            for axis in range(3):
+                s[axis] += n[axis]
+    result = {TL.VERTICES: [],
+              TL.POSITIONS: [],
+              TL.TRIANGLES: [],
+              TL.OBJECTS: []}
+    ids = {}
+    uv = tupel_to_float_str((0.0, 0.0))
+    for v, object_id in kept:
+        triangle = [0]
+        for i in v:
+            if i not in ids:
+                ids[i] = len(result[TL.VERTICES])
+                length = math.sqrt(sum(c * c for c in normals[i]))
+                if length > 0.0:
+                    no = [c / length for c in normals[i]]
+                else:
+                    no = [0.0, 0.0, 1.0]
+                co, bb = influences[i]
+                result[TL.VERTICES].append(
+                    (co, tupel_to_float_str(no), uv, bb))
+                result[TL.POSITIONS].append(positions[i])
+            triangle.append(ids[i])
+        result[TL.TRIANGLES].append(triangle)
+        result[TL.OBJECTS].append(object_id)
+    return result
+
+
+def is_power_of_two(n):
+    '''True if n is 1, 2, 4, 8, ...'''
+    return n > 0 and (n & (n - 1)) == 0
+
+
+def get_texture_memory(width, height, alpha):
+    '''estimate the GPU memory of a texture including its mip chain;
+    Trainz stores textures DXT compressed (DXT1 or DXT5 with alpha)'''
+    block_bytes = 16 if alpha else 8
+    memory = 0
+    while True:
+        memory += ((width + 3) // 4) * ((height + 3) // 4) * block_bytes
+        if width == 1 and height == 1:
+            return memory
+        width = max(1, width // 2)
+        height = max(1, height // 2)
+
+
+def read_array(collection, attr, size, typecode='f'):
+    '''bulk read the property attr of all items in collection'''
+    result = array.array(typecode, [0]) * (len(collection) * size)
+    if len(result) > 0:
+        collection.foreach_get(attr, result)
+    return result
+
+
+def read_list(collection, attr, size):
+    '''bulk read the (boolean) property attr of all items in collection'''
+    result = [False] * (len(collection) * size)
+    if len(result) > 0:
+        collection.foreach_get(attr, result)
+    return result
+
+
+def get_mesh_hash(mesh):
+    '''return a hash over all mesh data used by the export'''
+    h = hashlib.sha1()
+    h.update(read_array(mesh.vertices, 'co', 3).tobytes())
+    if blender_version < 2063000:
+        h.update(read_array(mesh.faces, 'vertices_raw', 4, 'i').tobytes())
+        h.update(read_array(mesh.faces, 'material_index', 1, 'i').tobytes())
+        h.update(repr(read_list(mesh.faces, 'use_smooth', 1)).encode())
+        for uvt in mesh.uv_textures:
+            if uvt.active_render:
+                h.update(read_array(uvt.data, 'uv_raw', 8).tobytes())
+    else:
+        h.update(read_array(mesh.loops, 'vertex_index', 1, 'i').tobytes())
+        h.update(read_array(mesh.polygons, 'loop_start', 1, 'i').tobytes())
+        h.update(read_array(mesh.polygons, 'loop_total', 1, 'i').tobytes())
+        h.update(read_array(mesh.polygons, 'material_index', 1,
+                            'i').tobytes())
+        h.update(repr(read_list(mesh.polygons, 'use_smooth', 1)).encode())
+        for uvt in mesh.uv_textures:
+            if uvt.active_render:
+                h.update(read_array(mesh.uv_layers[uvt.name].data,
+                                    'uv', 2).tobytes())
+    ## vertex group weights can't be read in bulk
+    for v in mesh.vertices:
+        h.update(repr([(g.group, g.weight) for g in v.groups]).encode())
+    h.update(repr((mesh.use_auto_smooth, mesh.auto_smooth_angle)).encode())
+    return h.hexdigest()
+
+
+def get_modifier_stack_key(objct):
+    '''return a hash over the settings of all modifiers of objct which
+    will be applied; referenced objects add their name and position'''
+    h = hashlib.sha1()
+    for mod in get_applied_modifiers(objct):
+        settings = [mod.type]
+        for prop in mod.bl_rna.properties:
+            if prop.identifier == 'rna_type':
+                continue
+            value = getattr(mod, prop.identifier)
+            if prop.type == 'POINTER':
+                if isinstance(value, bpy.types.Object):
+                    ## relative placement matters for mirror, boolean, ...
+                    settings.append(value.name)
+                    settings.append([tuple(r) for r in value.matrix_world])
+                    settings.append([tuple(r) for r in objct.matrix_world])
+                    if value.type == 'MESH':
+                        settings.append(get_mesh_hash(value.data))
+                elif value is not None:
+                    settings.append(getattr(value, 'name', ''))
+            elif prop.type == 'COLLECTION':
+                continue
+            elif getattr(prop, 'array_length', 0) > 0:
+                settings.append(tuple(value))
+            else:
+                settings.append(value)
+        h.update(repr(settings).encode())
+    ## shape keys are applied together with the modifiers
+    if objct.data.shape_keys is not None:
+        h.update(repr([(kb.name, kb.value, kb.mute)
+                       for kb in objct.data.shape_keys.key_blocks]).encode())
+    return h.hexdigest()
+
+
+def get_applied_modifiers(objct):
+    '''return all modifiers of objct applied by an evaluated export;
+    armature deformations are done by Trainz itself'''
+    return [m for m in objct.modifiers
+            if m.show_render and m.type != 'ARMATURE']
+
+
+def ear_clip(points):
+    '''triangulate the simple 2d polygon points; return triples of point
+    indices which keep the winding order of the polygon'''
+    ## orientation of the polygon (shoelace formula)
+    area = 0.0
+    for i in range(len(points)):
+        x0, y0 = points[i - 1]
+        x1, y1 = points[i]
+        area += x0 * y1 - x1 * y0
+    if area >= 0.0:
+        sign = 1.0
+    else:
+        sign = -1.0
+    result = []
+    remaining = list(range(len(points)))
+    while len(remaining) > 3:
+        ear = None
+        for k in range(len(remaining)):
+            i0 = remaining[k - 1]
+            i1 = remaining[k]
+            i2 = remaining[(k + 1) % len(remaining)]
+            (x0, y0), (x1, y1), (x2, y2) = points[i0], points[i1], points[i2]
+            ## reflex or degenerated corners are no ears
+            if ((x1 - x0) * (y2 - y1) - (y1 - y0) * (x2 - x1)) * sign <= 0.0:
+                continue
+            ## an ear doesn't contain any other polygon point
+            contains_point = False
+            for j in remaining:
+                if j not in (i0, i1, i2):
+                    x, y = points[j]
+                    if ((((x1 - x0) * (y - y0) - (y1 - y0) * (x - x0)) *
+                         sign >= 0.0) and
+                        (((x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)) *
+                         sign >= 0.0) and
+                        (((x0 - x2) * (y - y2) - (y0 - y2) * (x - x2)) *
+                         sign >= 0.0)):
+                        contains_point = True
+                        break
+            if not contains_point:
+                ear = k
+                result.append((i0, i1, i2))
+                break
+        if ear is None:
+            ## self intersecting or degenerated polygon: fall back to a fan
+            for k in range(1, len(remaining) - 1):
+                result.append((remaining[0], remaining[k], remaining[k + 1]))
+            return result
+        del remaining[ear]
+    result.append(tuple(remaining))
+    return result
+
+
+def triangulate_polygons(loop_start, loop_total, loop_vert, coords, poly_no):
+    '''return (polygon, loop, loop, loop) tuples for all polygons;
+    triangles pass through, quads are split along their first diagonal
+    and ngons are ear clipped'''
+    polygons = range(len(loop_total))
+    result = [(p, loop_start[p], loop_start[p] + 1, loop_start[p] + 2)
+              for p in polygons if loop_total[p] == 3]
+    quads = [p for p in polygons if loop_total[p] == 4]
+    result.extend((p, loop_start[p], loop_start[p] + 1, loop_start[p] + 2)
+                  for p in quads)
+    result.extend((p, loop_start[p], loop_start[p] + 2, loop_start[p] + 3)
+                  for p in quads)
+    for p in polygons:
+        if loop_total[p] > 4:
+            loops = range(loop_start[p], loop_start[p] + loop_total[p])
+            ## project the ngon onto the plane its normal is closest to
+            no = [abs(poly_no[3 * p + i]) for i in range(3)]
+            axis = no.index(max(no))
+            u, v = [i for i in range(3) if i != axis]
+            points = [(coords[loop_vert[l]][u], coords[loop_vert[l]][v])
+                      for l in loops]
+            result.extend((p, loops[a], loops[b], loops[c])
+                          for a, b, c in ear_clip(points))
+    ## restore the polygon order
+    result.sort()
+    return result
+
+
+def extract_mesh_data(mesh):
+    '''extract topology, uvs and local space attributes of mesh'''
+    co = read_array(mesh.vertices, 'co', 3)
+    md = {MD.CO: [tuple(co[i:i + 3]) for i in range(0, len(co), 3)],
+          MD.GROUPS: [tuple((g.group, g.weight) for g in v.groups)
+                      for v in mesh.vertices],
+          MD.TRI_MAT: [],
+          MD.TRI_VERT: [],
+          MD.NO: [],
+          MD.UV: []}
+    if blender_version < 2063000:
+        ## get faces and the uv layer used for rendering
+        uv_data = None
+        for uvt in mesh.uv_textures:
+            if uvt.active_render:
+                uv_data = uvt.data
+        for face in mesh.faces:
+            ## normals and uvs of all face corners
+            normals = []
+            uvs = []
+            for face_vi, mesh_vi in enumerate(face.vertices):
+                if face.use_smooth:
+                    if mesh.use_auto_smooth:
+                        normals.append(tuple(get_autosmooth_normal(
+                            mesh, face, mesh_vi)))
+                    else:
+                        normals.append(tuple(mesh.vertices[mesh_vi].normal))
+                else:
+                    normals.append(tuple(face.normal))
+                if uv_data is not None:
+                    uvs.append((uv_data[face.index].uv[face_vi][0],
+                                # v must be inverted for trainz
+                                1 - uv_data[face.index].uv[face_vi][1]))
+                else:
+                    uvs.append((0.0, 0.0))
+            ## quads are split into two triangles
+            if len(face.vertices) == 4:
+                triangles = ((0, 1, 2), (0, 2, 3))
+            else:
+                triangles = ((0, 1, 2), )
+            for tri in triangles:
+                md[MD.TRI_MAT].append(face.material_index)
+                for face_vi in tri:
+                    md[MD.TRI_VERT].append(face.vertices[face_vi])
+                    md[MD.NO].append(normals[face_vi])
+                    md[MD.UV].append(uvs[face_vi])
+    else:
+        ## read the polygon loops in bulk and triangulate them without
+        ## touching the mesh (calc_tessface would change it)
+        loop_vert = read_array(mesh.loops, 'vertex_index', 1, 'i')
+        loop_start = read_array(mesh.polygons, 'loop_start', 1, 'i')
+        loop_total = read_array(mesh.polygons, 'loop_total', 1, 'i')
+        poly_mat = read_array(mesh.polygons, 'material_index', 1, 'i')
+        poly_smooth = read_list(mesh.polygons, 'use_smooth', 1)
+        poly_no = read_array(mesh.polygons, 'normal', 3)
+        vert_no = read_array(mesh.vertices, 'normal', 3)
+        loop_uv = None
+        for uvt in mesh.uv_textures:
+            if uvt.active_render:
+                loop_uv = read_array(mesh.uv_layers[uvt.name].data, 'uv', 2)
+        for tri in triangulate_polygons(loop_start, loop_total, loop_vert,
+                                        md[MD.CO], poly_no):
+            p = tri[0]
+            md[MD.TRI_MAT].append(poly_mat[p])
+            for l in tri[1:]:
+                vi = loop_vert[l]
+                md[MD.TRI_VERT].append(vi)
+                if poly_smooth[p]:
+                    if mesh.use_auto_smooth:
+                        md[MD.NO].append(tuple(get_autosmooth_normal(
+                            mesh, mesh.polygons[p], vi)))
+                    else:
+                        md[MD.NO].append(tuple(vert_no[3 * vi:3 * vi + 3]))
+                else:
+                    md[MD.NO].append(tuple(poly_no[3 * p:3 * p + 3]))
+                if loop_uv is not None:
+                    # v must be inverted for trainz
+                    md[MD.UV].append((loop_uv[2 * l],
+                                      1 - loop_uv[2 * l + 1]))
+                else:
+                    md[MD.UV].append((0.0, 0.0))
+    return md
+
+
+def read_polygon_arrays(mesh):
+    '''bulk read material index, normal, area and vertices of all
+    polygons (faces before 2.63) of mesh'''
+    if blender_version < 2063000:
+        polygons = mesh.faces
+        vertices = [tuple(f.vertices) for f in polygons]
+    else:
+        polygons = mesh.polygons
+        loop_vert = read_array(mesh.loops, 'vertex_index', 1, 'i')
+        loop_start = read_array(polygons, 'loop_start', 1, 'i')
+        loop_total = read_array(polygons, 'loop_total', 1, 'i')
+        vertices = [tuple(loop_vert[s:s + t])
+                    for s, t in zip(loop_start, loop_total)]
+    return {PA.MATERIAL: read_array(polygons, 'material_index', 1, 'i'),
+            PA.NORMAL: read_array(polygons, 'normal', 3),
+            PA.AREA: read_array(polygons, 'area', 1),
+            PA.VERTICES: vertices}
+
+
+def get_surfaceless_polygons(pa):
+    '''return the indices of all polygons without area or normal'''
+    no = pa[PA.NORMAL]
+    lengths = [no[i] * no[i] + no[i + 1] * no[i + 1] + no[i + 2] * no[i + 2]
+               for i in range(0, len(no), 3)]
+    return [p for p, (length, area) in enumerate(zip(lengths, pa[PA.AREA]))
+            if not ((length > 0.0) and (area > 0.0))]
+
+
+def build_weight_matrix(vertex_groups, group_bone):
+    '''return the sparse vertex x bone weight matrix of a mesh as one row
+    of (bone id, weight) tuples per vertex; vertex_groups holds the
+    (group index, weight) tuples per vertex, group_bone maps group
+    indices to bone ids (None for groups not named like a bone)'''
+    return [[(group_bone[g], w) for g, w in groups
+             if group_bone[g] is not None]
+            for groups in vertex_groups]
+
+
+def prune_weight_matrix(rows, limit):
+    '''keep only the limit strongest influences of every row'''
+    return [row if len(row) <= limit else
+            sorted(row, key=lambda bw: bw[1], reverse=True)[:limit]
+            for row in rows]
+
+
+def normalize_weight_matrix(rows):
+    '''scale the weights of every row to a sum of 1'''
+    sums = [sum(w for b, w in row) for row in rows]
+    return [[(b, w / weight_sum) for b, w in row] if weight_sum > 0.0
+            else row
+            for row, weight_sum in zip(rows, sums)]
+
+
+def get_or_create_vertexgroup(group_name, objct):
+    '''return the vertexgroup group_name of objct; create it if needed'''
+    vertex_group = objct.vertex_groups.get(group_name)
+    if vertex_group is None:
         vertex_group = objct.vertex_groups.new(name=group_name)
-    ## append vertex_id to found/created vertexgroup
-    vertex_group.add((vertex_id, ), 0.0, 'ADD')
+    return vertex_group
+
+
+def add_polygons_to_vertexgroup(group_name, objct, pa, polygon_ids):
+    '''add vertices of the polygons polygon_ids to vertexgroup group_name'''
+    vertex_ids = set()
+    for p in polygon_ids:
+        vertex_ids.update(pa[PA.VERTICES][p])
+    add_vertices_to_vertexgroup(group_name, objct, vertex_ids)
+
+
+def add_vertices_to_vertexgroup(group_name, objct, vertex_ids):
+    '''add all vertex_ids with one call to vertexgroup group_name'''
+    get_or_create_vertexgroup(group_name, objct).add(list(vertex_ids),
+                                                     0.0,
+                                                     'ADD')
+
+
+def fcurve_is_changing(fcurve):
+    '''returns True if the value of fcurve may change over time'''
+    ## modifiers (noise, cycles, ...) may change even constant curves
+    if len(fcurve.modifiers) > 0:
+        return True
+    if len(fcurve.keyframe_points) == 0:
+        return False
+    ## all keyframes and bezier handles have to share the same value
+    value = fcurve.keyframe_points[0].co[1]
+    for kp in fcurve.keyframe_points:
+        if compare_floats(kp.co[1], value) != 0:
+            return True
+        if ((kp.interpolation == 'BEZIER') and
+                ((compare_floats(kp.handle_left[1], value) != 0) or
+                 (compare_floats(kp.handle_right[1], value) != 0))):
+            return True
+    return False
+
+
+def get_changing_data_paths(id_data):
+    '''returns the set of data paths changed by the animation data of
+    id_data; None means, that anything might change (NLA usage)'''
+    result = set()
+    anim_data = id_data.animation_data
+    if anim_data is not None:
+        ## NLA strips blend actions in ways we don't evaluate
+        for track in anim_data.nla_tracks:
+            if (not track.mute) and (len(track.strips) > 0):
+                return None
+        if anim_data.action is not None:
+            for fc in anim_data.action.fcurves:
+                if fcurve_is_changing(fc):
+                    result.add(fc.data_path)
+        ## a driver can depend on anything, even on the frame number
+        for fc in anim_data.drivers:
+            result.add(fc.data_path)
+    return result
+
+
+def get_pose_bone_name(data_path):
+    '''returns the bone name of a 'pose.bones["name"]...' data path
+    or None if data_path doesn't belong to a pose bone'''
+    result = None
+    if data_path.startswith('pose.bones["'):
+        result = data_path[len('pose.bones["'):].split('"]', 1)[0]
+    return result
 
 
 #### class definitions ########################################################
@@ -548,9 +2284,9 @@ class TrainzExport:
         self.log_filename = self.export_filename.replace(
             CONFIG.XMLFILE_EXT,
             CONFIG.LOGFILE_EXT)
-        self.TMI_log_filename = self.export_filename.replace(
+        self.report_filename = self.export_filename.replace(
             CONFIG.XMLFILE_EXT,
-            CONFIG.TMI_LOGFILE_EXT)
+            CONFIG.REPORTFILE_EXT)
         #print('self.log_filename: ', self.log_filename)
         if os.path.exists(self.log_filename):  # delete previous log if found
             os.remove(self.log_filename)
@@ -561,8 +2297,37 @@ class TrainzExport:
         self.safe = dict()  # storage for values which may change during export
         self.trainz_bones = list()  # hold all bones
         self.root_bone = None  # store the root bone
+        self.root_bones = list()  # all bones without trainz parent
         self.animation_basics = dict()
         self.events = list()  # list to store animation events
+        self.polygon_arrays = dict()  # polygon arrays per mesh datablock
+        self.mesh_hashes = dict()  # content hash per mesh datablock
+        self.mesh_data = dict()  # extracted data per content key
+        self.material_id_tables = dict()  # material ids per slot setup
+        self.weight_matrices = dict()  # weight matrices per vg setup
+        self.influence_tables = dict()  # influence strings per vg setup
+        self.influence_bones = dict()  # bone ids per influence string
+        self.animated_objects = dict()  # memo of the animation analysis
+        self.animated_pose_bones = dict()  # memo of the animation analysis
+        self.material_states = dict()  # validated properties per material
+        self.validation_keys = set()  # keys of all validated subjects
+        self.clean_validation_keys = set()  # keys of results w/o messages
+        self.validation_results = list()  # messages and timing per rule
+        self.texture_infos = dict()  # texture info per absolute image path
+        self.texture_memory = 0  # estimated bytes of all exported textures
+        self.texture_images = dict()  # info per image path counted once
+        self.texture_names = dict()  # packaged path per source image path
+        self.canonical_paths = dict()  # first path per image content
+        self.exported_materials = list()  # materials written to the xml
+        self.material_id_map = list()  # exported id per self.materials entry
+        self.uv_transforms = dict()  # atlas uv scale/offset per material
+        self.atlases = list()  # paths of the written texture atlases
+        self.mesh_stats = dict()  # file and counts per written mesh
+        self.asset_triangle_list = None  # all triangles of the asset
+        self.asset_draw_calls = 0  # estimated draw calls of the asset
+        self.static_objects = set()  # indices of meshes w/o influences
+        self.static_bone_ids = dict()  # bone id per object w/o influences
+        self.draw_calls = dict()  # estimated draw calls per written mesh
 
     def log(self, message, severity):
         '''print and/or log a message'''
@@ -701,163 +2466,302 @@ class TrainzExport:
 
     def remove_vertex_group(self, objct, vertex_group_name):
         '''removes an possibly in object existing vertex group'''
-        ## check if the mentioned vertex group exists
-        #print("attempt to delete vertex group ", vertex_group_name,
-        #      " from object ", objct)
-        try:
-            remove_vg = objct.vertex_groups[vertex_group_name]
-            delete = True
-        except:
-            delete = False
-        ## delete existing vg
-        if delete:
-            # activate object of interrest
-            self.context.scene.objects.active = objct
-            # select the proper vg if not already done
-            if objct.vertex_groups.active == remove_vg:
-                reselect_vg = None
-            else:
-                reselect_vg = objct.vertex_groups.active
-                bpy.ops.object.vertex_group_set_active(group=remove_vg.name)
-            # delete active vertex group
-            bpy.ops.object.vertex_group_remove()
-            ## restore former selection
-            if reselect_vg is not None:
-                bpy.ops.object.vertex_group_set_active(group=reselect_vg.name)
-
-    def get_vertex_pnt(self, obj_prop, mesh, face, face_vi):
-        '''return position, normal and texcoords in XML format'''
-        #### position
-        ## multiplication order changed with version 2.59.0
-        ## old order:
-        if blender_version < 2059000:
-            co = (obj_prop[OBJ.LOC] +
-                  (mathutils.Vector([
-                      mesh.vertices[face.vertices[face_vi]].co[0] *
-                      obj_prop[OBJ.SCA][0],
-                      mesh.vertices[face.vertices[face_vi]].co[1] *
-                      obj_prop[OBJ.SCA][1],
-                      mesh.vertices[face.vertices[face_vi]].co[2] *
-                      obj_prop[OBJ.SCA][2]]) *
-                   obj_prop[OBJ.ROT]))
-        ## new order:
-        else:
-            co = (obj_prop[OBJ.LOC] +
-                  mathutils.Vector(
-                      obj_prop[OBJ.ROT] *
-                      mathutils.Vector([
-                          mesh.vertices[face.vertices[face_vi]].co[0] *
-                          obj_prop[OBJ.SCA][0],
-                          mesh.vertices[face.vertices[face_vi]].co[1] *
-                          obj_prop[OBJ.SCA][1],
-                          mesh.vertices[face.vertices[face_vi]].co[2] *
-                          obj_prop[OBJ.SCA][2]])))
-
-        #### normal
-        ## multiplication order changed with version 2.59.0
-        ## old order:
-        if blender_version < 2059000:
-            if face.use_smooth:
-                if mesh.use_auto_smooth:
-                    no = (get_autosmooth_normal(mesh,
-                                                face,
-                                                face.vertices[face_vi]) *
-                          obj_prop[OBJ.ROT])
-                else:
-                    no = (mesh.vertices[face.vertices[face_vi]].normal *
-                          obj_prop[OBJ.ROT])
-            else:
-                no = face.normal * obj_prop[OBJ.ROT]
-        ## new order:
+        ## the data API neither needs an active object nor operators
+        ## (which would trigger a scene update for every call)
+        remove_vg = objct.vertex_groups.get(vertex_group_name)
+        if remove_vg is not None:
+            objct.vertex_groups.remove(remove_vg)
+
+    def get_polygon_arrays(self, mesh):
+        '''return the (memorized) polygon arrays of mesh'''
+        if mesh not in self.polygon_arrays:
+            self.polygon_arrays[mesh] = read_polygon_arrays(mesh)
+        return self.polygon_arrays[mesh]
+
+    def get_mesh_hash(self, mesh):
+        '''return the (memorized) content hash of mesh'''
+        if mesh not in self.mesh_hashes:
+            self.mesh_hashes[mesh] = get_mesh_hash(mesh)
+        return self.mesh_hashes[mesh]
+
+    def forget_mesh(self, mesh):
+        '''drop everything memorized for mesh after it has been changed'''
+        self.polygon_arrays.pop(mesh, None)
+        mesh_hash = self.mesh_hashes.pop(mesh, None)
+        if mesh_hash is not None:
+            ## the data of the mesh and of its evaluated variants
+            for key in [k for k in self.mesh_data if k.startswith(mesh_hash)]:
+                del self.mesh_data[key]
+
+    def get_mesh_data(self, objct, evaluated=True):
+        '''return topology, uvs and local space attributes of the mesh of
+        objct; linked duplicates and unchanged meshes of previous exports
+        share the extracted data; evaluated=False always returns the data
+        of the unmodified mesh (vertex indices match objct.data)'''
+        use_modifiers = (evaluated and
+                         CONFIG.apply_modifiers and
+                         len(get_applied_modifiers(objct)) > 0)
+        key = self.get_mesh_hash(objct.data)
+        if use_modifiers:
+            key += get_modifier_stack_key(objct)
+        if key in self.mesh_data:
+            return self.mesh_data[key]
+        if key in CACHE.MESH_DATA:
+            md = CACHE.MESH_DATA[key]
+        elif use_modifiers:
+            ## armature modifiers must not deform the exported mesh
+            disabled = [m for m in objct.modifiers
+                        if m.show_render and m.type == 'ARMATURE']
+            for m in disabled:
+                m.show_render = False
+            try:
+                mesh = objct.to_mesh(self.context.scene, True, 'RENDER')
+            finally:
+                for m in disabled:
+                    m.show_render = True
+            ## free the temporary mesh right after extraction
+            try:
+                md = extract_mesh_data(mesh)
+            finally:
+                bpy.data.meshes.remove(mesh)
         else:
-            if face.use_smooth:
-                if mesh.use_auto_smooth:
-                    no = mathutils.Vector(obj_prop[OBJ.ROT] *
-                                          get_autosmooth_normal(
-                                              mesh,
-                                              face,
-                                              face.vertices[face_vi]))
-                else:
-                    no = mathutils.Vector(obj_prop[OBJ.ROT] *
-                                          mesh.vertices[
-                                              face.vertices[face_vi]].normal)
+            md = extract_mesh_data(objct.data)
+        md[MD.KEY] = key
+        self.mesh_data[key] = md
+        CACHE.MESH_DATA[key] = md
+        return md
+
+    def get_material_ids(self, objct):
+        '''return the material ids of all material slots of objct'''
+        key = (tuple(ms.material for ms in objct.material_slots),
+               objct.data.show_double_sided)
+        if key not in self.material_id_tables:
+            self.material_id_tables[key] = [
+                self.get_material_id(ms.material, objct.data.show_double_sided)
+                for ms in objct.material_slots]
+        return self.material_id_tables[key]
+
+    def get_weight_matrix_key(self, objct, md):
+        '''return mesh data key and trainz bone ids of the vertex groups
+        of objct; diagnostic groups added later don't change the key'''
+        ## map vertex group indices to trainz bone ids
+        bone_ids = {}
+        for i, b in enumerate(self.trainz_bones):
+            if b[TB.BONE].name not in bone_ids:
+                bone_ids[b[TB.BONE].name] = i
+        return (md[MD.KEY],
+                tuple((g, bone_ids.get(vg.name))
+                      for g, vg in enumerate(objct.vertex_groups)
+                      if vg.name in bone_ids))
+
+    def get_weight_matrix(self, objct, md):
+        '''return the normalized weight matrix of objct with mesh data md;
+        it's built once and shared by the influence rule and the writer'''
+        key = self.get_weight_matrix_key(objct, md)
+        if key not in self.weight_matrices:
+            group_bone = [None] * len(objct.vertex_groups)
+            for g, b_id in key[1]:
+                group_bone[g] = b_id
+            rows = build_weight_matrix(md[MD.GROUPS], group_bone)
+            overinfluenced = [vi for vi, row in enumerate(rows)
+                              if len(row) > TRAINZLIMIT.INFLUENCES]
+            if ((len(overinfluenced) > 0) and
+                    (get_error_correction() == ERRORHANDLING.CORRECT)):
+                rows = prune_weight_matrix(rows, TRAINZLIMIT.INFLUENCES)
+            self.weight_matrices[key] = {
+                WM.ROWS: normalize_weight_matrix(rows),
+                WM.OVERINFLUENCED: overinfluenced}
+        return self.weight_matrices[key]
+
+    def get_parent_bone_id(self, objct):
+        '''return the id of the nearest parent of objct listed in the
+        trainz bones or None'''
+        parent = objct.parent
+        while parent is not None:
+            for i, b in enumerate(self.trainz_bones):
+                if parent == b[TB.BONE]:
+                    return i
+            parent = parent.parent
+        return None
+
+    def get_influence_strings(self, objct, md):
+        '''return the influences of all vertices of objct as bone/blend
+        strings; vertex group names belong to the object, so instances
+        of the same mesh share a table only if their groups match'''
+        ## search for a parent listed in our trainz-bone-list; it's
+        ## used if a vertex isn't member of a trainz bone vertex group
+        parent_bone_id = self.get_parent_bone_id(objct)
+        key = (self.get_weight_matrix_key(objct, md), parent_bone_id)
+        if key in self.influence_tables:
+            return self.influence_tables[key]
+        parent_string = ''
+        if parent_bone_id is not None:
+            # the parent-influence has always a weight of 1 (100%)
+            parent_string = STRINGF.VERTEX_BB.format(s=0,
+                                                     b=parent_bone_id,
+                                                     w=1.0)
+            self.influence_bones[parent_string] = (parent_bone_id,)
+        result = []
+        vertex_bb = []
+        for row in self.get_weight_matrix(objct, md)[WM.ROWS]:
+            ## if we have no vgs we use the parental influence
+            if len(row) == 0:
+                result.append(parent_string)
             else:
-                no = mathutils.Vector(obj_prop[OBJ.ROT] * face.normal)
-
-        ## texture coords
-        if obj_prop[OBJ.UVL] is not None:
-            uv = (obj_prop[OBJ.UVL][face.index].uv[face_vi][0],
-                  # v must be inverted for trainz
-                  1 - obj_prop[OBJ.UVL][face.index].uv[face_vi][1])
-        else:
-            uv = (0.0, 0.0)
-
-        ## hand over
-        return STRINGF.VERTEX_PNT.format(co=tupel_to_float_str(co),
-                                         no=tupel_to_float_str(no),
-                                         uv=tupel_to_float_str(uv))
+                del vertex_bb[:]
+                for stream, (b_id, w) in enumerate(row):
+                    vertex_bb.append(STRINGF.VERTEX_BB.format(s=stream,
+                                                              b=b_id,
+                                                              w=w))
+                result.append(''.join(vertex_bb))
+                self.influence_bones[result[-1]] = tuple(b_id for b_id, w
+                                                         in row)
+        self.influence_tables[key] = result
+        return result
+
+    def get_canonical_path(self, filepath):
+        '''return the path of the first exported image file with the same
+        content as filepath'''
+        return self.canonical_paths.get(filepath, filepath)
+
+    def get_texture_name(self, image):
+        '''return the path written as textureName for image'''
+        filepath = self.get_canonical_path(bpy.path.abspath(image.filepath))
+        return self.texture_names.get(filepath, filepath)
+
+    def deduplicate_textures(self):
+        '''map image files with identical content to one canonical path'''
+        paths_by_hash = dict()
+        saved_file_bytes = 0
+        saved_memory = 0
+        for m in self.materials:
+            for ts in get_texture_slots(m[MAT.MATERIAL]):
+                if (ts.texture.type != 'IMAGE' or
+                        ts.texture.image is None):
+                    continue
+                filepath = bpy.path.abspath(ts.texture.image.filepath)
+                info = self.get_texture_info_by_path(filepath)
+                if TI.HASH not in info or filepath in self.canonical_paths:
+                    continue
+                canonical = paths_by_hash.setdefault(info[TI.HASH], filepath)
+                self.canonical_paths[filepath] = canonical
+                if canonical != filepath:
+                    self.log("image \"" + filepath + "\" is identical to \"" +
+                             canonical + "\" and exported as such",
+                             LOG.INFO)
+                    saved_file_bytes += info[TI.SIZE]
+                    if TI.FORMAT in info:
+                        saved_memory += get_texture_memory(info[TI.WIDTH],
+                                                           info[TI.HEIGHT],
+                                                           info[TI.ALPHA])
+        if saved_file_bytes > 0:
+            self.log("duplicate images removed: %(f)i bytes of image files, "
+                     "%(m).1f KB of texture memory saved" % {
+                         'f': saved_file_bytes,
+                         'm': saved_memory / 1024.0},
+                     LOG.INFO)
 
-    def get_vertex_bb(self, bone_list, obj, mesh, face, vi):
-        '''return the influences of a vertex in case of an animated mesh'''
-        vertex_bb = []
-        current_stream = 0
-        #### we're looking for vertex groups named like trainz bones
-        #### to add vg influences
-        ## collect all influences to calculate the normalize-factor
-        weight_sum = 0.0
-        for vg in mesh.vertices[face.vertices[vi]].groups:
-            for i, b in enumerate(bone_list):
-                if obj.vertex_groups[vg.group].name == b[TB.BONE].name:
-                    weight_sum += vg.weight
-                    break
-        if weight_sum > 0.0:
-            normalize_factor = 1.0 / weight_sum
-        else:
-            normalize_factor = 1.0
-        ## write out the vertexgroup influences normalized
-        for vg in mesh.vertices[face.vertices[vi]].groups:
-            for i, b in enumerate(bone_list):
-                if obj.vertex_groups[vg.group].name == b[TB.BONE].name:
-                    vertex_bb.append(STRINGF.VERTEX_BB.format(
-                        s=current_stream,
-                        b=i,
-                        w=vg.weight * normalize_factor))
-                    current_stream += 1
-                    break
-        ## if we have no vgs we search for a parental influence
-        if current_stream == 0:
-            ## search for a parent listed in our trainz-bone-list
-            trainz_bone = None
-            parent = obj.parent
-            while (parent is not None) and (trainz_bone is None):
-                if parent is not None:
-                    for b in bone_list:
-                        if parent == b[TB.BONE]:
-                            trainz_bone = parent
-                            break
-                    if trainz_bone is None:
-                        parent = parent.parent
-            ## add parent bone influence if we found one
-            if trainz_bone is not None:
-                # get bone id
-                for i, b in enumerate(bone_list):
-                    if b[TB.BONE] == trainz_bone:
-                        trainz_bone_id = i
-                        break
-                # the parent-influence has always a weight of 1 (100%)
-                vertex_bb.append(STRINGF.VERTEX_BB.format(s=current_stream,
-                                                          b=trainz_bone_id,
-                                                          w=1.0))
-        ## hand out result as string
-        return ''.join(vertex_bb)
+    def package_textures(self):
+        '''copy or convert the images of all exported materials into the
+        asset folder (resized to a power of two) and write a texture.txt
+        file for each of them'''
+        folder = os.path.dirname(os.path.abspath(self.export_filename))
+        ## alpha and tiling of every image over all its uses
+        images = collections.OrderedDict()
+        for m in self.materials:
+            for ts in get_texture_slots(m[MAT.MATERIAL]):
+                if (ts.texture.type != 'IMAGE' or
+                        ts.texture.image is None):
+                    continue
+                filepath = self.get_canonical_path(
+                    bpy.path.abspath(ts.texture.image.filepath))
+                alpha, tile = images.get(filepath, (False, False))
+                images[filepath] = (
+                    alpha or slot_uses_alpha(ts),
+                    tile or ts.texture.extension == 'REPEAT')
+        manifest_filename = os.path.join(folder,
+                                         CONFIG.PACKAGE_MANIFEST_FILENAME)
+        try:
+            with open(manifest_filename, mode='r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            manifest = dict()
+        ## one job per image: (source, stem, target size)
+        jobs = []
+        stems = set()
+        for filepath in images:
+            info = self.get_texture_info_by_path(filepath)
+            if not info[TI.EXISTS]:
+                continue
+            size = None
+            if TI.FORMAT in info:
+                width = get_power_of_two_size(info[TI.WIDTH],
+                                              TRAINZLIMIT.TEXTURE_SIZE)
+                height = get_power_of_two_size(info[TI.HEIGHT],
+                                               TRAINZLIMIT.TEXTURE_SIZE)
+                if (width, height) != (info[TI.WIDTH], info[TI.HEIGHT]):
+                    size = (width, height)
+            base = os.path.splitext(os.path.basename(filepath))[0]
+            if size is not None:
+                base += '_%ix%i' % size
+            stem = base
+            i = 1
+            while stem.lower() in stems:
+                i += 1
+                stem = base + '_' + str(i)
+            stems.add(stem.lower())
+            if (os.path.join(folder, stem + os.path.splitext(filepath)[1]) ==
+                    os.path.abspath(filepath)):
+                ## image is already in place
+                self.texture_names[filepath] = os.path.abspath(filepath)
+                self.write_texture_txt(folder, stem,
+                                       os.path.basename(filepath),
+                                       *images[filepath])
+                continue
+            jobs.append((filepath, stem, size))
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=CONFIG.TEXTURE_THREADS) as executor:
+            futures = [executor.submit(package_texture, source, folder, stem,
+                                       size, manifest.get(stem))
+                       for source, stem, size in jobs]
+        states = collections.Counter()
+        for (source, stem, size), future in zip(jobs, futures):
+            try:
+                filename, key, state = future.result()
+            except Exception as e:
+                self.log("image \"" + source + "\" not packaged: " + str(e),
+                         LOG.WARNING)
+                continue
+            if state == PACKAGE.NOT_RESIZED:
+                self.log("image \"" + source + "\" copied without resizing, "
+                         "format not supported by the resampler",
+                         LOG.WARNING)
+            states[state] += 1
+            manifest[stem] = (key, filename)
+            self.texture_names[source] = os.path.join(folder, filename)
+            self.write_texture_txt(folder, stem, filename, *images[source])
+        with open(manifest_filename, mode='w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        self.log("textures packaged: %(c)i copied, %(r)i resized, "
+                 "%(s)i unchanged" % {
+                     'c': states[PACKAGE.COPIED] + states[PACKAGE.NOT_RESIZED],
+                     'r': states[PACKAGE.CONVERTED],
+                     's': states[PACKAGE.SKIPPED]},
+                 LOG.INFO)
+
+    def write_texture_txt(self, folder, stem, filename, alpha, tile):
+        '''write the Trainz texture.txt file for the image filename'''
+        with open(os.path.join(folder, stem + '.texture.txt'), mode='w',
+                  encoding='utf-8') as f:
+            f.write('Primary=' + filename + '\n')
+            if alpha:
+                f.write('Alpha=' + filename + '\n')
+            f.write('Tile=' + ('st' if tile else 'none') + '\n')
 
     def build_texture_node(self, tex_slot, trainz_tex_type, amount, sl):
-        '''build the xml texture node'''
+        '''collect the values of the xml texture node'''
 
-        # change from 0.95 to 0.96
-        #alpha_source = str(bool(trainz_tex_type == TTT.OPACITY)).lower()
-        alpha_source = str(bool((trainz_tex_type == TTT.OPACITY) or
-                                tex_slot.texture.image.use_alpha)).lower()
+        alpha_source = str(uses_alpha(tex_slot, trainz_tex_type)).lower()
 
         # tile: no distinction between u or v in Blender
         tile = str(tex_slot.texture.extension == 'REPEAT').lower()
@@ -865,9 +2769,11 @@ class TrainzExport:
         if (trainz_tex_type == TTT.BUMP or
                 trainz_tex_type == TTT.DISPLACEMENT):
             flip_green = "<flipGreen>false</flipGreen>"
-        sl.append(STRINGF.TEXTURE % {
-            'n': convert_forbidden_chars(bpy.path.abspath(
-                tex_slot.texture.image.filepath)),
+        sl.append({
+            'n': convert_forbidden_chars(
+                self.get_texture_name(tex_slot.texture.image)),
+            'image': self.get_canonical_path(
+                bpy.path.abspath(tex_slot.texture.image.filepath)),
             'a': alpha_source,
             't': trainz_tex_type,
             'u': tile,
@@ -876,19 +2782,19 @@ class TrainzExport:
             'f': flip_green})
 
     ################################ create ###################################
-    def write_triangles(self, file):
-        '''convert Blender faces to Trainz triangles and write them to file'''
+    def build_triangle_list(self):
+        '''convert the Blender faces of all meshes into one list of
+        triangles over welded vertices'''
+        tl = {TL.VERTICES: [],
+              TL.POSITIONS: [],
+              TL.TRIANGLES: [],
+              TL.OBJECTS: []}
+        vertex_ids = {}  # vertex index per vertex strings
         obj = {}  # a dict to pass this data "by reference" to the subroutines
-        string_triangle = []  # list to collect all strings
-        for objct in self.meshes:
-            self.console_message("write triangles for " + objct.name + "...")
-            obj_triangle_count = 0  # counting exported triangles per object
-            if blender_version < 2063000:
-                pass
-            else:
-                ## with blender 2.63 polygons replace faces -> faces have to
-                ## be generated for rendering
-                objct.data.calc_tessface()
+        for object_id, objct in enumerate(self.meshes):
+            self.console_message("collect triangles of " + objct.name + "...")
+            ## linked duplicates share the extracted mesh data
+            md = self.get_mesh_data(objct)
             ## get the object matrix, extract translation, rotation,
             obj[OBJ.MAT] = objct.matrix_world.copy()
             ## scale if needed
@@ -899,112 +2805,307 @@ class TrainzExport:
             obj[OBJ.LOC] = obj[OBJ.MAT].to_translation()
             obj[OBJ.ROT] = obj[OBJ.MAT].to_quaternion()
             obj[OBJ.SCA] = obj[OBJ.MAT].to_scale()
-            obj[OBJ.UVL] = None
-            if blender_version < 2063000:
-                for uvt in objct.data.uv_textures:
-                    if uvt.active_render:
-                        obj[OBJ.UVL] = uvt.data
-            else:
-                for uvt in objct.data.tessface_uv_textures:
-                    if uvt.active_render:
-                        obj[OBJ.UVL] = uvt.data
-            if blender_version < 2063000:
-                ## iterate through all object faces
-                for face in objct.data.faces:
-                    ## export the first triangle
-                    del string_triangle[:]
-                    material_id = self.get_material_id(
-                        objct.material_slots[face.material_index].material,
-                        objct.data.show_double_sided)
-                    string_triangle.append(STRINGF.TRI_START % material_id)
-                    for vertex_id in (0, 1, 2):
-                        vertex_pnt = self.get_vertex_pnt(obj,
-                                                         objct.data,
-                                                         face,
-                                                         vertex_id)
-                        vertex_bb = self.get_vertex_bb(self.trainz_bones,
-                                                       objct,
-                                                       objct.data,
-                                                       face,
-                                                       vertex_id)
-                        string_triangle.append(STRINGF.VERTEX %
-                                               {'p': vertex_pnt,
-                                                'b': vertex_bb})
-                    file.write(STRINGF.TRI_END % ''.join(string_triangle))
-                    obj_triangle_count += 1
-                    ## check for and export a second triangle
-                    if len(face.vertices) == 4:
-                        del string_triangle[:]
-                        material_id = self.get_material_id(
-                            objct.material_slots[face.material_index].material,
-                            objct.data.show_double_sided)
-                        string_triangle.append(STRINGF.TRI_START % material_id)
-                        for vertex_id in (0, 2, 3):
-                            vertex_pnt = self.get_vertex_pnt(obj,
-                                                             objct.data,
-                                                             face,
-                                                             vertex_id)
-                            vertex_bb = self.get_vertex_bb(self.trainz_bones,
-                                                           objct,
-                                                           objct.data,
-                                                           face,
-                                                           vertex_id)
-                            string_triangle.append(STRINGF.VERTEX %
-                                                   {'p': vertex_pnt,
-                                                    'b': vertex_bb})
-                        file.write(STRINGF.TRI_END % ''.join(string_triangle))
-                        obj_triangle_count += 1
-            else:
-                ## iterate through all object faces;
-                ## tesselation generates only triangles
-                for face in objct.data.tessfaces:
-                    del string_triangle[:]
-                    material_id = self.get_material_id(
-                        objct.material_slots[face.material_index].material,
-                        objct.data.show_double_sided)
-                    string_triangle.append(STRINGF.TRI_START % material_id)
-                    for vertex_id in (0, 1, 2):
-                        vertex_pnt = self.get_vertex_pnt(obj,
-                                                         objct.data,
-                                                         face,
-                                                         vertex_id)
-                        vertex_bb = self.get_vertex_bb(self.trainz_bones,
-                                                       objct,
-                                                       objct.data,
-                                                       face,
-                                                       vertex_id)
-                        string_triangle.append(STRINGF.VERTEX %
-                                               {'p': vertex_pnt,
-                                                'b': vertex_bb})
-                    file.write(STRINGF.TRI_END % ''.join(string_triangle))
-                    obj_triangle_count += 1
-                    ## check for and export a second triangle;
-                    ## indeed tesselation generates only triangles,
-                    ## but only Ngons were tesselated (and quads not)
-                    if len(face.vertices) == 4:
-                        del string_triangle[:]
-                        material_id = self.get_material_id(
-                            objct.material_slots[face.material_index].material,
-                            objct.data.show_double_sided)
-                        string_triangle.append(STRINGF.TRI_START % material_id)
-                        for vertex_id in (0, 2, 3):
-                            vertex_pnt = self.get_vertex_pnt(obj,
-                                                             objct.data,
-                                                             face,
-                                                             vertex_id)
-                            vertex_bb = self.get_vertex_bb(self.trainz_bones,
-                                                           objct,
-                                                           objct.data,
-                                                           face,
-                                                           vertex_id)
-                            string_triangle.append(STRINGF.VERTEX %
-                                                   {'p': vertex_pnt,
-                                                    'b': vertex_bb})
-                        file.write(STRINGF.TRI_END % ''.join(string_triangle))
-                        obj_triangle_count += 1
-            ## print out triangles per object   obj_triangle_count         
-            self.console_message("   ...{:d} triangles written".format
-                                 (obj_triangle_count))
+            ## batched transform of all vertices and corner normals
+            locations = transform_locations(obj, md[MD.CO])
+            co_strings = [tupel_to_float_str(co) for co in locations]
+            no_strings = [tupel_to_float_str(no)
+                          for no in transform_normals(obj, md[MD.NO])]
+            if MD.UV_STR not in md:
+                md[MD.UV_STR] = [tupel_to_float_str(uv) for uv in md[MD.UV]]
+            uv_strings = md[MD.UV_STR]
+            ## slots without a collected material are skipped
+            material_ids = [self.material_id_map[i] if i >= 0 else None
+                            for i in self.get_material_ids(objct)]
+            material_ids += [None] * (max(md[MD.TRI_MAT] or [0]) + 1 -
+                                      len(material_ids))
+            ## materials moved into a texture atlas need new uvs
+            uv_transforms = [self.uv_transforms.get(i)
+                             for i in self.get_material_ids(objct)]
+            if any(uv_transforms):
+                uv_strings = list(uv_strings)
+                for t, material_index in enumerate(md[MD.TRI_MAT]):
+                    transform = None
+                    if material_index < len(uv_transforms):
+                        transform = uv_transforms[material_index]
+                    if transform is not None:
+                        for c in range(3 * t, 3 * t + 3):
+                            u, v = md[MD.UV][c]
+                            uv_strings[c] = tupel_to_float_str(
+                                (u * transform[0] + transform[1],
+                                 v * transform[2] + transform[3]))
+            vertex_bbs = self.get_influence_strings(objct, md)
+            ## objects without influences are moved by their parent bone
+            if all(len(row) == 0 for row in
+                   self.get_weight_matrix(objct, md)[WM.ROWS]):
+                self.static_objects.add(object_id)
+                parent_bone_id = self.get_parent_bone_id(objct)
+                if parent_bone_id is not None:
+                    self.static_bone_ids[object_id] = parent_bone_id
+            tri_vert = md[MD.TRI_VERT]
+            for t, material_index in enumerate(md[MD.TRI_MAT]):
+                if material_ids[material_index] is None:
+                    continue
+                triangle = [material_ids[material_index]]
+                for c in range(3 * t, 3 * t + 3):
+                    key = (co_strings[tri_vert[c]],
+                           no_strings[c],
+                           uv_strings[c],
+                           vertex_bbs[tri_vert[c]])
+                    vertex_id = vertex_ids.get(key)
+                    if vertex_id is None:
+                        vertex_id = vertex_ids[key] = len(tl[TL.VERTICES])
+                        tl[TL.VERTICES].append(key)
+                        tl[TL.POSITIONS].append(
+                            tuple(locations[tri_vert[c]]))
+                    triangle.append(vertex_id)
+                tl[TL.TRIANGLES].append(triangle)
+                tl[TL.OBJECTS].append(object_id)
+            ## print out triangles per object
+            self.console_message("   ...{:d} triangles collected".format
+                                 (len(md[MD.TRI_MAT])))
+        if CONFIG.remove_redundant_triangles:
+            tl = self.remove_redundant_triangles(tl)
+        return tl
+
+    def remove_redundant_triangles(self, tl):
+        '''remove triangles without area and duplicated triangles from the
+        triangle list tl and log the counts per object'''
+        degenerated, duplicates = find_redundant_triangles(tl)
+        if len(degenerated) + len(duplicates) == 0:
+            return tl
+        for name, removed in (("triangles without area", degenerated),
+                              ("duplicated triangles", duplicates)):
+            counts = collections.Counter(tl[TL.OBJECTS][t] for t in removed)
+            for object_id in sorted(counts):
+                self.log("Object \"" + self.meshes[object_id].name +
+                         "\": %i %s removed" % (counts[object_id], name),
+                         LOG.INFO)
+        removed = set(degenerated) | set(duplicates)
+        return extract_triangles(tl, [t for t in range(len(tl[TL.OBJECTS]))
+                                      if t not in removed])
+
+    def process_triangle_list(self, tl, label):
+        '''apply the enabled optimisations to the triangle list tl of the
+        output label and return the result'''
+        if CONFIG.group_by_material or CONFIG.merge_static_objects:
+            tl = self.batch_triangles(tl)
+        if CONFIG.bone_palette > 0:
+            tl = self.partition_bone_palettes(tl, label)
+        if CONFIG.optimize_vertex_cache:
+            tl = self.optimize_triangle_order(tl, label)
+        tl = self.enforce_vertex_limit(tl, label)
+        tl = self.split_material_groups(tl)
+        self.draw_calls[label] = count_runs(self.get_batch_keys(tl))
+        self.log("%(l)s: %(d)i draw calls (estimated)" % {
+                     'l': label,
+                     'd': self.draw_calls[label]},
+                 LOG.INFO)
+        return tl
+
+    def get_batch_keys(self, tl):
+        '''return the material and batch of every triangle in tl; each run
+        of triangles with the same key is one draw call'''
+        static_bone_ids = {}
+        if CONFIG.merge_static_objects:
+            static_bone_ids = self.static_bone_ids
+        batch_keys = [(t[0], ('b', static_bone_ids[o])
+                       if o in static_bone_ids else ('o', o))
+                      for t, o in zip(tl[TL.TRIANGLES], tl[TL.OBJECTS])]
+        for part in (TL.PALETTES, TL.SPLITS):
+            if part in tl:
+                batch_keys = [key + (p,) for key, p
+                              in zip(batch_keys, tl[part])]
+        return batch_keys
+
+    def enforce_vertex_limit(self, tl, label):
+        '''count the unique vertices of every material group and split the
+        ones with more than CONFIG.vertex_limit vertices in triangle order'''
+        if CONFIG.vertex_limit <= 0:
+            return tl
+        groups = collections.OrderedDict()  # triangles per material group
+        for t, triangle in enumerate(tl[TL.TRIANGLES]):
+            key = (triangle[0], tl[TL.PALETTES][t] if TL.PALETTES in tl
+                   else 0)
+            groups.setdefault(key, []).append(t)
+        splits = [0] * len(tl[TL.TRIANGLES])
+        for (material_id, palette), triangles in groups.items():
+            vertices = set()
+            count = set()
+            split = 0
+            for t in triangles:
+                triangle = set(tl[TL.TRIANGLES][t][1:])
+                if (len(vertices) + len(triangle - vertices) >
+                        CONFIG.vertex_limit):
+                    split += 1
+                    vertices = set()
+                vertices |= triangle
+                count |= triangle
+                splits[t] = split
+            if split > 0:
+                self.log("%(l)s: material %(m)i has %(v)i vertices, more "
+                         "than %(n)i, split into %(p)i groups" % {
+                             'l': label,
+                             'm': material_id,
+                             'v': len(count),
+                             'n': CONFIG.vertex_limit,
+                             'p': split + 1},
+                         LOG.INFO)
+        result = dict(tl)
+        result[TL.SPLITS] = splits
+        return result
+
+    def batch_triangles(self, tl):
+        '''sort the triangles of tl into contiguous runs per material
+        and batch; static objects under the same trainz bone share a
+        batch if they are merged'''
+        batch_keys = self.get_batch_keys(tl)
+        batch_ranks = {}
+        for key in batch_keys:
+            batch_ranks.setdefault(key[1], len(batch_ranks))
+        if CONFIG.group_by_material:
+            order = sorted(range(len(batch_keys)), key=lambda t: (
+                batch_keys[t][0], batch_ranks[batch_keys[t][1]]))
+        else:
+            order = sorted(range(len(batch_keys)), key=lambda t: (
+                batch_ranks[batch_keys[t][1]], batch_keys[t][0]))
+        return reorder_triangles(tl, order)
+
+    def partition_bone_palettes(self, tl, label):
+        '''split the triangles of every material into palettes which use
+        at most CONFIG.bone_palette bones'''
+        vertex_bones = [self.influence_bones.get(bb, ())
+                        for co, no, uv, bb in tl[TL.VERTICES]]
+        triangle_bones = [frozenset(b for v in t[1:] for b in vertex_bones[v])
+                          for t in tl[TL.TRIANGLES]]
+        material_triangles = collections.OrderedDict()
+        for t, triangle in enumerate(tl[TL.TRIANGLES]):
+            material_triangles.setdefault(triangle[0], []).append(t)
+        palette_ids = [0] * len(triangle_bones)
+        palettes = []
+        duplicated = 0
+        for triangles in material_triangles.values():
+            ids, material_palettes = partition_bone_palettes(
+                [triangle_bones[t] for t in triangles], CONFIG.bone_palette)
+            for t, palette_id in zip(triangles, ids):
+                palette_ids[t] = len(palettes) + palette_id
+            ## vertices used by several palettes are written per palette
+            vertex_palettes = collections.defaultdict(set)
+            for t in triangles:
+                for v in tl[TL.TRIANGLES][t][1:]:
+                    vertex_palettes[v].add(palette_ids[t])
+            duplicated += sum(len(p) - 1 for p in vertex_palettes.values())
+            palettes.extend(material_palettes)
+        ## keep the palettes of each draw call together
+        batch_keys = self.get_batch_keys(tl)
+        runs = [0] * len(batch_keys)
+        for t in range(1, len(batch_keys)):
+            runs[t] = runs[t - 1] + (batch_keys[t] != batch_keys[t - 1])
+        result = dict(tl)
+        result[TL.PALETTES] = palette_ids
+        result = reorder_triangles(result, sorted(
+            range(len(batch_keys)), key=lambda t: (runs[t], palette_ids[t])))
+        for palette in palettes:
+            if len(palette) > CONFIG.bone_palette:
+                self.log("%(l)s: triangles use %(n)i bones, more than the "
+                         "palette of %(k)i bones" % {
+                             'l': label,
+                             'n': len(palette),
+                             'k': CONFIG.bone_palette},
+                         LOG.WARNING)
+        self.log("%(l)s: %(p)i bone palettes in %(m)i materials with %(b)s "
+                 "bones, %(d)i vertices duplicated" % {
+                     'l': label,
+                     'p': len(palettes),
+                     'm': len(material_triangles),
+                     'b': ', '.join(str(len(p)) for p in palettes),
+                     'd': duplicated},
+                 LOG.INFO)
+        return result
+
+    def split_material_groups(self, tl):
+        '''give every bone palette and vertex limit split of a material its
+        own copy of the material, so TMI builds a separate material group
+        for it'''
+        parts = [part for part in (TL.PALETTES, TL.SPLITS) if part in tl]
+        if len(parts) == 0:
+            return tl
+        materials = list(tl.get(TL.MATERIALS, self.exported_materials))
+        group_ids = {}  # written material id per material and part
+        copies = collections.Counter()  # groups per material
+        triangles = []
+        for t, triangle in enumerate(tl[TL.TRIANGLES]):
+            key = (triangle[0],) + tuple(tl[part][t] for part in parts)
+            if key not in group_ids:
+                if copies[triangle[0]] == 0:
+                    group_ids[key] = triangle[0]
+                else:
+                    em = dict(materials[triangle[0]])
+                    em[EM.NAME] = get_material_part_name(
+                        em[EM.NAME], copies[triangle[0]])
+                    group_ids[key] = len(materials)
+                    materials.append(em)
+                copies[triangle[0]] += 1
+            triangles.append([group_ids[key]] + triangle[1:])
+        result = dict(tl)
+        result[TL.TRIANGLES] = triangles
+        result[TL.MATERIALS] = materials
+        return result
+
+    def optimize_triangle_order(self, tl, label):
+        '''reorder the triangles of every draw call for the post transform
+        vertex cache'''
+        triangles = [t[1:] for t in tl[TL.TRIANGLES]]
+        acmr_before = get_acmr(triangles, CONFIG.VERTEX_CACHE_SIZE)
+        batch_keys = self.get_batch_keys(tl)
+        order = []
+        start = 0
+        for end in range(1, len(triangles) + 1):
+            if (end == len(triangles) or
+                    batch_keys[end] != batch_keys[start]):
+                order.extend(start + t for t in optimize_vertex_cache(
+                    triangles[start:end], CONFIG.VERTEX_CACHE_SIZE))
+                start = end
+        result = reorder_triangles(tl, order)
+        self.log("%(l)s vertex cache: ACMR %(b).3f -> %(a).3f" % {
+                     'l': label,
+                     'b': acmr_before,
+                     'a': get_acmr([t[1:] for t in result[TL.TRIANGLES]],
+                                   CONFIG.VERTEX_CACHE_SIZE)},
+                 LOG.INFO)
+        return result
+
+    def write_triangles(self, file, tl):
+        '''write the triangles of the triangle list tl to file'''
+        if CONFIG.compact_numbers:
+            ## the welded strings are re-encoded once per distinct value
+            encoded = [{}, {}, {}, {}]
+            digits = (FPM.NDIGITS,
+                      max(0, min(CONFIG.normal_digits, FPM.NDIGITS)),
+                      max(0, min(CONFIG.uv_digits, FPM.NDIGITS)))
+            vertices = []
+            for vertex in tl[TL.VERTICES]:
+                for channel in range(3):
+                    if vertex[channel] not in encoded[channel]:
+                        encoded[channel][vertex[channel]] = compact_float_str(
+                            vertex[channel], digits[channel])
+                if vertex[3] not in encoded[3]:
+                    encoded[3][vertex[3]] = STRINGF.BLEND_VALUE.sub(
+                        lambda m: compact_float_str(m.group(0),
+                                                    FPM.NDIGITS),
+                        vertex[3])
+                vertices.append([encoded[c][vertex[c]] for c in range(4)])
+        else:
+            vertices = tl[TL.VERTICES]
+        vertex_strings = [STRINGF.VERTEX % {
+            'p': STRINGF.VERTEX_PNT.format(co=co, no=no, uv=uv),
+            'b': bb} for co, no, uv, bb in vertices]
+        for material_id, v0, v1, v2 in tl[TL.TRIANGLES]:
+            file.write(STRINGF.TRI_END % (STRINGF.TRI_START % material_id +
+                                          vertex_strings[v0] +
+                                          vertex_strings[v1] +
+                                          vertex_strings[v2]))
+        self.console_message("{:d} triangles written".format(
+            len(tl[TL.TRIANGLES])))
 
     def write_attachments(self, file):
         '''write attachment-empties into file'''
@@ -1029,14 +3130,14 @@ class TrainzExport:
                     p=tupel_to_float_str(ap_matrix.to_translation()),
                     o=quat_to_jet_quat_str(ap_matrix.to_quaternion())))
 
-    def write_mesh_section(self, file):
+    def write_mesh_section(self, file, mesh_name, tl):
         '''create mesh section strings and write them into file'''
         file.write(IND1 + "<mesh>\n")  # mesh section opener
         file.write(IND2 + "<name>" +
-                   convert_forbidden_chars(self.get_mesh_name()) +
+                   convert_forbidden_chars(mesh_name) +
                    "</name>\n")
         file.write(IND2 + "<triangles>\n")  # start triangle section
-        self.write_triangles(file)  # convert Blender faces to Trainz triangles
+        self.write_triangles(file, tl)  # the collected Trainz triangles
         file.write(IND2 + "</triangles>\n")  # end triangle section
         ## append an attachment section if necessary
         if len(self.attachment_points) > 0:
@@ -1081,328 +3182,501 @@ class TrainzExport:
             ## skeleton section closer
             file.write(IND2 + "</bones>\n" + IND1 + "</skeleton>\n")
 
-    def write_material_section(self, file):
-        '''dump the material definitions into file'''
-        ## material section opener
-        file.write(IND1 + '<materials>\n')
-        ## iterate through all materials
-        texture_sl = []  # use a string list for texture processing
+    def build_material(self, mat):
+        '''return the exported material of mat'''
+        texture_sl = []  # list of texture node values
         ambient = []  # list to hold rgb tupel
         diffuse = []  # list to hold rgb tupel
         specular = []  # list to hold rgb tupel
         emissive = []  # list to hold rgb tupel
-        for mat_id, mat in enumerate(self.materials):
-            ## material opener
-            file.write(IND2 + '<material>\n')
-            #### to check the material names, we need the textures first
-            del texture_sl[:]
-            ## textures
-            #
-            #  Jet name                    meaning               Blender name
-            #
-            #jTEX_AMBIENT       =  0 # -> ambient color         <- Amb(value)
-            #jTEX_DIFFUSE       =  1 # -> diffuse color         <- Col
-            #jTEX_SPECULAR      =  2 # -> specular color        <- Csp
-            #jTEX_SHINE         =  3 # -> specular level        <- Spec(value)
-            #jTEX_SHINESTRENGTH =  4 # -> glossiness            <- Hard(value)
-            #jTEX_SELFILLUM     =  5 # -> self-illumination     <- Emit(value)
-            #jTEX_OPACITY       =  6 # -> opacity               <- Alpha(value)
-            #jTEX_FILTERCOLOR   =  7 # -> filter color          <- TransLu???
-            #jTEX_BUMP          =  8 # -> normal                <- Nor(normal)
-            #jTEX_REFLECT       =  9 # -> reflection            <- Ref(value)
-            #jTEX_REFRACT       = 10 # -> refraction            <- RayMir???
-            #jTEX_DISPLACEMENT  = 11 # -> displacement          <- Disp
-            #
-            ## to recognise the used textures we use some booleans
-            ambient_texture_used = False
-            diffuse_texture_used = False
-            spec_col_texture_used = False
-            spec_val_texture_used = False
-            glossiness_texture_used = False
-            self_illum_texture_used = False
-            opacity_texture_used = False
-            filter_color_texture_used = False
-            normal_texture_used = False
-            reflection_texture_used = False
-            refraction_texture_used = False
-            displacement_texture_used = False
-            ## iterate through all enabled textures
-            for i, ts in enumerate(mat[MAT.MATERIAL].texture_slots):
-                if (mat[MAT.MATERIAL].use_textures[i] and
-                        ts is not None and
-                        ts.texture.type == 'IMAGE'):
-                    if ts.use_map_ambient:
-                        ambient_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.AMBIENT,
-                                                abs(ts.ambient_factor),
-                                                texture_sl)  # "abs()"ed
-                    if ts.use_map_color_diffuse and ts.texture_coords == 'UV':
-                        diffuse_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.DIFFUSE,
-                                                ts.diffuse_color_factor,
-                                                texture_sl)
-                    if ts.use_map_color_spec:
-                        spec_col_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.SPECULAR,
-                                                ts.specular_color_factor,
-                                                texture_sl)
-                    if ts.use_map_specular:
-                        spec_val_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.SHINE,
-                                                abs(ts.specular_factor),
-                                                texture_sl)  # "abs()"ed
-                    if ts.use_map_hardness:
-                        glossiness_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.SHINESTRENGTH,
-                                                abs(ts.hardness_factor),
-                                                texture_sl)  # "abs()"ed
-                    if ts.use_map_emit:
-                        self_illum_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.SELFILLUM,
-                                                abs(ts.emit_factor),
-                                                texture_sl)  # "abs()"ed
-                    if ts.use_map_alpha:
-                        opacity_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.OPACITY,
-                                                abs(ts.alpha_factor),
-                                                texture_sl)  # "abs()"ed
-                    if ts.use_map_translucency:
-                        filter_color_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.FILTERCOLOR,
-                                                abs(ts.translucency_factor),
-                                                texture_sl)  # "abs()"ed
-                    if ts.use_map_normal:
-                        normal_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.BUMP,    # "abs()"ed and
-                                                abs(ts.normal_factor) / 5.0,
-                                                texture_sl)  # scaled
-                    # use tex_coordinates to check for a reflection texture
-                    if (ts.use_map_color_diffuse and
-                            ts.texture_coords == 'REFLECTION'):
-                        reflection_texture_used = True
-                        # the reflection map influences the diffuse color,
-                        # so we use diffuse_color_factor
-                        self.build_texture_node(ts,
-                                                TTT.REFLECT,
-                                                ts.diffuse_color_factor,
-                                                texture_sl)
-                    # vvv ???? same as max refraction ???? vvv
-                    #if ts.use_map_colortransmission:
-                    #    refraction_texture_used = True
-                    #    self.build_texture_node(ts, TTT.REFRACT, \
-                    #        ts.colortransmission_factor, texture_sl)
-                    if ts.use_map_displacement:
-                        displacement_texture_used = True
-                        self.build_texture_node(ts,
-                                                TTT.DISPLACEMENT,
-                                                abs(ts.displacement_factor),
-                                                texture_sl)  # "abs()"ed
-            ## as we know now what textures are used, we can
-            ## decorate undecorated matnames and check decorated ones
-            # only lower case characters allowed in material names
-            material_name = mat[MAT.MATERIAL].name.lower()
-            if material_name.find(DECO.MARKER) != -1:
-                undecorated_material = False
-                mat_decoration = (DECO.MARKER +
-                                  material_name.split(DECO.MARKER)[-1])
-                if (material_name.split(DECO.MARKER)[-1] not in
-                        OFFICIAL_DECORATIONS):  # check for known mat decos
-                    self.log("Material \"" + mat[MAT.MATERIAL].name +
-                             "\" uses an unknown or inofficial Material "
-                             "Decoration",
-                             LOG.WARNING)
-            else:
-                undecorated_material = True
-            ## choose material decoration according used textures
-            # initiate, if no texture is applied(as NOTEX does cause
-            # render errors by some asset types, traincar for example)
-            mat_deco_proposal = DECO.MARKER + DECO.ONETEX
-            ## material with unsupported single texture maps; as NOTEX does
-            ## cause render errors by some asset types, traincar for example,
-            ## I choose ONETEX instead
-            if (ambient_texture_used or
-                    spec_col_texture_used or
-                    spec_val_texture_used or
-                    glossiness_texture_used or
-                    self_illum_texture_used or
-                    opacity_texture_used or
-                    filter_color_texture_used or
-                    normal_texture_used or
-                    refraction_texture_used or
-                    displacement_texture_used):
-                mat_deco_proposal = DECO.MARKER + DECO.ONETEX
-            ## materials with one texture map
-            if reflection_texture_used:
-                mat_deco_proposal = DECO.MARKER + DECO.REFLECT
-            if diffuse_texture_used:
-                mat_deco_proposal = DECO.MARKER + DECO.ONETEX
-            ## materials with two texture maps
-            if diffuse_texture_used and opacity_texture_used:
-                mat_deco_proposal = DECO.MARKER + DECO.ONETEX
-            if diffuse_texture_used and reflection_texture_used:
-                mat_deco_proposal = DECO.MARKER + DECO.REFLECT
-            ## material with three texture maps
-            if (diffuse_texture_used and
-                    opacity_texture_used and
-                    reflection_texture_used):
-                mat_deco_proposal = DECO.MARKER + DECO.GLOSS
-            ## materials with normal textures
-            if normal_texture_used and diffuse_texture_used:
-                if (opacity_texture_used and
-                        reflection_texture_used):        # not supported
-                    mat_deco_proposal = DECO.MARKER + DECO.TBUMPTEX
-                    self.log("Material \"" + mat[MAT.MATERIAL] +
-                             "\" uses Diffuse, Normal, Alpha and Reflection "
-                             "Map; so far no Material Type support this, fall"
-                             " back to tbumptex",
-                             LOG.WARNING)
-                if (reflection_texture_used and
-                        (not opacity_texture_used)):     # gloss
-                    mat_deco_proposal = DECO.MARKER + DECO.TBUMPGLOSS
-                if ((not reflection_texture_used) and
-                        opacity_texture_used):           # tex
-                    mat_deco_proposal = DECO.MARKER + DECO.TBUMPTEX
-                if ((not opacity_texture_used) and
-                        (not reflection_texture_used)):  # tex or env
-                    mat_deco_proposal = DECO.MARKER + DECO.TBUMPENV
-            ## now assign or check against the proposal
-            if undecorated_material:
-                material_name += DECO.DOT + mat_deco_proposal
+        #### to check the material names, we need the textures first
+        ## textures
+        #
+        #  Jet name                    meaning               Blender name
+        #
+        #jTEX_AMBIENT       =  0 # -> ambient color         <- Amb(value)
+        #jTEX_DIFFUSE       =  1 # -> diffuse color         <- Col
+        #jTEX_SPECULAR      =  2 # -> specular color        <- Csp
+        #jTEX_SHINE         =  3 # -> specular level        <- Spec(value)
+        #jTEX_SHINESTRENGTH =  4 # -> glossiness            <- Hard(value)
+        #jTEX_SELFILLUM     =  5 # -> self-illumination     <- Emit(value)
+        #jTEX_OPACITY       =  6 # -> opacity               <- Alpha(value)
+        #jTEX_FILTERCOLOR   =  7 # -> filter color          <- TransLu???
+        #jTEX_BUMP          =  8 # -> normal                <- Nor(normal)
+        #jTEX_REFLECT       =  9 # -> reflection            <- Ref(value)
+        #jTEX_REFRACT       = 10 # -> refraction            <- RayMir???
+        #jTEX_DISPLACEMENT  = 11 # -> displacement          <- Disp
+        #
+        ## iterate through all enabled textures
+        used_types = set()
+        for i, ts in enumerate(mat[MAT.MATERIAL].texture_slots):
+            if (mat[MAT.MATERIAL].use_textures[i] and
+                    ts is not None and
+                    ts.texture.type == 'IMAGE'):
+                for trainz_tex_type, amount in get_texture_maps(ts):
+                    used_types.add(trainz_tex_type)
+                    self.build_texture_node(ts,
+                                            trainz_tex_type,
+                                            amount,
+                                            texture_sl)
+        ambient_texture_used = TTT.AMBIENT in used_types
+        diffuse_texture_used = TTT.DIFFUSE in used_types
+        spec_col_texture_used = TTT.SPECULAR in used_types
+        spec_val_texture_used = TTT.SHINE in used_types
+        glossiness_texture_used = TTT.SHINESTRENGTH in used_types
+        self_illum_texture_used = TTT.SELFILLUM in used_types
+        opacity_texture_used = TTT.OPACITY in used_types
+        filter_color_texture_used = TTT.FILTERCOLOR in used_types
+        normal_texture_used = TTT.BUMP in used_types
+        reflection_texture_used = TTT.REFLECT in used_types
+        refraction_texture_used = TTT.REFRACT in used_types
+        displacement_texture_used = TTT.DISPLACEMENT in used_types
+        ## as we know now what textures are used, we can
+        ## decorate undecorated matnames and check decorated ones
+        # only lower case characters allowed in material names
+        material_name = mat[MAT.MATERIAL].name.lower()
+        if material_name.find(DECO.MARKER) != -1:
+            undecorated_material = False
+            mat_decoration = (DECO.MARKER +
+                              material_name.split(DECO.MARKER)[-1])
+            if (material_name.split(DECO.MARKER)[-1] not in
+                    OFFICIAL_DECORATIONS):  # check for known mat decos
                 self.log("Material \"" + mat[MAT.MATERIAL].name +
-                         "\" exported as \"" + material_name + "\"",
+                         "\" uses an unknown or inofficial Material "
+                         "Decoration",
+                         LOG.WARNING)
+        else:
+            undecorated_material = True
+        ## choose material decoration according used textures
+        # initiate, if no texture is applied(as NOTEX does cause
+        # render errors by some asset types, traincar for example)
+        mat_deco_proposal = DECO.MARKER + DECO.ONETEX
+        ## material with unsupported single texture maps; as NOTEX does
+        ## cause render errors by some asset types, traincar for example,
+        ## I choose ONETEX instead
+        if (ambient_texture_used or
+                spec_col_texture_used or
+                spec_val_texture_used or
+                glossiness_texture_used or
+                self_illum_texture_used or
+                opacity_texture_used or
+                filter_color_texture_used or
+                normal_texture_used or
+                refraction_texture_used or
+                displacement_texture_used):
+            mat_deco_proposal = DECO.MARKER + DECO.ONETEX
+        ## materials with one texture map
+        if reflection_texture_used:
+            mat_deco_proposal = DECO.MARKER + DECO.REFLECT
+        if diffuse_texture_used:
+            mat_deco_proposal = DECO.MARKER + DECO.ONETEX
+        ## materials with two texture maps
+        if diffuse_texture_used and opacity_texture_used:
+            mat_deco_proposal = DECO.MARKER + DECO.ONETEX
+        if diffuse_texture_used and reflection_texture_used:
+            mat_deco_proposal = DECO.MARKER + DECO.REFLECT
+        ## material with three texture maps
+        if (diffuse_texture_used and
+                opacity_texture_used and
+                reflection_texture_used):
+            mat_deco_proposal = DECO.MARKER + DECO.GLOSS
+        ## materials with normal textures
+        if normal_texture_used and diffuse_texture_used:
+            if (opacity_texture_used and
+                    reflection_texture_used):        # not supported
+                mat_deco_proposal = DECO.MARKER + DECO.TBUMPTEX
+                self.log("Material \"" + mat[MAT.MATERIAL] +
+                         "\" uses Diffuse, Normal, Alpha and Reflection "
+                         "Map; so far no Material Type support this, fall"
+                         " back to tbumptex",
+                         LOG.WARNING)
+            if (reflection_texture_used and
+                    (not opacity_texture_used)):     # gloss
+                mat_deco_proposal = DECO.MARKER + DECO.TBUMPGLOSS
+            if ((not reflection_texture_used) and
+                    opacity_texture_used):           # tex
+                mat_deco_proposal = DECO.MARKER + DECO.TBUMPTEX
+            if ((not opacity_texture_used) and
+                    (not reflection_texture_used)):  # tex or env
+                mat_deco_proposal = DECO.MARKER + DECO.TBUMPENV
+        ## now assign or check against the proposal
+        if undecorated_material:
+            material_name += DECO.DOT + mat_deco_proposal
+            self.log("Material \"" + mat[MAT.MATERIAL].name +
+                     "\" exported as \"" + material_name + "\"",
+                     LOG.INFO)
+        else:
+            ## inform if proposal differs from used material decoration
+            if mat_decoration != mat_deco_proposal:
+                self.log("decoration for Material \"" +
+                         mat[MAT.MATERIAL].name +
+                         "\" differs from the proposed decoration \"" +
+                         mat_deco_proposal + "\"",
                          LOG.INFO)
-            else:
-                ## inform if proposal differs from used material decoration
-                if mat_decoration != mat_deco_proposal:
-                    self.log("decoration for Material \"" +
-                             mat[MAT.MATERIAL].name +
-                             "\" differs from the proposed decoration \"" +
-                             mat_deco_proposal + "\"",
-                             LOG.INFO)
-            #### material properties
-            # to made it easier to set up a blender scene it's possible to
-            # ignore the ambient value and export instead the diffuse value,
-            # if you really export Blenders ambient value the appearance in
-            # Trainz is totally different because the shaders used in Blender
-            # and Trainz differs
-            del ambient[:]
-            if CONFIG.export_diffuse_as_ambient:
-                ambient.append(mat[MAT.MATERIAL].diffuse_color.r *
-                               mat[MAT.MATERIAL].diffuse_intensity)
-                ambient.append(mat[MAT.MATERIAL].diffuse_color.g *
-                               mat[MAT.MATERIAL].diffuse_intensity)
-                ambient.append(mat[MAT.MATERIAL].diffuse_color.b *
-                               mat[MAT.MATERIAL].diffuse_intensity)
-            else:
-                ambient.append(self.context.scene.world.ambient_color.r *
-                               mat[MAT.MATERIAL].ambient)
-                ambient.append(self.context.scene.world.ambient_color.g *
-                               mat[MAT.MATERIAL].ambient)
-                ambient.append(self.context.scene.world.ambient_color.b *
-                               mat[MAT.MATERIAL].ambient)
-            # diffuse_color will be combined with diffuse_intensity
-            # to get the JetDiffuseColor
-            del diffuse[:]
-            diffuse.append(mat[MAT.MATERIAL].diffuse_color.r *
+        #### material properties
+        # to made it easier to set up a blender scene it's possible to
+        # ignore the ambient value and export instead the diffuse value,
+        # if you really export Blenders ambient value the appearance in
+        # Trainz is totally different because the shaders used in Blender
+        # and Trainz differs
+        del ambient[:]
+        if CONFIG.export_diffuse_as_ambient:
+            ambient.append(mat[MAT.MATERIAL].diffuse_color.r *
                            mat[MAT.MATERIAL].diffuse_intensity)
-            diffuse.append(mat[MAT.MATERIAL].diffuse_color.g *
+            ambient.append(mat[MAT.MATERIAL].diffuse_color.g *
                            mat[MAT.MATERIAL].diffuse_intensity)
-            diffuse.append(mat[MAT.MATERIAL].diffuse_color.b *
+            ambient.append(mat[MAT.MATERIAL].diffuse_color.b *
                            mat[MAT.MATERIAL].diffuse_intensity)
-            # specular_color will be combined with specular_intensity to
-            # get the JetSpecularColor
-            del specular[:]
-            specular.append(mat[MAT.MATERIAL].specular_color.r *
-                            mat[MAT.MATERIAL].specular_intensity)
-            specular.append(mat[MAT.MATERIAL].specular_color.g *
-                            mat[MAT.MATERIAL].specular_intensity)
-            specular.append(mat[MAT.MATERIAL].specular_color.b *
-                            mat[MAT.MATERIAL].specular_intensity)
-            # in blender the diffuse color is used for emitting light; to use
-            # a different color like in max/gmax the "unused" mirror color in
-            # the raytrace reflection section can be used but
-            # without any visual feedback in Blender
-            del emissive[:]
-            if CONFIG.export_mirror_as_emit:
-                emissive.append(mat[MAT.MATERIAL].mirror_color.r *
-                                mat[MAT.MATERIAL].emit)
-                emissive.append(mat[MAT.MATERIAL].mirror_color.g *
-                                mat[MAT.MATERIAL].emit)
-                emissive.append(mat[MAT.MATERIAL].mirror_color.b *
-                                mat[MAT.MATERIAL].emit)
-            else:
-                emissive.append(mat[MAT.MATERIAL].diffuse_color.r *
-                                mat[MAT.MATERIAL].emit)
-                emissive.append(mat[MAT.MATERIAL].diffuse_color.g *
-                                mat[MAT.MATERIAL].emit)
-                emissive.append(mat[MAT.MATERIAL].diffuse_color.b *
-                                mat[MAT.MATERIAL].emit)
-            hardness = round((mat[MAT.MATERIAL].specular_hardness - 1) / 510.0,
-                             FPM.NDIGITS)
-            if mat[MAT.MATERIAL].use_transparency:
-                opacity = round(mat[MAT.MATERIAL].alpha, FPM.NDIGITS)
-            else:
-                opacity = 1.0
+        else:
+            ambient.append(self.context.scene.world.ambient_color.r *
+                           mat[MAT.MATERIAL].ambient)
+            ambient.append(self.context.scene.world.ambient_color.g *
+                           mat[MAT.MATERIAL].ambient)
+            ambient.append(self.context.scene.world.ambient_color.b *
+                           mat[MAT.MATERIAL].ambient)
+        # diffuse_color will be combined with diffuse_intensity
+        # to get the JetDiffuseColor
+        del diffuse[:]
+        diffuse.append(mat[MAT.MATERIAL].diffuse_color.r *
+                       mat[MAT.MATERIAL].diffuse_intensity)
+        diffuse.append(mat[MAT.MATERIAL].diffuse_color.g *
+                       mat[MAT.MATERIAL].diffuse_intensity)
+        diffuse.append(mat[MAT.MATERIAL].diffuse_color.b *
+                       mat[MAT.MATERIAL].diffuse_intensity)
+        # specular_color will be combined with specular_intensity to
+        # get the JetSpecularColor
+        del specular[:]
+        specular.append(mat[MAT.MATERIAL].specular_color.r *
+                        mat[MAT.MATERIAL].specular_intensity)
+        specular.append(mat[MAT.MATERIAL].specular_color.g *
+                        mat[MAT.MATERIAL].specular_intensity)
+        specular.append(mat[MAT.MATERIAL].specular_color.b *
+                        mat[MAT.MATERIAL].specular_intensity)
+        # in blender the diffuse color is used for emitting light; to use
+        # a different color like in max/gmax the "unused" mirror color in
+        # the raytrace reflection section can be used but
+        # without any visual feedback in Blender
+        del emissive[:]
+        if CONFIG.export_mirror_as_emit:
+            emissive.append(mat[MAT.MATERIAL].mirror_color.r *
+                            mat[MAT.MATERIAL].emit)
+            emissive.append(mat[MAT.MATERIAL].mirror_color.g *
+                            mat[MAT.MATERIAL].emit)
+            emissive.append(mat[MAT.MATERIAL].mirror_color.b *
+                            mat[MAT.MATERIAL].emit)
+        else:
+            emissive.append(mat[MAT.MATERIAL].diffuse_color.r *
+                            mat[MAT.MATERIAL].emit)
+            emissive.append(mat[MAT.MATERIAL].diffuse_color.g *
+                            mat[MAT.MATERIAL].emit)
+            emissive.append(mat[MAT.MATERIAL].diffuse_color.b *
+                            mat[MAT.MATERIAL].emit)
+        hardness = round((mat[MAT.MATERIAL].specular_hardness - 1) / 510.0,
+                         FPM.NDIGITS)
+        if mat[MAT.MATERIAL].use_transparency:
+            opacity = round(mat[MAT.MATERIAL].alpha, FPM.NDIGITS)
+        else:
+            opacity = 1.0
+        ## the material property values, name and id are added on writing
+        return {EM.NAME: material_name,
+                EM.PROPS: {'a': tupel_to_float_str(ambient),
+                           'd': tupel_to_float_str(diffuse),
+                           's': tupel_to_float_str(specular),
+                           'e': tupel_to_float_str(emissive),
+                           'h': hardness,
+                           'o': opacity,
+                           't': str(bool(mat[MAT.DOUBLESIDED])).lower()},
+                EM.TEXTURES: texture_sl}
+
+    def build_material_table(self):
+        '''build the exported materials and map every entry of
+        self.materials to the id of its exported material'''
+        self.exported_materials = []
+        self.material_id_map = []
+        for i, mat in enumerate(self.materials):
+            em = self.build_material(mat)
+            em[EM.MATERIALS] = [i]
+            self.material_id_map.append(len(self.exported_materials))
+            self.exported_materials.append(em)
+        if CONFIG.merge_materials:
+            self.merge_identical_materials()
+        if CONFIG.atlas_textures:
+            self.build_atlases()
+
+    def get_material_uv_ranges(self):
+        '''return the smallest and largest texture coordinate per entry of
+        self.materials'''
+        ranges = {}
+        for objct in self.meshes:
+            md = self.get_mesh_data(objct)
+            material_ids = self.get_material_ids(objct)
+            uv = md[MD.UV]
+            for t, material_index in enumerate(md[MD.TRI_MAT]):
+                ## triangles without a collected material are not exported
+                if material_index >= len(material_ids):
+                    continue
+                i = material_ids[material_index]
+                if i < 0:
+                    continue
+                u_min, v_min, u_max, v_max = ranges.get(
+                    i, (float('inf'), float('inf'),
+                        float('-inf'), float('-inf')))
+                for u, v in uv[3 * t:3 * t + 3]:
+                    u_min, u_max = min(u_min, u), max(u_max, u)
+                    v_min, v_max = min(v_min, v), max(v_max, v)
+                ranges[i] = (u_min, v_min, u_max, v_max)
+        return ranges
+
+    def build_atlases(self):
+        '''pack the images of compatible one texture materials into shared
+        atlases, remap their uvs and merge them into one material'''
+        uv_ranges = self.get_material_uv_ranges()
+        ## compatible: same decoration, properties and texture settings, one
+        ## diffuse image and all uvs inside the image
+        groups = collections.OrderedDict()
+        for mat_id, em in enumerate(self.exported_materials):
+            if (not em[EM.NAME].endswith(DECO.MARKER + DECO.ONETEX) or
+                    len(em[EM.TEXTURES]) != 1 or
+                    em[EM.TEXTURES][0]['t'] != TTT.DIFFUSE):
+                continue
+            texture = em[EM.TEXTURES][0]
+            info = self.get_texture_info_by_path(texture['image'])
+            if (TI.FORMAT not in info or
+                    max(info[TI.WIDTH], info[TI.HEIGHT]) >=
+                    TRAINZLIMIT.TEXTURE_SIZE):
+                continue
+            if any(compare_floats(r[0], 0.0) < 0 or
+                   compare_floats(r[1], 0.0) < 0 or
+                   compare_floats(r[2], 1.0) > 0 or
+                   compare_floats(r[3], 1.0) > 0
+                   for r in (uv_ranges[i] for i in em[EM.MATERIALS]
+                             if i in uv_ranges)):
+                continue
+            key = (tuple(sorted(em[EM.PROPS].items())),
+                   tuple(sorted((k, v) for k, v in texture.items()
+                                if k not in ('n', 'image'))))
+            groups.setdefault(key, []).append(mat_id)
+        folder = os.path.dirname(os.path.abspath(self.export_filename))
+        stem = os.path.splitext(os.path.basename(self.export_filename))[0]
+        merge_groups = []
+        for mat_ids in groups.values():
+            ## decode every image once
+            paths = dict((mat_id, self.exported_materials[mat_id][
+                EM.TEXTURES][0]['image']) for mat_id in mat_ids)
+            images = []
+            decoded = {}
+            for mat_id in mat_ids:
+                filepath = paths[mat_id]
+                if filepath in decoded:
+                    continue
+                try:
+                    with open(filepath, 'rb') as f:
+                        decoded[filepath] = decode_image(
+                            f.read(), os.path.splitext(filepath)[1])
+                except Exception as e:
+                    self.log("image \"" + filepath + "\" not put into an "
+                             "atlas: " + str(e),
+                             LOG.WARNING)
+                    decoded[filepath] = None
+                if decoded[filepath] is not None:
+                    images.append(filepath)
+            if len(images) < 2:
+                continue
+            image_ids = dict((p, i) for i, p in enumerate(images))
+            padding = CONFIG.ATLAS_PADDING
+            sizes = [(decoded[p][0] + 2 * padding,
+                      decoded[p][1] + 2 * padding) for p in images]
+            for width, height, placed in pack_rectangles(
+                    sizes, TRAINZLIMIT.TEXTURE_SIZE):
+                if len(placed) < 2:
+                    continue
+                ## compose the atlas
+                channels = max(decoded[images[i]][2] for i in placed)
+                pixels = bytearray(width * height * channels)
+                for i, (x, y) in placed.items():
+                    w, h, c, src = decoded[images[i]]
+                    if c != channels:  # add an opaque alpha plane
+                        rgba = bytearray(b'\xff' * (w * h * channels))
+                        for k in range(c):
+                            rgba[k::channels] = src[k::c]
+                        src = rgba
+                    src = pad_image(w, h, channels, src, padding)
+                    w, h = sizes[i]
+                    for row in range(h):
+                        start = ((y + row) * width + x) * channels
+                        pixels[start:start + w * channels] = (
+                            src[row * w * channels:(row + 1) * w * channels])
+                atlas_stem = '%s_atlas%i' % (stem, len(self.atlases))
+                filename = atlas_stem + '.tga'
+                with open(os.path.join(folder, filename), 'wb') as f:
+                    f.write(encode_tga(width, height, channels, pixels))
+                members = [mat_id for mat_id in mat_ids
+                           if image_ids.get(paths[mat_id]) in placed]
+                texture = self.exported_materials[members[0]][EM.TEXTURES][0]
+                self.write_texture_txt(folder, atlas_stem, filename,
+                                       texture['a'] == 'true',
+                                       texture['u'] == 'true')
+                ## uvs of every member move into its part of the atlas
+                for mat_id in members:
+                    x, y = placed[image_ids[paths[mat_id]]]
+                    x += padding
+                    y += padding
+                    w, h = decoded[paths[mat_id]][:2]
+                    for i in self.exported_materials[mat_id][EM.MATERIALS]:
+                        self.uv_transforms[i] = (float(w) / width,
+                                                 float(x) / width,
+                                                 float(h) / height,
+                                                 float(y) / height)
+                atlas_path = os.path.join(folder, filename)
+                texture['n'] = convert_forbidden_chars(atlas_path)
+                texture['image'] = atlas_path
+                self.atlases.append(atlas_path)
+                merge_groups.append(members)
+                self.log("texture atlas \"" + filename + "\" (%(w)ix%(h)i) "
+                         "holds %(n)i images" % {
+                             'w': width,
+                             'h': height,
+                             'n': len(placed)},
+                         LOG.INFO)
+        if len(merge_groups) > 0:
+            merged = sum(len(g) for g in merge_groups)
+            self.merge_materials(merge_groups)
+            self.log("texture atlases: %(m)i materials merged into %(a)i, "
+                     "%(d)i draw calls saved" % {
+                         'm': merged,
+                         'a': len(merge_groups),
+                         'd': merged - len(merge_groups)},
+                     LOG.INFO)
+
+    def get_material_hash(self, em):
+        '''return a hash over everything written for the exported material
+        em except its name (the decoration is kept)'''
+        decoration = ''
+        if em[EM.NAME].find(DECO.MARKER) != -1:
+            decoration = em[EM.NAME].split(DECO.MARKER)[-1]
+        return hashlib.sha1(repr((
+            decoration,
+            sorted(em[EM.PROPS].items()),
+            [sorted((k, v) for k, v in t.items() if k != 'image')
+             for t in em[EM.TEXTURES]])).encode()).hexdigest()
+
+    def merge_identical_materials(self):
+        '''merge exported materials with identical properties and textures
+        which differ only by name'''
+        groups = collections.OrderedDict()
+        for mat_id, em in enumerate(self.exported_materials):
+            groups.setdefault(self.get_material_hash(em), []).append(mat_id)
+        merge_groups = [g for g in groups.values() if len(g) > 1]
+        for group in merge_groups:
+            self.log("Material(s) \"" + "\", \"".join(
+                         self.exported_materials[mat_id][EM.NAME]
+                         for mat_id in group[1:]) +
+                     "\" identical to \"" +
+                     self.exported_materials[group[0]][EM.NAME] +
+                     "\" and merged into it",
+                     LOG.INFO)
+        if len(merge_groups) > 0:
+            merged = sum(len(g) for g in merge_groups)
+            self.merge_materials(merge_groups)
+            self.log("identical materials: %(m)i materials merged into "
+                     "%(n)i, %(d)i draw calls saved" % {
+                         'm': merged,
+                         'n': len(merge_groups),
+                         'd': merged - len(merge_groups)},
+                     LOG.INFO)
+
+    def merge_materials(self, groups):
+        '''merge every group (list of exported material ids) into its
+        first exported material and renumber the exported materials'''
+        target = {}
+        for group in groups:
+            for mat_id in group[1:]:
+                target[mat_id] = group[0]
+        new_ids = {}
+        exported = []
+        for mat_id, em in enumerate(self.exported_materials):
+            if mat_id not in target:
+                new_ids[mat_id] = len(exported)
+                exported.append(em)
+        for mat_id, target_id in target.items():
+            new_ids[mat_id] = new_ids[target_id]
+            self.exported_materials[target_id][EM.MATERIALS].extend(
+                self.exported_materials[mat_id][EM.MATERIALS])
+        self.material_id_map = [new_ids[i] for i in self.material_id_map]
+        self.exported_materials = exported
+
+    def write_material_section(self, file, materials):
+        '''dump the material definitions into file'''
+        ## material section opener
+        file.write(IND1 + '<materials>\n')
+        ## iterate through all exported materials
+        for mat_id, em in enumerate(materials):
+            ## material opener
+            file.write(IND2 + '<material>\n')
             ## create & write the material property string
-            file.write(
-                STRINGF.MATERIAL_PROPS % {
-                    'n': convert_forbidden_chars(material_name),
-                    'i': mat_id,
-                    'a': tupel_to_float_str(ambient),
-                    'd': tupel_to_float_str(diffuse),
-                    's': tupel_to_float_str(specular),
-                    'e': tupel_to_float_str(emissive),
-                    'h': hardness,
-                    'o': opacity,
-                    't': str(bool(mat[MAT.DOUBLESIDED])).lower()})
+            props = dict(em[EM.PROPS])
+            props['n'] = convert_forbidden_chars(em[EM.NAME])
+            props['i'] = mat_id
+            file.write(STRINGF.MATERIAL_PROPS % props)
             ## now its time to create a texture section if needed
-            if len(texture_sl) > 0:
-                file.write(IND3 + "<textures>\n" + "".join(texture_sl) +
+            if len(em[EM.TEXTURES]) > 0:
+                file.write(IND3 + "<textures>\n" +
+                           "".join(STRINGF.TEXTURE % t
+                                   for t in em[EM.TEXTURES]) +
                            IND3 + "</textures>\n")
             ## material closer
             file.write(IND2 + "</material>\n")
         ## material section closer
         file.write(IND1 + "</materials>\n")
 
+    def get_bone_matrix(self, b):
+        '''return the (scaled) world matrix of the trainz bone b
+           for the current frame'''
+        if b[TB.CONTAINER] is None:
+            bone_matrix = b[TB.BONE].matrix_world.copy()
+        else:
+            # PoseBones need to be multiplied with the container
+            # matrix and the rest matrix to get global coordinates
+            pb_matrix = (b[TB.BONE].bone.matrix_local.copy() *
+                         b[TB.BONE].matrix_basis)
+            bone_matrix = (b[TB.CONTAINER].matrix_world.copy() *
+                           pb_matrix)
+        ## apply scaling if needed
+        if CONFIG.export_scaled:
+            bone_matrix = bone_matrix.copy() * CONFIG.scaling_factor
+        return bone_matrix
+
     def write_animation_section(self, file):
         '''translate animdata into trainz xml
            definitions and write them to file'''
-        ## play animation and get all bone positions
-        frames = []
+        animated = self.animation_basics[AB.ANIMATED]
+        ## static bones are sampled once at the first frame; their keyframe
+        ## string is the same for the whole animation
         self.context.scene.frame_set(self.animation_basics[AB.STARTFRAME])
-        while (self.context.scene.frame_current <=
-               self.animation_basics[AB.ENDFRAME]):
-            ## collect bone positions and orientations for current frame
-            bones = {}
-            for b in self.trainz_bones:
-                if b[TB.CONTAINER] is None:
-                    bone_matrix = b[TB.BONE].matrix_world.copy()
-                else:
-                    # PoseBones need to be multiplied with the container
-                    # matrix and the rest matrix to get global coordinates
-                    pb_matrix = (b[TB.BONE].bone.matrix_local.copy() *
-                                 b[TB.BONE].matrix_basis)
-                    bone_matrix = (b[TB.CONTAINER].matrix_world.copy() *
-                                   pb_matrix)
-                ## get bones matrix
-                bones[b[TB.BONE]] = bone_matrix.copy()
-                ## apply scaling if needed
-                if CONFIG.export_scaled:
-                    bones[b[TB.BONE]] = (bone_matrix.copy() *
-                                         CONFIG.scaling_factor)
-            ## append bonedict to framearray
-            frames.append(bones)
-            ## next frame, please
-            self.context.scene.frame_set(self.context.scene.frame_current + 1)
+        static_keyframes = {}
+        for b_id, b in enumerate(self.trainz_bones):
+            if b_id not in animated:
+                bone_matrix = self.get_bone_matrix(b)
+                static_keyframes[b[TB.BONE]] = STRINGF.KEYFRAME % {
+                    'p': tupel_to_float_str(bone_matrix.to_translation()),
+                    'r': quat_to_jet_quat_str(bone_matrix.to_quaternion())}
+        frame_count = max(0, (self.animation_basics[AB.ENDFRAME] -
+                              self.animation_basics[AB.STARTFRAME] + 1))
+        ## play animation and get all animated bone positions
+        frames = []
+        if len(animated) > 0:
+            while (self.context.scene.frame_current <=
+                   self.animation_basics[AB.ENDFRAME]):
+                ## collect bone positions and orientations for current frame
+                bones = {}
+                for b_id in animated:
+                    b = self.trainz_bones[b_id]
+                    bones[b[TB.BONE]] = self.get_bone_matrix(b)
+                ## append bonedict to framearray
+                frames.append(bones)
+                ## next frame, please
+                self.context.scene.frame_set(
+                    self.context.scene.frame_current + 1)
         ## open animation section
         file.write(
             STRINGF.ANIM_AND_TRACKS_OPENER % {'1': IND1,
@@ -1419,13 +3693,16 @@ class TrainzExport:
                                                  'n': convert_forbidden_chars(
                                                      b[TB.BONE].name)})
             ## drop keyframes for current bone
-            for bones in frames:
-                file.write(
-                    STRINGF.KEYFRAME % {
-                        'p': tupel_to_float_str(
-                            bones[b[TB.BONE]].to_translation()),
-                        'r': quat_to_jet_quat_str(
-                            bones[b[TB.BONE]].to_quaternion())})
+            if b[TB.BONE] in static_keyframes:
+                file.write(static_keyframes[b[TB.BONE]] * frame_count)
+            else:
+                for bones in frames:
+                    file.write(
+                        STRINGF.KEYFRAME % {
+                            'p': tupel_to_float_str(
+                                bones[b[TB.BONE]].to_translation()),
+                            'r': quat_to_jet_quat_str(
+                                bones[b[TB.BONE]].to_quaternion())})
             ## bonetrack closer
             file.write(IND5 + "</keyFrames>\n" + IND4 + "</animationTrack>\n")
         ## animtracks closer
@@ -1520,153 +3797,8 @@ class TrainzExport:
         #for tb in self.trainz_bones:
         #    print('\t', tb)
 
-    def check_meshes(self):
-        '''mesh checking'''
-        ## check for and handle invisible polygons
-        faceless_fops = []
-        cur_sel_verts = []
-        for o in self.meshes:
-            ## delete possibly leftover VG from previous check
-            self.remove_vertex_group(o, VG_NAME.ERROR_FACELESS_FACES)
-            ## now start checking
-            m = o.data
-            del faceless_fops[:]
-            if blender_version < 2063000:
-                for f in m.faces:
-                    if not (f.normal.length > 0.0):
-                        faceless_fops.append(f)
-            else:
-                for p in m.polygons:
-                    if not (p.normal.length > 0.0):
-                        faceless_fops.append(p)
-            if len(faceless_fops) > 0:
-                self.log("surfaceless Polygon(s) in Object \"" + o.name +
-                         "\", Mesh \"" + m.name + "\" detected",
-                         LOG.WARNING)
-                if CONFIG.error_correction == ERRORHANDLING.COLLECT:
-                    add_fops_to_vertexgroup(VG_NAME.ERROR_FACELESS_FACES,
-                                            o,
-                                            faceless_fops)
-                    self.log("Vertices of surfaceless Polygon(s) gathered in"
-                             " Vertex Group \"" +
-                             VG_NAME.ERROR_FACELESS_FACES + "\"",
-                             LOG.INFO)
-                elif CONFIG.error_correction == ERRORHANDLING.CORRECT:
-                    ## memorize the current vertex selection and unselect all
-                    del cur_sel_verts[:]
-                    for i, v in enumerate(m.vertices):
-                        if v.select:
-                            cur_sel_verts.append(m.vertices[i])
-                        m.vertices[i].select = False
-                    try:
-                        ## select all vertices related to facless faces and
-                        ## call "remove doubles" to eliminate them;
-                        ## works with faces and polygons
-                        for fop in faceless_fops:
-                            for i in fop.vertices:
-                                m.vertices[i].select = True
-                        ## operators only work with the active object,
-                        ## so we must activate the desired one
-                        self.context.scene.objects.active = o
-                        bpy.ops.object.mode_set(mode='EDIT', toggle=False)
-                        try:
-                            if blender_version < 2063000:
-                                bpy.ops.mesh.remove_doubles(
-                                    limit=FPM.LIMIT)
-                            else:
-                                bpy.ops.mesh.remove_doubles(
-                                    mergedist=FPM.LIMIT)
-                            self.log('surfaceless Polygon(s) removed',
-                                     LOG.INFO)
-                        finally:
-                            bpy.ops.mesh.select_all(action='DESELECT')
-                            bpy.ops.object.mode_set(mode='OBJECT',
-                                                    toggle=False)
-                    finally:
-                        ## restore the former selection
-                        for i, v1 in enumerate(m.vertices):
-                            for v2 in cur_sel_verts:
-                                if ((not m.vertices[i].select) and
-                                        compare_vert_locs(v1, v2)):
-                                    m.vertices[i].select = True
-
-        ## check if all objects using UV-mapping also have UV-coordinates
-        error_messages = []
-        for o in self.meshes:
-            if o.data.uv_textures.active is None:
-                for ms in o.material_slots:
-                    for tm in self.materials:
-                        # we check only if the material is getting exported
-                        if tm[MAT.MATERIAL] == ms.material:
-                            for i, ts in enumerate(ms.material.texture_slots):
-                                if (ms.material.use_textures[i] and
-                                        ts is not None and
-                                        ts.texture_coords == 'UV' and
-                                        ts.texture.type == 'IMAGE'):
-                                    error_messages.append(
-                                        "no UV-Layer for UV-Mapped Object \"" +
-                                        o.name + "\", Mesh \"" + o.data.name +
-                                        "\"")
-        if len(error_messages) > 0:
-            error_messages.sort()
-            cur_mes = error_messages[0]
-            i = 1
-            while i < len(error_messages):
-                if error_messages[i] == cur_mes:
-                    error_messages.remove(cur_mes)
-                else:
-                    cur_mes = error_messages[i]
-                    i += 1
-            for em in error_messages:
-                self.log(em, LOG.ERROR)
-        ## inform about double sided objects
-        for o in self.meshes:
-            next_please = False
-            if o.data.show_double_sided:
-                for ms in o.material_slots:
-                    for tm in self.materials:
-                        # we complian only if the material is getting exported
-                        if tm[MAT.MATERIAL] == ms.material:
-                            self.log("Object \"" + o.name + "\" will be "
-                                     "exported with Double Sided Faces",
-                                     LOG.INFO)
-                            next_please = True
-                            break
-                    if next_please:
-                        break
-
-    def check_hierarchy(self):
-        '''if bones in use all meshes need to be part of the hierarchy'''
-        ## if we have bones all meshes must be "connected" to the skeleton
-        if self.root_bone is not None:
-            for o in self.meshes:
-                p_bone = None
-                p = o.parent
-                #iterate until parent bone or no (further) parent
-                while (p is not None) and (p_bone is None):
-                    if p is not None:
-                        for tb in self.trainz_bones:
-                            if p == tb[TB.BONE]:
-                                p_bone = p
-                                break
-                        if p_bone is None:
-                            p = p.parent
-                if p is None:
-                    self.log('if Trainz Bones shall be exported, Object "' +
-                             o.name + '" must have a parent',
-                             LOG.ERROR)
-                elif p_bone is None:
-                    self.log("the parent list for " + o.type.capitalize() +
-                             " \"" + o.name + "\" must include at least one "
-                             "Trainz Bone",
-                             LOG.ERROR)
-
     def get_materials(self):
         '''collect all materials used in self.meshes'''
-        # list to count how often a material index is used
-        material_index_usage = []
-        # list to collect all faces using a given material index
-        faces_using_index = []
         # dict containing the material, if its a double sided mesh(is a
         # material information inside trainz) and the object parent(needed
         # info for SKEL-based animation)
@@ -1676,348 +3808,194 @@ class TrainzExport:
         for o in self.meshes:
             ## delete possibly leftover VG from previous run
             self.remove_vertex_group(o, VG_NAME.ERROR_NO_MATERIAL_ASSIGNED)
-            ## init used lists
-            del material_index_usage[:]
-            del faces_using_index[:]
-            ## check if at least one material is used
-            if len(o.material_slots) > 0:
-                for i in range(len(o.material_slots)):  # init lists
-                    material_index_usage.append(0)
-                    faces_using_index.append(list())
-                mesh = o.data
-                if blender_version < 2063000:  # pre 2.63 code
-                    for f in mesh.faces:
-                        material_index_usage[f.material_index] += 1
-                        faces_using_index[f.material_index].append(f)
-                else:  # faces are replaced by polygons from 2.63 on
-                    for p in mesh.polygons:
-                        material_index_usage[p.material_index] += 1
-                        faces_using_index[p.material_index].append(p)
-            #print('o:', o)
-            #print('material_index:', material_index)
-            #print('faces_using_index:', faces_using_index)
             ## check if object has at least one material assigned
-            if len(material_index_usage) == 0:
+            if len(o.material_slots) == 0:
                 self.log("Object \"" + o.name + "\" has no material assigned.",
                          LOG.ERROR)
+                continue
+            ## count how often a material index is used
+            mesh = o.data
+            pa = self.get_polygon_arrays(mesh)
+            material_index_usage = collections.Counter(pa[PA.MATERIAL])
+            ## modifiers (e.g. material offsets of solidify or bevel) may
+            ## use further slots in the evaluated mesh
+            if (CONFIG.apply_modifiers and
+                    len(get_applied_modifiers(o)) > 0):
+                material_index_usage.update(self.get_mesh_data(o)[MD.TRI_MAT])
             ## check if we have single faces without an assigned material
-            else:
-                for i in range(len(material_index_usage)):
-                    if ((o.material_slots[i].material is None) and
-                            (len(faces_using_index[i]) > 0)):
-                        add_fops_to_vertexgroup(
-                            VG_NAME.ERROR_NO_MATERIAL_ASSIGNED,
-                            o,
-                            faces_using_index[i])
-                        self.log("Face(s) without Material in Object \"" +
-                                 o.name + "\", Mesh \"" + mesh.name +
-                                 "\" detected. Collect them in Vertex "
-                                 "Group \"" +
-                                 VG_NAME.ERROR_NO_MATERIAL_ASSIGNED + "\"",
-                                 LOG.ERROR)
-                    else:
-                        if len(faces_using_index[i]) > 0:
-                            ## create material_item
-                            material_item[
-                                MAT.MATERIAL] = o.material_slots[i].material
-                            material_item[
-                                MAT.DOUBLESIDED] = o.data.show_double_sided
-                            ## add material_item to material list if necessary
-                            append_material_item = True
-                            for i in range(len(self.materials)):
-                                if (self.materials[i][MAT.MATERIAL] ==
-                                        material_item[MAT.MATERIAL] and
-                                        self.materials[i][MAT.DOUBLESIDED] ==
-                                        material_item[MAT.DOUBLESIDED]):
-                                    append_material_item = False
-                                    #self.materials[i][MAT.TRAINZPARENTS].add(
-                                    #    self.get_trainz_bone_parent(o))
-                                    break
-                            if append_material_item:
-                                #material_item[MAT.TRAINZPARENTS] = set(
-                                #    [self.get_trainz_bone_parent(o)])
-                                self.materials.append(material_item.copy())
-        #print('\nget_materials result:')
-        #for m in self.materials:
-        #    print('\t', m)
-
-    def log_message_list(self, messages, severity):
-        '''remove duplicates and log messages'''
-        if len(messages) > 0:
-            messages.sort()
-            cur_mes = messages[0]
-            i = 1
-            while i < len(messages):
-                if messages[i] == cur_mes:
-                    messages.remove(cur_mes)
-                else:
-                    cur_mes = messages[i]
-                    i += 1
-            for m in messages:
-                self.log(m, severity)
-
-    def check_materials(self):
-        '''check if all self.Materials are Trainz compatible'''
-        # material checks are realy difficult without materials
-        if len(self.materials) > 0:
-            ## check if material names only differ in lower/upper case
-            ## (and ignore cases related to double/single sided faces)
-            i = 0
-            while i < len(self.materials):
-                cur_mat = self.materials[i]
-                for j in range(i + 1, len(self.materials)):
-                    if (cur_mat[MAT.MATERIAL].name.lower() ==
-                            self.materials[j][MAT.MATERIAL].name.lower() and
-                            cur_mat[MAT.MATERIAL] !=
-                            self.materials[j][MAT.MATERIAL]):
-                        self.log("Material names \"%(m1)s\" and \"%(m2)s\" are"
-                                 " identical if compared case-insensitive" % {
-                                     'm1': cur_mat[MAT.MATERIAL].name,
-                                     'm2': self.materials[j][
-                                         MAT.MATERIAL].name},
-                                 LOG.ERROR)
-                i += 1
-            ## check if a material is used for single AND double sided faces
-            i = 0
-            while i < len(self.materials):
-                cur_mat = self.materials[i]
-                outm = []  # list for Objects Using This Material
-                for j in range(i + 1, len(self.materials)):
-                    if (cur_mat[MAT.MATERIAL] == self.materials[j][
-                            MAT.MATERIAL] and
-                        cur_mat[MAT.DOUBLESIDED] != self.materials[j][
-                            MAT.DOUBLESIDED]):
-                        # collect involved objects
-                        del outm[:]
-                        for o in self.meshes:
-                            for ms in o.material_slots:
-                                if ms.material == cur_mat[MAT.MATERIAL]:
-                                    outm.append(o)
-                                    break
-                        oss = [o for o in outm if not o.data.show_double_sided]
-                        ods = [o for o in outm if o.data.show_double_sided]
-                        ss_objects = ''
-                        for o in oss:
-                            ss_objects += '"' + o.name + '", '
-                        ss_objects = ss_objects[:-2]
-                        ds_objects = ''
-                        for o in ods:
-                            ds_objects += '"' + o.name + '", '
-                        ds_objects = ds_objects[:-2]
-                        self.log("Material \"%(m)s\" is used for Single AND "
-                                 "Double Sided Objects; Single Sided: "
-                                 "%(s)s, Double Sided: %(d)s" % {
-                                     'm': cur_mat[MAT.MATERIAL].name,
-                                     's': ss_objects,
-                                     'd': ds_objects},
-                                 LOG.ERROR)
-                i += 1
-            ## check if all materials use only textures of type image and
-            ## if those image exists
-            error_messages = []
-            warning_messages = []
-            for m in self.materials:
-                tex_names_generic = []  # procedural textures used
-                tex_names_missing = []  # assigned image not found
-                # change from 0.95 to 0.96: warn about textures which
-                # forced to use alpha but have no alpha plane
-                tex_names_noplane = []  # no alpha plane but use_alpha checked
-
-                for i, ts in enumerate(m[MAT.MATERIAL].texture_slots):
-                    if m[MAT.MATERIAL].use_textures[i] and (ts is not None):
-                        if (ts.texture.type != 'NONE' and
-                                ts.texture.type != 'IMAGE'):
-                            tex_names_generic.append(ts.texture.name)
-                        elif ts.texture.type == 'IMAGE':
-                            if ((ts.texture.image is None) or
-                                not os.path.exists(bpy.path.abspath(
-                                    ts.texture.image.filepath))):
-                                tex_names_missing.append(ts.texture.name)
-                            if ((ts.texture.image is not None) and
-                                (ts.texture.image.use_alpha and
-                                 (ts.texture.image.depth == 24))):
-                                tex_names_noplane.append(ts.texture.name)
-
-                if len(tex_names_generic) > 0:
-                    error_messages.append(
-                        "procedural texture(s) assigned to Material \"%(m)s\","
-                        " Texture(s) \"%(t)s\"" % {
-                            'm': m[MAT.MATERIAL].name,
-                            't': ', '.join(tex_names_generic)})
-                if len(tex_names_missing) > 0:
-                    error_messages.append(
-                        "image file(s) not found for Material \"%(m)s\", "
-                        "Texture(s) \"%(t)s\"" % {
-                            'm': m[MAT.MATERIAL].name,
-                            't': ', '.join(tex_names_missing)})
-                if len(tex_names_noplane) > 0:
-                    warning_messages.append(
-                        "no alpha plane in image(s) for Material \"%(m)s\", "
-                        "Texture(s) \"%(t)s\"" % {
-                            'm': m[MAT.MATERIAL].name,
-                            't': ', '.join(tex_names_noplane)})
-            self.log_message_list(error_messages, LOG.ERROR)
-            self.log_message_list(warning_messages, LOG.WARNING)
-
-            ## check if all textures mapped to alpha, specular and
-            ## normal are uv-mapped
-            error_messages = []
-            for m in self.materials:
-                tex_names = []
-                for i, ts in enumerate(m[MAT.MATERIAL].texture_slots):
-                    if m[MAT.MATERIAL].use_textures[i] and (ts is not None):
-                        if (ts.texture.type == 'IMAGE' and
-                                ts.use_map_alpha or
-                                ts.use_map_specular or
-                                ts.use_map_normal):
-                            if ts.texture_coords != 'UV':
-                                tex_names.append(ts.texture.name)
-                if len(tex_names) > 0:
-                    error_messages.append(
-                        "UV mapping needed for Materials \"%(m)s\", "
-                        "Textures(s) \"%(t)s\"" % {
-                            'm': m[MAT.MATERIAL].name,
-                            't': ', '.join(tex_names)})
-            self.log_message_list(error_messages, LOG.ERROR)
-            ## check if all textures maped to diffuse are uv- or
-            ## reflection-mapped
-            error_messages = []
-            for m in self.materials:
-                tex_names = []
-                for i, ts in enumerate(m[MAT.MATERIAL].texture_slots):
-                    if m[MAT.MATERIAL].use_textures[i] and (ts is not None):
-                        if (ts.texture.type == 'IMAGE' and
-                                ts.use_map_color_diffuse):
-                            if (ts.texture_coords != 'UV' and
-                                    ts.texture_coords != 'REFLECTION'):
-                                tex_names.append(ts.texture.name)
-                if len(tex_names) > 0:
-                    error_messages.append(
-                        "UV or Reflection Mapping needed for Material \"%(m)s"
-                        "\", Textures(s) \"%(t)s\"" % {
-                            'm': m[MAT.MATERIAL].name,
-                            't': ', '.join(tex_names)})
-            self.log_message_list(error_messages, LOG.ERROR)
-
-    def get_and_check_root_bone(self):
-        '''go for the root bone and drop a warning if we have a problem'''
-        ## check bone hierarchie
-        root_bones = []
-        bone_names = []
-        for tb in self.trainz_bones:
-            p = self.get_trainz_bone_parent(tb)
-            if p is None:
-                root_bones.append(tb)
-        #print('root_bones: ', root_bones)
-        ## only one root bone is allowed
-        if len(root_bones) == 1:
-            self.root_bone = root_bones[0]
-        elif len(root_bones) > 1:
-            ## collect names of all root - bones
-            del bone_names[:]
-            for rb in root_bones:
-                if rb[TB.CONTAINER] is None:
-                    bone_names.append(rb[TB.BONE].type.capitalize() +
-                                      " \"" + rb[TB.BONE].name + "\"")
+            for i in range(len(o.material_slots)):
+                if material_index_usage[i] == 0:
+                    continue
+                if o.material_slots[i].material is None:
+                    add_polygons_to_vertexgroup(
+                        VG_NAME.ERROR_NO_MATERIAL_ASSIGNED,
+                        o,
+                        pa,
+                        [p for p, mi in enumerate(pa[PA.MATERIAL])
+                         if mi == i])
+                    self.log("Face(s) without Material in Object \"" +
+                             o.name + "\", Mesh \"" + mesh.name +
+                             "\" detected. Collect them in Vertex "
+                             "Group \"" +
+                             VG_NAME.ERROR_NO_MATERIAL_ASSIGNED + "\"",
+                             LOG.ERROR)
                 else:
-                    bone_names.append(rb[TB.CONTAINER].type.capitalize() +
-                                      " \"" + rb[TB.CONTAINER].name +
-                                      "\" Bone \"" + rb[TB.BONE].name + "\"")
-            ## propagate te problem
-            self.log("found more than one Trainz Root Bone: " +
-                     ", ".join(bone_names),
-                     LOG.ERROR)
-        ## the following checks are only necessary if we have the one root bone
-        if self.root_bone is not None:
-            ## check that the root bone is not rotated or
-            ## moved(MAY lead to strange results in Trainz
-            ## if BOTH happen, therefore only a warning)
-            if self.root_bone[TB.CONTAINER] is not None:
-                loc_x, loc_y, loc_z = (
-                    self.root_bone[
-                        TB.CONTAINER].matrix_world.to_translation() +
-                    self.root_bone[TB.BONE].matrix.to_translation())
-                rot_w, rot_x, rot_y, rot_z = (
-                    self.root_bone[TB.BONE].matrix.to_quaternion().cross(
-                        self.root_bone[
-                            TB.CONTAINER].matrix_world.to_quaternion()))
+                    ## create material_item
+                    material_item[MAT.MATERIAL] = o.material_slots[i].material
+                    material_item[MAT.DOUBLESIDED] = mesh.show_double_sided
+                    ## add material_item to material list if necessary
+                    if self.get_material_id(
+                            material_item[MAT.MATERIAL],
+                            material_item[MAT.DOUBLESIDED]) == -1:
+                        self.materials.append(material_item.copy())
+            ## material indices past the last slot (stale indices or
+            ## material offsets of modifiers) have no material to export
+            unknown_slots = sorted(i for i in material_index_usage
+                                   if i >= len(o.material_slots) and
+                                   material_index_usage[i] > 0)
+            if len(unknown_slots) > 0:
+                message = ("Object \"" + o.name + "\" uses the material "
+                           "index(es) " +
+                           ', '.join(str(i) for i in unknown_slots) +
+                           " without a material slot.")
+                polygon_ids = [p for p, mi in enumerate(pa[PA.MATERIAL])
+                               if mi >= len(o.material_slots)]
+                if len(polygon_ids) > 0:
+                    add_polygons_to_vertexgroup(
+                        VG_NAME.ERROR_NO_MATERIAL_ASSIGNED,
+                        o,
+                        pa,
+                        polygon_ids)
+                    message += (" Collect its faces in Vertex Group \"" +
+                                VG_NAME.ERROR_NO_MATERIAL_ASSIGNED + "\"")
+                self.log(message, LOG.ERROR)
+
+    def is_constraint_animated(self, constraint):
+        '''returns True if the target(s) of constraint may move'''
+        if constraint.mute:
+            return False
+        ## collect all targets; most constraints have one, the armature
+        ## constraint has a list of them
+        targets = []
+        if getattr(constraint, 'target', None) is not None:
+            targets.append((constraint.target,
+                            getattr(constraint, 'subtarget', '')))
+        for t in getattr(constraint, 'targets', []):
+            if t.target is not None:
+                targets.append((t.target, t.subtarget))
+        for target, subtarget in targets:
+            ## paths, curves, ... may be animated by their data
+            if ((target.data is not None) and
+                    (getattr(target.data, 'animation_data', None)
+                     is not None)):
+                return True
+            if ((target.type == 'ARMATURE') and
+                    (subtarget in target.pose.bones)):
+                if self.is_pose_bone_animated(target,
+                                              target.pose.bones[subtarget]):
+                    return True
+            elif self.is_object_animated(target):
+                return True
+        return False
+
+    def is_object_animated(self, objct):
+        '''returns True if the world matrix of objct may
+        change within the frame range'''
+        if objct in self.animated_objects:
+            return self.animated_objects[objct]
+        ## assume movement while we're in progress; so dependency cycles
+        ## end up on the safe side
+        self.animated_objects[objct] = True
+        result = False
+        paths = get_changing_data_paths(objct)
+        if paths is None:
+            result = True
+        else:
+            ## pose bone paths don't move the object itself
+            for dp in paths:
+                if get_pose_bone_name(dp) is None:
+                    result = True
+                    break
+        ## physics are simulated, not keyed
+        if getattr(objct, 'rigid_body', None) is not None:
+            result = True
+        ## inherited movement
+        if (not result) and (objct.parent is not None):
+            if ((objct.parent_type == 'BONE') and
+                    (objct.parent_bone in objct.parent.pose.bones)):
+                result = self.is_pose_bone_animated(
+                    objct.parent,
+                    objct.parent.pose.bones[objct.parent_bone])
             else:
-                loc_x, loc_y, loc_z = (
-                    self.root_bone[TB.BONE].matrix_world.to_translation())
-                rot_w, rot_x, rot_y, rot_z = (
-                    self.root_bone[TB.BONE].matrix_world.to_quaternion())
-            rb_moved = (compare_floats(loc_x, 0.0) != 0 or
-                        compare_floats(loc_y, 0.0) != 0 or
-                        compare_floats(loc_z, 0.0) != 0)
-            rb_rotated = (compare_floats(rot_w, 1.0) != 0 or
-                          compare_floats(rot_x, 0.0) != 0 or
-                          compare_floats(rot_y, 0.0) != 0 or
-                          compare_floats(rot_z, 0.0) != 0)
-            if rb_moved and rb_rotated:
-                rb_name = self.root_bone[TB.BONE].name
-                if self.root_bone[TB.CONTAINER] is not None:
-                    rb_name = (
-                        self.root_bone[TB.CONTAINER].name + '->' + rb_name)
-                self.log("The Trainz Root Bone \"" + rb_name +
-                         "\" is rotated and not located at the point of "
-                         "origin. In Trainz your Object might not appear "
-                         "where you expect them.",
-                         LOG.WARNING)
-
-    def check_influence(self):
-        '''check if vertices are influenced by up to 4 vertex groups
-           (trainz maximum is 4 streams) and are normalized'''
-        ## collect all bone names
-        bone_names = []
-        influence_group_names = []
-        influence_groups = []
-        vertexgroup_created = False
-        for bone in self.trainz_bones:
-            bone_names.append(bone[TB.BONE].name)
-        ## iterate trough all meshes and its vertices and
-        ## count vertexgroups with bone names for every object
-        for objct in self.meshes:
-            ## delete possibly leftover VG from previous check
-            self.remove_vertex_group(objct, VG_NAME.WARNING_TO_MUCH_INFLUENCES)
-            ## start counting
-            mesh = objct.data
-            for vertex in mesh.vertices:
-                ## extract all influence groups and check for
-                del influence_group_names[:]
-                del influence_groups[:]
-                for group in vertex.groups:
-                    if objct.vertex_groups[group.group].name in bone_names:
-                        influence_group_names.append(
-                            objct.vertex_groups[group.group].name)
-                        influence_groups.append(
-                            objct.vertex_groups[group.group])
-                ## a) not more than 4 trainz bone groups groups are allowed
-                if len(influence_group_names) > 4:
-                    # show message
-                    text = ("Vertex %(v)i in Mesh \"%(m)s\" is influenced by "
-                            "more than 4 vertex groups:\n\t\t\tObject "
-                            "\"%(o)s\", Vertex Group \"" % {
-                                'v': vertex.index,
-                                'm': mesh.name,
-                                'o': objct.name} +
-                            ("\"\n\t\t\tObject \"%s\",  Vertex "
-                             "Group \"" % objct.name).join(
-                                 influence_group_names))
-                    self.log(text, LOG.WARNING)
-                    # add vertex to VG "overinfluenced"
-                    add_vertex_to_vertexgroup(
-                        VG_NAME.WARNING_TO_MUCH_INFLUENCES,
-                        objct,
-                        vertex.index)
-                    vertexgroup_created = True
-            if vertexgroup_created:
-                self.log("Vertices with to many influences gathered in "
-                         "Vertex Group \"" +
-                         VG_NAME.WARNING_TO_MUCH_INFLUENCES +
-                         "\" of Object \"" + objct.name + "\", Mesh \"" +
-                         mesh.name + "\"",
-                         LOG.INFO)
-                vertexgroup_created = False
+                result = self.is_object_animated(objct.parent)
+        ## constrained movement
+        if not result:
+            for c in objct.constraints:
+                if self.is_constraint_animated(c):
+                    result = True
+                    break
+        self.animated_objects[objct] = result
+        return result
+
+    def is_pose_bone_animated(self, armature, pose_bone):
+        '''returns True if the pose of pose_bone may
+        change within the frame range'''
+        if pose_bone in self.animated_pose_bones:
+            return self.animated_pose_bones[pose_bone]
+        self.animated_pose_bones[pose_bone] = True  # see is_object_animated
+        result = self.is_object_animated(armature)
+        if not result:
+            paths = get_changing_data_paths(armature)
+            if paths is None:
+                result = True
+            else:
+                for dp in paths:
+                    if get_pose_bone_name(dp) == pose_bone.name:
+                        result = True
+                        break
+        ## inherited movement
+        if (not result) and (pose_bone.parent is not None):
+            result = self.is_pose_bone_animated(armature, pose_bone.parent)
+        ## constrained movement
+        if not result:
+            for c in pose_bone.constraints:
+                if self.is_constraint_animated(c):
+                    result = True
+                    break
+        ## IK chains move all bones up to the chain length
+        if not result:
+            for pb in armature.pose.bones:
+                chain = [pb] + list(pb.parent_recursive)
+                for c in pb.constraints:
+                    if (c.type in ('IK', 'SPLINE_IK')) and (not c.mute):
+                        if c.chain_count > 0:
+                            ik_chain = chain[:c.chain_count]
+                        else:
+                            ik_chain = chain
+                        # targetless IK is always treated as moving
+                        if ((pose_bone in ik_chain) and
+                                ((c.target is None) or
+                                 self.is_constraint_animated(c))):
+                            result = True
+                            break
+                if result:
+                    break
+        self.animated_pose_bones[pose_bone] = result
+        return result
+
+    def get_animated_bones(self):
+        '''returns the ids of all trainz bones which may
+        move within the frame range'''
+        result = set()
+        for b_id, b in enumerate(self.trainz_bones):
+            if b[TB.CONTAINER] is None:
+                animated = self.is_object_animated(b[TB.BONE])
+            else:
+                animated = self.is_pose_bone_animated(b[TB.CONTAINER],
+                                                      b[TB.BONE])
+            if animated:
+                result.add(b_id)
+        return result
 
     def get_animation_basics(self):
         '''collect basic informations needed to export animations'''
@@ -2069,6 +4047,12 @@ class TrainzExport:
                 self.context.scene.frame_end)
             self.animation_basics[AB.FPS] = (
                 self.context.scene.render.fps)
+            self.animation_basics[AB.ANIMATED] = self.get_animated_bones()
+            self.log("%(a)i of %(b)i Trainz Bones are animated; static "
+                     "bones will be sampled only once" % {
+                         'a': len(self.animation_basics[AB.ANIMATED]),
+                         'b': len(self.trainz_bones)},
+                     LOG.INFO)
 
     def get_animation_events(self):
         '''collect events associated with specific frames'''
@@ -2120,6 +4104,417 @@ class TrainzExport:
                             else:
                                 self.events.append(event.copy())
 
+    ############################## validation #################################
+
+    def get_root_bone(self):
+        '''go for the root bone; problems are reported by the root bone rule'''
+        del self.root_bones[:]
+        for tb in self.trainz_bones:
+            p = self.get_trainz_bone_parent(tb)
+            if p is None:
+                self.root_bones.append(tb)
+        ## only one root bone is allowed
+        if len(self.root_bones) == 1:
+            self.root_bone = self.root_bones[0]
+
+    def get_texture_infos(self, filepaths):
+        '''check the image files filepaths concurrently; unchanged files are
+        taken from the persistent texture cache'''
+        filepaths = [p for p in set(filepaths) if p not in self.texture_infos]
+        if len(filepaths) == 0:
+            return
+        cache = load_texture_cache()
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=CONFIG.TEXTURE_THREADS) as executor:
+            infos = list(executor.map(
+                lambda p: get_texture_info(p, cache.get(p)), filepaths))
+        parsed = 0
+        for filepath, info in zip(filepaths, infos):
+            if info is not cache.get(filepath):
+                cache[filepath] = info
+                parsed += int(info[TI.EXISTS])
+            self.texture_infos[filepath] = info
+        if parsed > 0:
+            save_texture_cache()
+        self.log("%(n)i image file(s) checked, %(p)i header(s) read" % {
+                     'n': len(filepaths),
+                     'p': parsed},
+                 LOG.ADDINFO)
+
+    def get_texture_info(self, image):
+        '''return the texture info of image'''
+        return self.get_texture_info_by_path(
+            bpy.path.abspath(image.filepath))
+
+    def get_texture_info_by_path(self, filepath):
+        '''return the texture info of the image file filepath'''
+        self.get_texture_infos([filepath])
+        return self.texture_infos[filepath]
+
+    def collect_validation_data(self):
+        '''one traversal over the collected data shared by all rules'''
+        vd = {VD.TEXTURE_SLOTS: collections.OrderedDict(),
+              VD.MATERIAL_OBJECTS: {},
+              VD.BONE_NAMES: set(b[TB.BONE].name for b in self.trainz_bones)}
+        ## enabled texture slots of all exported materials
+        for m in self.materials:
+            material = m[MAT.MATERIAL]
+            if material not in vd[VD.TEXTURE_SLOTS]:
+                vd[VD.TEXTURE_SLOTS][material] = get_texture_slots(material)
+        ## check all image files at once
+        self.get_texture_infos(
+            [bpy.path.abspath(ts.texture.image.filepath)
+             for texture_slots in vd[VD.TEXTURE_SLOTS].values()
+             for ts in texture_slots
+             if ts.texture.type == 'IMAGE' and ts.texture.image is not None])
+        ## objects using an exported material
+        for o in self.meshes:
+            for ms in o.material_slots:
+                if ms.material in vd[VD.TEXTURE_SLOTS]:
+                    users = vd[VD.MATERIAL_OBJECTS].setdefault(ms.material,
+                                                               [])
+                    if o not in users:
+                        users.append(o)
+        return vd
+
+    def rule_root_bone(self, vd, subject):
+        '''only one root bone is allowed, and it shouldn't be moved
+        and rotated'''
+        messages = []
+        if len(self.root_bones) > 1:
+            ## collect names of all root - bones
+            bone_names = []
+            for rb in self.root_bones:
+                if rb[TB.CONTAINER] is None:
+                    bone_names.append(rb[TB.BONE].type.capitalize() +
+                                      " \"" + rb[TB.BONE].name + "\"")
+                else:
+                    bone_names.append(rb[TB.CONTAINER].type.capitalize() +
+                                      " \"" + rb[TB.CONTAINER].name +
+                                      "\" Bone \"" + rb[TB.BONE].name + "\"")
+            ## propagate te problem
+            messages.append((LOG.ERROR,
+                             "found more than one Trainz Root Bone: " +
+                             ", ".join(bone_names)))
+        ## the following checks are only necessary if we have the one root bone
+        if self.root_bone is not None:
+            ## check that the root bone is not rotated or
+            ## moved(MAY lead to strange results in Trainz
+            ## if BOTH happen, therefore only a warning)
+            if self.root_bone[TB.CONTAINER] is not None:
+                loc_x, loc_y, loc_z = (
+                    self.root_bone[
+                        TB.CONTAINER].matrix_world.to_translation() +
+                    self.root_bone[TB.BONE].matrix.to_translation())
+                rot_w, rot_x, rot_y, rot_z = (
+                    self.root_bone[TB.BONE].matrix.to_quaternion().cross(
+                        self.root_bone[
+                            TB.CONTAINER].matrix_world.to_quaternion()))
+            else:
+                loc_x, loc_y, loc_z = (
+                    self.root_bone[TB.BONE].matrix_world.to_translation())
+                rot_w, rot_x, rot_y, rot_z = (
+                    self.root_bone[TB.BONE].matrix_world.to_quaternion())
+            rb_moved = (compare_floats(loc_x, 0.0) != 0 or
+                        compare_floats(loc_y, 0.0) != 0 or
+                        compare_floats(loc_z, 0.0) != 0)
+            rb_rotated = (compare_floats(rot_w, 1.0) != 0 or
+                          compare_floats(rot_x, 0.0) != 0 or
+                          compare_floats(rot_y, 0.0) != 0 or
+                          compare_floats(rot_z, 0.0) != 0)
+            if rb_moved and rb_rotated:
+                rb_name = self.root_bone[TB.BONE].name
+                if self.root_bone[TB.CONTAINER] is not None:
+                    rb_name = (
+                        self.root_bone[TB.CONTAINER].name + '->' + rb_name)
+                messages.append((LOG.WARNING,
+                                 "The Trainz Root Bone \"" + rb_name +
+                                 "\" is rotated and not located at the point "
+                                 "of origin. In Trainz your Object might not "
+                                 "appear where you expect them."))
+        return messages
+
+    def rule_surfaceless_polygons(self, vd, o):
+        '''check for and handle invisible polygons'''
+        messages = []
+        ## delete possibly leftover VG from previous check
+        self.remove_vertex_group(o, VG_NAME.ERROR_FACELESS_FACES)
+        ## now start checking
+        m = o.data
+        pa = self.get_polygon_arrays(m)
+        faceless_polygons = get_surfaceless_polygons(pa)
+        if len(faceless_polygons) > 0:
+            messages.append((LOG.WARNING,
+                             "surfaceless Polygon(s) in Object \"" + o.name +
+                             "\", Mesh \"" + m.name + "\" detected"))
+            if get_error_correction() == ERRORHANDLING.COLLECT:
+                add_polygons_to_vertexgroup(VG_NAME.ERROR_FACELESS_FACES,
+                                            o,
+                                            pa,
+                                            faceless_polygons)
+                messages.append((LOG.INFO,
+                                 "Vertices of surfaceless Polygon(s) gathered"
+                                 " in Vertex Group \"" +
+                                 VG_NAME.ERROR_FACELESS_FACES + "\""))
+            elif get_error_correction() == ERRORHANDLING.CORRECT:
+                ## memorize the current vertex selection and unselect all
+                cur_sel_verts = []
+                for i, v in enumerate(m.vertices):
+                    if v.select:
+                        cur_sel_verts.append(m.vertices[i])
+                    m.vertices[i].select = False
+                try:
+                    ## select all vertices related to facless faces and
+                    ## call "remove doubles" to eliminate them;
+                    ## works with faces and polygons
+                    for p in faceless_polygons:
+                        for i in pa[PA.VERTICES][p]:
+                            m.vertices[i].select = True
+                    ## operators only work with the active object,
+                    ## so we must activate the desired one
+                    self.context.scene.objects.active = o
+                    bpy.ops.object.mode_set(mode='EDIT', toggle=False)
+                    try:
+                        if blender_version < 2063000:
+                            bpy.ops.mesh.remove_doubles(
+                                limit=FPM.LIMIT)
+                        else:
+                            bpy.ops.mesh.remove_doubles(
+                                mergedist=FPM.LIMIT)
+                        messages.append((LOG.INFO,
+                                         'surfaceless Polygon(s) removed'))
+                    finally:
+                        bpy.ops.mesh.select_all(action='DESELECT')
+                        bpy.ops.object.mode_set(mode='OBJECT',
+                                                toggle=False)
+                finally:
+                    ## the mesh has changed
+                    self.forget_mesh(m)
+                    ## restore the former selection
+                    for i, v1 in enumerate(m.vertices):
+                        for v2 in cur_sel_verts:
+                            if ((not m.vertices[i].select) and
+                                    compare_vert_locs(v1, v2)):
+                                m.vertices[i].select = True
+        return messages
+
+    def rule_uv_layers(self, vd, o):
+        '''check if all objects using UV-mapping also have UV-coordinates'''
+        if o.data.uv_textures.active is None:
+            for ms in o.material_slots:
+                # we check only if the material is getting exported
+                for ts in vd[VD.TEXTURE_SLOTS].get(ms.material, []):
+                    if (ts.texture_coords == 'UV' and
+                            ts.texture.type == 'IMAGE'):
+                        return [(LOG.ERROR,
+                                 "no UV-Layer for UV-Mapped Object \"" +
+                                 o.name + "\", Mesh \"" + o.data.name +
+                                 "\"")]
+        return []
+
+    def rule_double_sided(self, vd, o):
+        '''inform about double sided objects'''
+        if o.data.show_double_sided:
+            for ms in o.material_slots:
+                # we complian only if the material is getting exported
+                if ms.material in vd[VD.TEXTURE_SLOTS]:
+                    return [(LOG.INFO,
+                             "Object \"" + o.name + "\" will be "
+                             "exported with Double Sided Faces")]
+        return []
+
+    def rule_material_names(self, vd, subject):
+        '''check if material names only differ in lower/upper case
+        (and ignore cases related to double/single sided faces)'''
+        messages = []
+        groups = collections.OrderedDict()
+        for m in self.materials:
+            names = groups.setdefault(m[MAT.MATERIAL].name.lower(), [])
+            if m[MAT.MATERIAL].name not in names:
+                names.append(m[MAT.MATERIAL].name)
+        for names in groups.values():
+            if len(names) > 1:
+                messages.append((LOG.ERROR,
+                                 "Material names \"" +
+                                 "\" and \"".join(names) +
+                                 "\" are identical if compared "
+                                 "case-insensitive"))
+        return messages
+
+    def rule_material_sides(self, vd, subject):
+        '''check if a material is used for single AND double sided faces'''
+        messages = []
+        sides = collections.OrderedDict()
+        for m in self.materials:
+            sides.setdefault(m[MAT.MATERIAL], set()).add(m[MAT.DOUBLESIDED])
+        for material, used_sides in sides.items():
+            if len(used_sides) > 1:
+                # collect involved objects
+                outm = vd[VD.MATERIAL_OBJECTS].get(material, [])
+                ss_objects = ', '.join('"' + o.name + '"' for o in outm
+                                       if not o.data.show_double_sided)
+                ds_objects = ', '.join('"' + o.name + '"' for o in outm
+                                       if o.data.show_double_sided)
+                messages.append((LOG.ERROR,
+                                 "Material \"%(m)s\" is used for Single AND "
+                                 "Double Sided Objects; Single Sided: "
+                                 "%(s)s, Double Sided: %(d)s" % {
+                                     'm': material.name,
+                                     's': ss_objects,
+                                     'd': ds_objects}))
+        return messages
+
+    def rule_textures(self, vd, m):
+        '''check if all materials use only textures of type image and
+        if those image exists'''
+        messages = []
+        tex_names_generic = []  # procedural textures used
+        tex_names_missing = []  # assigned image not found
+        # change from 0.95 to 0.96: warn about textures which
+        # forced to use alpha but have no alpha plane
+        tex_names_noplane = []  # no alpha plane but use_alpha checked
+        for ts in vd[VD.TEXTURE_SLOTS][m[MAT.MATERIAL]]:
+            if (ts.texture.type != 'NONE' and
+                    ts.texture.type != 'IMAGE'):
+                tex_names_generic.append(ts.texture.name)
+            elif ts.texture.type == 'IMAGE':
+                if ts.texture.image is None:
+                    tex_names_missing.append(ts.texture.name)
+                    continue
+                info = self.get_texture_info(ts.texture.image)
+                if not info[TI.EXISTS]:
+                    tex_names_missing.append(ts.texture.name)
+                ## the header tells about the alpha plane without loading
+                ## the image; ask blender only for unknown formats
+                if ts.texture.image.use_alpha:
+                    if TI.ALPHA in info:
+                        if not info[TI.ALPHA]:
+                            tex_names_noplane.append(ts.texture.name)
+                    elif ts.texture.image.depth == 24:
+                        tex_names_noplane.append(ts.texture.name)
+        if len(tex_names_generic) > 0:
+            messages.append((LOG.ERROR,
+                             "procedural texture(s) assigned to Material "
+                             "\"%(m)s\", Texture(s) \"%(t)s\"" % {
+                                 'm': m[MAT.MATERIAL].name,
+                                 't': ', '.join(tex_names_generic)}))
+        if len(tex_names_missing) > 0:
+            messages.append((LOG.ERROR,
+                             "image file(s) not found for Material \"%(m)s\", "
+                             "Texture(s) \"%(t)s\"" % {
+                                 'm': m[MAT.MATERIAL].name,
+                                 't': ', '.join(tex_names_missing)}))
+        if len(tex_names_noplane) > 0:
+            messages.append((LOG.WARNING,
+                             "no alpha plane in image(s) for Material "
+                             "\"%(m)s\", Texture(s) \"%(t)s\"" % {
+                                 'm': m[MAT.MATERIAL].name,
+                                 't': ', '.join(tex_names_noplane)}))
+        return messages
+
+    def rule_texture_mapping(self, vd, m):
+        '''check if all textures mapped to alpha, specular and normal are
+        uv-mapped and those mapped to diffuse are uv- or reflection-mapped'''
+        messages = []
+        uv_names = []
+        uv_or_reflection_names = []
+        for ts in vd[VD.TEXTURE_SLOTS][m[MAT.MATERIAL]]:
+            if (ts.texture.type == 'IMAGE' and
+                    ts.use_map_alpha or
+                    ts.use_map_specular or
+                    ts.use_map_normal):
+                if ts.texture_coords != 'UV':
+                    uv_names.append(ts.texture.name)
+            if (ts.texture.type == 'IMAGE' and
+                    ts.use_map_color_diffuse):
+                if (ts.texture_coords != 'UV' and
+                        ts.texture_coords != 'REFLECTION'):
+                    uv_or_reflection_names.append(ts.texture.name)
+        if len(uv_names) > 0:
+            messages.append((LOG.ERROR,
+                             "UV mapping needed for Materials \"%(m)s\", "
+                             "Textures(s) \"%(t)s\"" % {
+                                 'm': m[MAT.MATERIAL].name,
+                                 't': ', '.join(uv_names)}))
+        if len(uv_or_reflection_names) > 0:
+            messages.append((LOG.ERROR,
+                             "UV or Reflection Mapping needed for Material "
+                             "\"%(m)s\", Textures(s) \"%(t)s\"" % {
+                                 'm': m[MAT.MATERIAL].name,
+                                 't': ', '.join(uv_or_reflection_names)}))
+        return messages
+
+    def rule_hierarchy(self, vd, o):
+        '''if bones in use all meshes need to be part of the hierarchy'''
+        ## if we have bones all meshes must be "connected" to the skeleton
+        if self.root_bone is None:
+            return []
+        p_bone = None
+        p = o.parent
+        #iterate until parent bone or no (further) parent
+        while (p is not None) and (p_bone is None):
+            for tb in self.trainz_bones:
+                if p == tb[TB.BONE]:
+                    p_bone = p
+                    break
+            if p_bone is None:
+                p = p.parent
+        if p is None:
+            return [(LOG.ERROR,
+                     'if Trainz Bones shall be exported, Object "' +
+                     o.name + '" must have a parent')]
+        elif p_bone is None:
+            return [(LOG.ERROR,
+                     "the parent list for " + o.type.capitalize() +
+                     " \"" + o.name + "\" must include at least one "
+                     "Trainz Bone")]
+        return []
+
+    def rule_influences(self, vd, objct):
+        '''check if vertices are influenced by up to 4 vertex groups
+           (trainz maximum is 4 streams) and are normalized'''
+        messages = []
+        ## delete possibly leftover VG from previous check
+        self.remove_vertex_group(objct, VG_NAME.WARNING_TO_MUCH_INFLUENCES)
+        ## vertex indices have to match the unmodified mesh
+        mesh = objct.data
+        md = self.get_mesh_data(objct, evaluated=False)
+        overinfluenced = self.get_weight_matrix(objct, md)[WM.OVERINFLUENCED]
+        ## a) not more than 4 trainz bone groups groups are allowed
+        for vi in overinfluenced:
+            influence_group_names = [
+                objct.vertex_groups[g].name for g, w in md[MD.GROUPS][vi]
+                if objct.vertex_groups[g].name in vd[VD.BONE_NAMES]]
+            messages.append((LOG.WARNING,
+                             "Vertex %(v)i in Mesh \"%(m)s\" is influenced by "
+                             "more than 4 vertex groups:\n\t\t\tObject "
+                             "\"%(o)s\", Vertex Group \"" % {
+                                 'v': vi,
+                                 'm': mesh.name,
+                                 'o': objct.name} +
+                             ("\"\n\t\t\tObject \"%s\",  Vertex "
+                              "Group \"" % objct.name).join(
+                                  influence_group_names)))
+        if len(overinfluenced) > 0:
+            # add vertices to VG "overinfluenced"
+            add_vertices_to_vertexgroup(VG_NAME.WARNING_TO_MUCH_INFLUENCES,
+                                        objct,
+                                        overinfluenced)
+            messages.append((LOG.INFO,
+                             "Vertices with to many influences gathered in "
+                             "Vertex Group \"" +
+                             VG_NAME.WARNING_TO_MUCH_INFLUENCES +
+                             "\" of Object \"" + objct.name + "\", Mesh \"" +
+                             mesh.name + "\""))
+            if get_error_correction() == ERRORHANDLING.CORRECT:
+                messages.append((LOG.INFO,
+                                 "influences of %(n)i Vertices in Object "
+                                 "\"%(o)s\" reduced to the 4 strongest ones "
+                                 "and normalized" % {
+                                     'n': len(overinfluenced),
+                                     'o': objct.name}))
+        return messages
+
     def check_for_unrecommended_characters(self, s):
         '''return a list of all unrecommended characters found in s'''
         complained_chars = []
@@ -2128,41 +4523,38 @@ class TrainzExport:
                 complained_chars.append(c)
         return ''.join(complained_chars)
 
-    def check_names(self):
+    def rule_names(self, vd, subject):
         '''check all exported names for unrecommended chars'''
+        messages = []
         ## attachment names
         for a in self.attachment_points:
             complained_chars = self.check_for_unrecommended_characters(a.name)
             if len(complained_chars) > 0:
-                self.log("Empty \"" + a.name +
-                         "\" contains unrecommended characters: " +
-                         complained_chars,
-                         LOG.INFO)
-        ## material names
-        for m in self.materials:
+                messages.append((LOG.INFO,
+                                 "Empty \"" + a.name +
+                                 "\" contains unrecommended characters: " +
+                                 complained_chars))
+        ## material names and texture paths
+        for material, texture_slots in vd[VD.TEXTURE_SLOTS].items():
             complained_chars = (
-                self.check_for_unrecommended_characters(m[MAT.MATERIAL].name))
+                self.check_for_unrecommended_characters(material.name))
             if len(complained_chars) > 0:
-                self.log("Material \"" + m[MAT.MATERIAL].name +
-                         "\" contains unrecommended characters: " +
-                         complained_chars,
-                         LOG.INFO)
-        ## texture paths
-        for m in self.materials:
-            for i, ts in enumerate(m[MAT.MATERIAL].texture_slots):
-                if (m[MAT.MATERIAL].use_textures[i] and
-                        ts is not None and
-                        ts.texture.type == 'IMAGE' and
+                messages.append((LOG.INFO,
+                                 "Material \"" + material.name +
+                                 "\" contains unrecommended characters: " +
+                                 complained_chars))
+            for ts in texture_slots:
+                if (ts.texture.type == 'IMAGE' and
                         ts.texture.image is not None):
                     complained_chars = (
                         self.check_for_unrecommended_characters(
                             ts.texture.image.filepath))
                     if len(complained_chars) > 0:
-                        self.log("texture path \"" +
-                                 ts.texture.image.filepath +
-                                 "\" contains unrecommended characters: " +
-                                 complained_chars,
-                                 LOG.INFO)
+                        messages.append((LOG.INFO,
+                                         "texture path \"" +
+                                         ts.texture.image.filepath +
+                                         "\" contains unrecommended "
+                                         "characters: " + complained_chars))
         ## bone names
         for b in self.trainz_bones:
             complained_chars = (
@@ -2178,16 +4570,329 @@ class TrainzExport:
                             b[TB.CONTAINER].name +
                             "\" contains unrecommended characters: " +
                             complained_chars)
-                self.log(text, LOG.INFO)
+                messages.append((LOG.INFO, text))
         ## event names
         for e in self.events:
             complained_chars = (
                 self.check_for_unrecommended_characters(e[EVT.TRIGGER]))
             if len(complained_chars) > 0:
-                self.log("Event trigger \"" + e[EVT.TRIGGER] +
-                         "\" contains unrecommended characters: " +
-                         complained_chars,
-                         LOG.INFO)
+                messages.append((LOG.INFO,
+                                 "Event trigger \"" + e[EVT.TRIGGER] +
+                                 "\" contains unrecommended characters: " +
+                                 complained_chars))
+        return messages
+
+    def get_material_state(self, material):
+        '''return everything of material the validation rules look at'''
+        if material not in self.material_states:
+            state = [material.name]
+            for i, ts in enumerate(material.texture_slots):
+                if material.use_textures[i] and (ts is not None):
+                    slot = [ts.texture.name, ts.texture.type,
+                            ts.texture_coords, ts.use_map_alpha,
+                            ts.use_map_specular, ts.use_map_normal,
+                            ts.use_map_color_diffuse]
+                    if (ts.texture.type == 'IMAGE' and
+                            ts.texture.image is not None):
+                        info = self.get_texture_info(ts.texture.image)
+                        slot.extend([ts.texture.image.filepath,
+                                     info.get(TI.MTIME),
+                                     info.get(TI.SIZE),
+                                     ts.texture.image.use_alpha])
+                    state.append(tuple(slot))
+            self.material_states[material] = tuple(state)
+        return self.material_states[material]
+
+    def get_validation_key(self, scope, subject):
+        '''return a content hash over all data the object or material
+        rules check for subject'''
+        if scope == SCOPE.OBJECT:
+            parents = []
+            p = subject.parent
+            while p is not None:
+                parents.append(p.name)
+                p = p.parent
+            state = (subject.name,
+                     self.get_mesh_hash(subject.data),
+                     tuple(g.name for g in subject.vertex_groups),
+                     tuple(self.get_material_state(ms.material)
+                           for ms in subject.material_slots
+                           if ms.material is not None),
+                     subject.data.show_double_sided,
+                     subject.data.uv_textures.active is None,
+                     tuple(parents),
+                     self.root_bone is None,
+                     tuple(sorted(b[TB.BONE].name
+                                  for b in self.trainz_bones)))
+        else:
+            state = (self.get_material_state(subject[MAT.MATERIAL]),
+                     subject[MAT.DOUBLESIDED])
+        return hashlib.sha1(repr(state).encode()).hexdigest()
+
+    def estimate_texture_memory(self):
+        '''estimate the texture memory of the images of all exported
+        materials from their headers, counting identical images once'''
+        filepaths = []
+        for m in self.materials:
+            for ts in get_texture_slots(m[MAT.MATERIAL]):
+                if (ts.texture.type == 'IMAGE' and
+                        ts.texture.image is not None):
+                    filepath = bpy.path.abspath(ts.texture.image.filepath)
+                    if filepath not in filepaths:
+                        filepaths.append(filepath)
+        self.get_texture_infos(filepaths)
+        self.texture_images = collections.OrderedDict()
+        self.texture_memory = 0
+        hashes = set()
+        for filepath in filepaths:
+            info = self.texture_infos[filepath]
+            if TI.HASH in info:
+                if info[TI.HASH] in hashes:
+                    continue  # identical images are exported only once
+                hashes.add(info[TI.HASH])
+            self.texture_images[filepath] = info
+            if TI.FORMAT in info:
+                self.texture_memory += get_texture_memory(info[TI.WIDTH],
+                                                          info[TI.HEIGHT],
+                                                          info[TI.ALPHA])
+
+    def rule_texture_budget(self, vd, subject):
+        '''report the estimated texture memory and flag non power of two
+        or oversized images'''
+        messages = []
+        for filepath, info in self.texture_images.items():
+            if TI.FORMAT not in info:
+                if info[TI.EXISTS]:
+                    messages.append((LOG.INFO,
+                                     "size of image \"" + filepath +
+                                     "\" unknown, not part of the texture "
+                                     "memory"))
+                continue
+            width, height = info[TI.WIDTH], info[TI.HEIGHT]
+            memory = get_texture_memory(width, height, info[TI.ALPHA])
+            messages.append((LOG.ADDINFO,
+                             "%(w)ix%(h)i %(f)s%(a)s, %(m).1f KB: %(p)s" % {
+                                 'w': width,
+                                 'h': height,
+                                 'f': info[TI.FORMAT],
+                                 'a': ' (alpha)' if info[TI.ALPHA] else '',
+                                 'm': memory / 1024.0,
+                                 'p': filepath}))
+            if not (is_power_of_two(width) and is_power_of_two(height)):
+                messages.append((LOG.WARNING,
+                                 "size %(w)ix%(h)i of image \"%(p)s\" is not "
+                                 "a power of two" % {
+                                     'w': width,
+                                     'h': height,
+                                     'p': filepath}))
+            if max(width, height) > TRAINZLIMIT.TEXTURE_SIZE:
+                messages.append((LOG.WARNING,
+                                 "image \"%(p)s\" exceeds %(l)i pixels "
+                                 "(%(w)ix%(h)i)" % {
+                                     'p': filepath,
+                                     'l': TRAINZLIMIT.TEXTURE_SIZE,
+                                     'w': width,
+                                     'h': height}))
+        messages.append((LOG.INFO,
+                         "estimated texture memory (mip mapped): "
+                         "%(m).1f KB in %(n)i image(s)" % {
+                             'm': self.texture_memory / 1024.0,
+                             'n': len(self.texture_images)}))
+        return messages
+
+    def run_rule(self, rule, vd):
+        '''apply rule to all its subjects and return the messages and
+        the number of subjects with a cached result'''
+        name, scope, method = rule
+        if scope == SCOPE.OBJECT:
+            subjects = self.meshes
+        elif scope == SCOPE.MATERIAL:
+            subjects = self.materials
+        else:
+            subjects = [None]
+        messages = []
+        cached = 0
+        for subject in subjects:
+            key = None
+            if scope != SCOPE.SCENE:
+                key = (name, self.get_validation_key(scope, subject))
+                self.validation_keys.add(key)
+                ## only results without any message are cached, so skipping
+                ## the rule can't suppress a message or a correction
+                if key in CACHE.VALIDATION:
+                    cached += 1
+                    continue
+            result = getattr(self, method)(vd, subject)
+            if key is not None and len(result) == 0:
+                self.clean_validation_keys.add(key)
+            messages.extend(result)
+        return messages, cached
+
+    def validate(self):
+        '''run all enabled rules over one shared traversal of the
+        collected data and log their messages and runtimes'''
+        vd = self.collect_validation_data()
+        for rule in VALIDATION_RULES:
+            if not CONFIG.rules.get(rule[0], True):
+                continue
+            start_time = time.time()
+            messages, cached = self.run_rule(rule, vd)
+            ## log every message once
+            logged = []
+            for severity, text in messages:
+                if (severity, text) not in logged:
+                    logged.append((severity, text))
+                    self.log(text, severity)
+            self.validation_results.append({
+                'rule': rule[0],
+                'scope': rule[1],
+                'cached': cached,
+                'seconds': round(time.time() - start_time, 3),
+                'messages': [{'severity': LOG.NAMES[severity],
+                              'text': text} for severity, text in logged]})
+        for result in self.validation_results:
+            self.log("check %(r)s:\t%(s).3f s, %(c)i cached" % {
+                         'r': result['rule'],
+                         's': result['seconds'],
+                         'c': result['cached']},
+                     LOG.ADDINFO)
+        ## keep only the clean results of subjects validated this time
+        CACHE.VALIDATION = set(
+            k for k in CACHE.VALIDATION if k in self.validation_keys)
+        CACHE.VALIDATION.update(self.clean_validation_keys)
+
+    def get_budget(self):
+        '''return the budget report of the written asset'''
+        tl = self.asset_triangle_list
+        vertices = set(v for t in tl[TL.TRIANGLES] for v in t[1:])
+        keyframes = 0
+        if CONFIG.export_animation and AB.STARTFRAME in self.animation_basics:
+            keyframes = len(self.trainz_bones) * max(0, (
+                self.animation_basics[AB.ENDFRAME] -
+                self.animation_basics[AB.STARTFRAME] + 1))
+        ## written files: meshes, their .im files and packaged images
+        files = []
+        for stats in self.mesh_stats.values():
+            files.append(stats['file'])
+            files.append(stats['file'].replace(CONFIG.XMLFILE_EXT,
+                                               CONFIG.IMFILE_EXT))
+        if CONFIG.package_textures:
+            files.extend(set(self.texture_names.values()))
+        files.extend(self.atlases)
+        output = dict((f, os.path.getsize(f)) for f in files
+                      if os.path.exists(f))
+        ## per object breakdown of the asset
+        object_triangles = collections.defaultdict(list)
+        for t, object_id in zip(tl[TL.TRIANGLES], tl[TL.OBJECTS]):
+            object_triangles[object_id].append(t)
+        objects = []
+        for object_id, objct in enumerate(self.meshes):
+            triangles = object_triangles[object_id]
+            objects.append({
+                'name': objct.name,
+                BUDGET.TRIANGLES: len(triangles),
+                BUDGET.VERTICES: len(set(v for t in triangles
+                                         for v in t[1:])),
+                BUDGET.MATERIALS: len(set(t[0] for t in triangles))})
+        return {
+            'exporter': __version__,
+            'file': bpy.data.filepath,
+            'profile': CONFIG.budget_profile,
+            'limits': CONFIG.budget_limits,
+            'totals': {
+                BUDGET.TRIANGLES: len(tl[TL.TRIANGLES]),
+                BUDGET.VERTICES: len(vertices),
+                BUDGET.MATERIALS: len(self.exported_materials),
+                BUDGET.DRAW_CALLS: self.asset_draw_calls,
+                BUDGET.BONES: len(self.trainz_bones),
+                BUDGET.KEYFRAMES: keyframes,
+                BUDGET.TEXTURE_MEMORY: self.texture_memory,
+                BUDGET.OUTPUT_SIZE: sum(output.values())},
+            'meshes': self.mesh_stats,
+            'files': output,
+            'objects': objects}
+
+    def check_budget(self, report):
+        '''log every total of report which exceeds its limit; twice the
+        limit is an error'''
+        if CONFIG.budget_profile not in BUDGET_PROFILES:
+            self.log("unknown budget profile \"" + CONFIG.budget_profile +
+                     "\" ignored", LOG.WARNING)
+        for name in sorted(CONFIG.budget_limits):
+            limit = CONFIG.budget_limits[name]
+            value = report['totals'].get(name)
+            if value is None:
+                self.log("unknown budget \"" + name + "\" ignored",
+                         LOG.WARNING)
+            elif value > limit:
+                if value > limit * BUDGET.ERROR_FACTOR:
+                    severity = LOG.ERROR
+                else:
+                    severity = LOG.WARNING
+                self.log("budget exceeded: %(n)s %(v)g > %(l)g" % {
+                             'n': name,
+                             'v': value,
+                             'l': limit},
+                         severity)
+
+    def write_budget_report(self, report):
+        '''write the budget report as JSON and HTML file'''
+        filename = self.log_filename.replace(CONFIG.LOGFILE_EXT,
+                                             CONFIG.BUDGETFILE_EXT)
+        with open(filename + '.json', mode='w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+        def table(header, rows):
+            return ("<table>\n<tr>" +
+                    "".join("<th>" + html.escape(str(h)) + "</th>"
+                            for h in header) + "</tr>\n" +
+                    "".join("<tr>" + "".join("<td>" + html.escape(str(c)) +
+                                             "</td>" for c in row) +
+                            "</tr>\n" for row in rows) +
+                    "</table>\n")
+
+        totals = report['totals']
+        limits = report['limits']
+        with open(filename + '.html', mode='w', encoding='utf-8') as f:
+            f.write("<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\">"
+                    "<title>" + html.escape(self.get_mesh_name()) +
+                    " budget</title></head>\n<body>\n<h1>" +
+                    html.escape(report['file']) + "</h1>\n<h2>asset (" +
+                    html.escape(report['profile']) + ")</h2>\n")
+            f.write(table(("", "value", "limit"),
+                          ((name, totals[name], limits.get(name, ''))
+                           for name in sorted(totals))))
+            f.write("<h2>meshes</h2>\n")
+            f.write(table(("mesh", "file", BUDGET.TRIANGLES,
+                           BUDGET.VERTICES, BUDGET.DRAW_CALLS),
+                          ((name, m['file'], m[BUDGET.TRIANGLES],
+                            m[BUDGET.VERTICES], m[BUDGET.DRAW_CALLS])
+                           for name, m in sorted(report['meshes'].items()))))
+            f.write("<h2>objects</h2>\n")
+            f.write(table(("object", BUDGET.TRIANGLES, BUDGET.VERTICES,
+                           BUDGET.MATERIALS),
+                          ((o['name'], o[BUDGET.TRIANGLES],
+                            o[BUDGET.VERTICES], o[BUDGET.MATERIALS])
+                           for o in report['objects'])))
+            f.write("<h2>files</h2>\n")
+            f.write(table(("file", "bytes"), sorted(report['files'].items())))
+            f.write("</body>\n</html>\n")
+        self.log("budget report written to \"" + filename + ".json/.html\"",
+                 LOG.INFO)
+
+    def write_validation_report(self):
+        '''write the results of all validation rules as JSON file'''
+        report = {
+            'exporter': __version__,
+            'file': bpy.data.filepath,
+            'status': STATUS.NAMES[self.status],
+            'objects': [o.name for o in self.meshes],
+            'materials': [m[MAT.MATERIAL].name for m in self.materials],
+            'rules': self.validation_results}
+        with open(self.report_filename, mode='w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        self.log("validation report written to \"" + self.report_filename +
+                 "\"", LOG.INFO)
 
     def collect_data(self):
         '''collect and evaluate all data needed to
@@ -2220,6 +4925,70 @@ class TrainzExport:
         self.log(OPTION.EXPORT_MIRROR_AS_EMIT + ":\t\t" +
                  str(CONFIG.export_mirror_as_emit),
                  LOG.ADDINFO)
+        self.log(OPTION.APPLY_MODIFIERS + ":\t\t" +
+                 str(CONFIG.apply_modifiers),
+                 LOG.ADDINFO)
+        self.log(OPTION.VALIDATE_ONLY + ":\t\t" +
+                 str(CONFIG.validate_only),
+                 LOG.ADDINFO)
+        self.log(OPTION.PACKAGE_TEXTURES + ":\t\t" +
+                 str(CONFIG.package_textures),
+                 LOG.ADDINFO)
+        self.log(OPTION.ATLAS_TEXTURES + ":\t\t" +
+                 str(CONFIG.atlas_textures),
+                 LOG.ADDINFO)
+        self.log(OPTION.MERGE_MATERIALS + ":\t\t" +
+                 str(CONFIG.merge_materials),
+                 LOG.ADDINFO)
+        self.log(OPTION.LOD_RATIOS + ":\t\t" +
+                 ', '.join(str(r) for r in CONFIG.lod_ratios),
+                 LOG.ADDINFO)
+        self.log(OPTION.OPTIMIZE_VERTEX_CACHE + ":\t" +
+                 str(CONFIG.optimize_vertex_cache),
+                 LOG.ADDINFO)
+        self.log(OPTION.GROUP_BY_MATERIAL + ":\t\t" +
+                 str(CONFIG.group_by_material),
+                 LOG.ADDINFO)
+        self.log(OPTION.MERGE_STATIC_OBJECTS + ":\t" +
+                 str(CONFIG.merge_static_objects),
+                 LOG.ADDINFO)
+        self.log(OPTION.SHADOW_RATIO + ":\t\t" +
+                 str(CONFIG.shadow_ratio),
+                 LOG.ADDINFO)
+        self.log(OPTION.CHUNK_SIZE + ":\t\t" +
+                 str(CONFIG.chunk_size),
+                 LOG.ADDINFO)
+        self.log(OPTION.CHUNK_TRIANGLES + ":\t\t" +
+                 str(CONFIG.chunk_triangles),
+                 LOG.ADDINFO)
+        self.log(OPTION.BONE_PALETTE + ":\t\t" +
+                 str(CONFIG.bone_palette),
+                 LOG.ADDINFO)
+        self.log(OPTION.VERTEX_LIMIT + ":\t\t" +
+                 str(CONFIG.vertex_limit),
+                 LOG.ADDINFO)
+        self.log(OPTION.BUDGET_REPORT + ":\t\t" +
+                 str(CONFIG.budget_report),
+                 LOG.ADDINFO)
+        self.log(OPTION.BUDGET_PROFILE + ":\t\t" +
+                 str(CONFIG.budget_profile),
+                 LOG.ADDINFO)
+        self.log(OPTION.BUDGET_LIMITS + ":\t\t" +
+                 ', '.join("%s=%g" % (name, CONFIG.budget_limits[name])
+                           for name in sorted(CONFIG.budget_limits)),
+                 LOG.ADDINFO)
+        self.log(OPTION.COMPACT_NUMBERS + ":\t\t" +
+                 str(CONFIG.compact_numbers),
+                 LOG.ADDINFO)
+        self.log(OPTION.NORMAL_DIGITS + ":\t\t" +
+                 str(CONFIG.normal_digits),
+                 LOG.ADDINFO)
+        self.log(OPTION.UV_DIGITS + ":\t\t" +
+                 str(CONFIG.uv_digits),
+                 LOG.ADDINFO)
+        self.log(OPTION.REMOVE_REDUNDANT_TRIANGLES + ":\t" +
+                 str(CONFIG.remove_redundant_triangles),
+                 LOG.ADDINFO)
         self.log("Unit system:\t\t" +
                  str(self.context.scene.unit_settings.system).capitalize(),
                  LOG.ADDINFO)
@@ -2230,7 +4999,7 @@ class TrainzExport:
         ## collect & check bones
         self.console_message('collect and check exportable data')
         self.get_bones()
-        self.get_and_check_root_bone()
+        self.get_root_bone()
         ## collect the rest
         self.get_meshes()
         self.get_materials()
@@ -2238,34 +5007,39 @@ class TrainzExport:
         self.get_animation_basics()
         if CONFIG.export_animation:
             self.get_animation_events()
-        ## check the rest
-        self.check_meshes()
-        self.check_materials()
-        self.check_hierarchy()
-        self.check_influence()
-        self.check_names()
+        ## shared by the texture budget rule and the budget report
+        self.estimate_texture_memory()
+        ## check everything
+        self.validate()
+        self.deduplicate_textures()
         self.console_message('data collected and checked')
         return self.status
 
-    def write_data(self):
-        '''write all data into the export file'''
-
+    def write_xml(self, filename, mesh_name, tl, export_animation):
+        '''write the triangle list tl and the collected data as xml file'''
+        materials = tl.get(TL.MATERIALS, self.exported_materials)
         ## open output file
         self.console_message("create and write xml data")
-        f = open(self.export_filename, mode="w", encoding="utf-8")
+        f = open(filename, mode="w", encoding="utf-8")
         ## write intro
         f.write("<trainzImport>\n" + IND1 + "<version>1</version>\n")
         ## write mesh section
         self.console_message("write mesh section")
-        self.write_mesh_section(f)
+        self.write_mesh_section(f, mesh_name, tl)
+        self.mesh_stats[mesh_name] = {
+            'file': filename,
+            BUDGET.TRIANGLES: len(tl[TL.TRIANGLES]),
+            BUDGET.VERTICES: len(set(v for t in tl[TL.TRIANGLES]
+                                     for v in t[1:])),
+            BUDGET.DRAW_CALLS: self.draw_calls.get(mesh_name, 0)}
         ## write skeleton section
         self.console_message("write skeleton section")
         self.write_skeleton_section(f)
         ## write material section
         self.console_message("write material section")
-        self.write_material_section(f)
+        self.write_material_section(f, materials)
         ## write animation section
-        if CONFIG.export_animation:
+        if export_animation:
             self.console_message("write animation section")
             self.write_animation_section(f)
         ## write outro
@@ -2273,14 +5047,17 @@ class TrainzExport:
         f.close()
         self.console_message("xml data written")
 
-        ## invoke TMI if requested
+    def run_tmi(self, filename, export_animation):
+        '''invoke the TrainzMeshImporter for the xml file filename'''
+        tmi_log_filename = filename.replace(CONFIG.XMLFILE_EXT,
+                                            CONFIG.TMI_LOGFILE_EXT)
         if not CONFIG.only_xml:
             self.console_message("hand over to TrainzMeshImporter:\n")
             if (os.name != 'nt'):
                 self.log(
                     "TrainzMeshImporter.exe can only run on Windows systems. "
                     "Finish after writing XML file"
-                    "(" + self.export_filename + ").",
+                    "(" + filename + ").",
                     LOG.ERROR)
             elif not os.path.exists(SCRIPT.PATH + TMI.FILENAME):
                 self.log(
@@ -2290,23 +5067,23 @@ class TrainzExport:
                 cmd_line = []
                 cmd_line.append(SCRIPT.PATH + TMI.FILENAME)
                 cmd_line.append("-inFile")
-                cmd_line.append(self.export_filename)
+                cmd_line.append(filename)
                 cmd_line.append("-outFile")
-                cmd_line.append(self.export_filename)
+                cmd_line.append(filename)
                 cmd_line.append("-outputIM")
                 cmd_line.append(str(bool(CONFIG.export_mesh)).lower())
                 cmd_line.append("-outputKIN")
-                cmd_line.append(str(bool(CONFIG.export_animation)).lower())
+                cmd_line.append(str(bool(export_animation)).lower())
                 if CONFIG.write_log:
                     cmd_line.append("-log")
-                    cmd_line.append(self.TMI_log_filename)
+                    cmd_line.append(tmi_log_filename)
                 self.log("calling TMI:\t\"" + "\" \"".join(cmd_line) + "\"\n",
                          LOG.INFO)
                 ret_code = subprocess.call(cmd_line)
                 ## merge TMI log into BET log
                 if CONFIG.write_log:
                     ## read TMI log
-                    log_file = open(self.TMI_log_filename)
+                    log_file = open(tmi_log_filename)
                     content = log_file.readlines()
                     log_file.close()
                     ## write into BET log
@@ -2316,16 +5093,146 @@ class TrainzExport:
                     log_file.write("\n")
                     log_file.close()
                     # drop TMI log
-                    while os.path.exists(self.TMI_log_filename):
+                    while os.path.exists(tmi_log_filename):
                         try:
-                            os.remove(self.TMI_log_filename)
+                            os.remove(tmi_log_filename)
                         except:
                             pass
                 if ret_code != 0:
                     self.log("TrainzMeshImporter finished with error(s).",
                              LOG.ERROR)
+
+    def write_data(self):
+        '''write all data into the export file'''
+
+        ## copy the textures into the asset folder
+        if CONFIG.package_textures:
+            self.console_message("package textures")
+            self.package_textures()
+        ## build the exported materials and triangles
+        self.build_material_table()
+        tl = self.build_triangle_list()
+        ## static geometry split into chunks isn't part of the main mesh
+        main = tl
+        if (CONFIG.chunk_size > 0.0) or (CONFIG.chunk_triangles > 0):
+            main = self.write_chunks(tl)
+        if len(main[TL.TRIANGLES]) > 0:
+            self.write_xml(self.export_filename, self.get_mesh_name(),
+                           self.process_triangle_list(main,
+                                                      self.get_mesh_name()),
+                           CONFIG.export_animation)
+            ## invoke TMI if requested
+            self.run_tmi(self.export_filename, CONFIG.export_animation)
+        else:
+            self.log("all triangles written as chunks, no main mesh",
+                     LOG.INFO)
+        self.asset_triangle_list = tl
+        self.asset_draw_calls = sum(self.draw_calls.values())
+        ## write the levels of detail of the main mesh; they are animated
+        ## like the main mesh
+        for level, ratio in enumerate(CONFIG.lod_ratios, 1):
+            if len(main[TL.TRIANGLES]) == 0:
+                break
+            self.console_message("decimate LOD %i" % level)
+            lod = decimate_triangle_list(
+                main, int(len(main[TL.TRIANGLES]) * ratio))
+            self.log("LOD %(l)i (%(r)g): %(n)i of %(t)i triangles" % {
+                         'l': level,
+                         'r': ratio,
+                         'n': len(lod[TL.TRIANGLES]),
+                         't': len(main[TL.TRIANGLES])},
+                     LOG.INFO)
+            suffix = CONFIG.LOD_SUFFIX % level
+            filename = self.export_filename.replace(
+                CONFIG.XMLFILE_EXT, suffix + CONFIG.XMLFILE_EXT)
+            self.write_xml(filename, self.get_mesh_name() + suffix,
+                           self.process_triangle_list(
+                               lod, self.get_mesh_name() + suffix),
+                           CONFIG.export_animation)
+            self.run_tmi(filename, CONFIG.export_animation)
+        ## write the shadow mesh
+        if CONFIG.shadow_ratio > 0.0:
+            self.write_shadow_mesh(tl)
         return self.status
 
+    def write_chunks(self, tl):
+        '''split the static geometry of the triangle list tl into chunks
+        for culling, write each of them as mesh and return the triangle
+        list of the remaining geometry'''
+        self.console_message("split static geometry into chunks")
+        ## objects moved by an animated bone or parent stay in the main
+        ## mesh, which carries the animation
+        chunked = set(object_id for object_id in self.static_objects
+                      if not self.is_object_animated(self.meshes[object_id]))
+        static = [t for t, object_id in enumerate(tl[TL.OBJECTS])
+                  if object_id in chunked]
+        if len(static) == 0:
+            return tl
+        parts = split_triangle_list(tl, static, CONFIG.chunk_size,
+                                    CONFIG.chunk_triangles)
+        for number, part in enumerate(parts):
+            chunk = extract_triangles(tl, part)
+            low, high = get_bounds(chunk[TL.POSITIONS])
+            center = [(low[a] + high[a]) / 2.0 for a in range(3)]
+            radius = max(math.sqrt(sum((p[a] - center[a]) ** 2
+                                       for a in range(3)))
+                         for p in chunk[TL.POSITIONS])
+            suffix = CONFIG.CHUNK_SUFFIX % number
+            self.log("chunk %(c)i: %(n)i triangles, box (%(l)s) - (%(h)s), "
+                     "sphere (%(s)s) r=%(r)s" % {
+                         'c': number,
+                         'n': len(part),
+                         'l': tupel_to_float_str(low),
+                         'h': tupel_to_float_str(high),
+                         's': tupel_to_float_str(center),
+                         'r': STRINGF.F_TO_S.format(radius)},
+                     LOG.INFO)
+            filename = self.export_filename.replace(
+                CONFIG.XMLFILE_EXT, suffix + CONFIG.XMLFILE_EXT)
+            self.write_xml(filename, self.get_mesh_name() + suffix,
+                           self.process_triangle_list(
+                               chunk, self.get_mesh_name() + suffix),
+                           False)
+            self.run_tmi(filename, False)
+        static = set(static)
+        return extract_triangles(tl, [t for t in range(len(tl[TL.OBJECTS]))
+                                      if t not in static])
+
+    def write_shadow_mesh(self, tl):
+        '''derive a simplified mesh with one black material from the
+        triangle list tl and write it with the skeleton of the asset'''
+        self.console_message("build shadow mesh")
+        shadow = build_shadow_triangle_list(tl, CONFIG.SHADOW_DETAIL_SIZE)
+        count = len(shadow[TL.TRIANGLES])
+        if CONFIG.shadow_ratio < 1.0:
+            shadow = decimate_triangle_list(
+                shadow, int(len(tl[TL.TRIANGLES]) * CONFIG.shadow_ratio))
+        self.log("shadow mesh: %(n)i of %(t)i triangles "
+                 "(%(w)i after welding)" % {
+                     'n': len(shadow[TL.TRIANGLES]),
+                     't': len(tl[TL.TRIANGLES]),
+                     'w': count},
+                 LOG.INFO)
+        black = tupel_to_float_str((0.0, 0.0, 0.0))
+        material = {EM.NAME: (CONFIG.SHADOW_SUFFIX[1:] + DECO.DOT +
+                              DECO.MARKER + DECO.NOTEX),
+                    EM.PROPS: {'a': black,
+                               'd': black,
+                               's': black,
+                               'e': black,
+                               'h': 0.0,
+                               'o': 1.0,
+                               't': 'false'},
+                    EM.TEXTURES: []}
+        filename = self.export_filename.replace(
+            CONFIG.XMLFILE_EXT, CONFIG.SHADOW_SUFFIX + CONFIG.XMLFILE_EXT)
+        mesh_name = self.get_mesh_name() + CONFIG.SHADOW_SUFFIX
+        shadow[TL.MATERIALS] = [material]
+        self.write_xml(filename, mesh_name,
+                       self.process_triangle_list(shadow, mesh_name),
+                       False)
+        self.run_tmi(filename, False)
+
     def export(self):
         ''''''
         # start message
@@ -2336,11 +5243,21 @@ class TrainzExport:
         # collect and evaluate data
         self.collect_data()
         # write export files if all is OK
-        if self.status == STATUS.ERROR:
+        if CONFIG.validate_only:
+            self.write_validation_report()
+        elif self.status == STATUS.ERROR:
             self.log("Error(s) during data collection, export aborted.",
                      LOG.INFO)
         else:
             self.write_data()
+            if CONFIG.budget_report or len(CONFIG.budget_limits) > 0:
+                report = self.get_budget()
+                self.check_budget(report)
+                if CONFIG.budget_report:
+                    self.write_budget_report(report)
+        # keep only cache entries used by this export to hold memory flat
+        CACHE.MESH_DATA = dict((k, v) for k, v in CACHE.MESH_DATA.items()
+                               if k in self.mesh_data)
         # restore former project status
         self.restore_state()
         # end message & time
@@ -2451,6 +5368,60 @@ class export_trainz(bpy.types.Operator):
         bpy.props.BoolProperty(name="Export Mirror as Emit",
                                description=("Export mirror color as "
                                             "emit color.")))
+    apply_modifiers = (
+        bpy.props.BoolProperty(name="Apply Modifiers",
+                               description=("Export meshes with their "
+                                            "modifiers (render settings) "
+                                            "applied.")))
+    validate_only = (
+        bpy.props.BoolProperty(name="Validate Only",
+                               description=("Only check the data and write "
+                                            "a JSON report, no export "
+                                            "files are written. Meshes are "
+                                            "not changed: 'correct' error "
+                                            "handling collects instead.")))
+    package_textures = (
+        bpy.props.BoolProperty(name="Package Textures",
+                               description=("Copy all images into the asset "
+                                            "folder, resized to a power of "
+                                            "two, and write texture.txt "
+                                            "files.")))
+    atlas_textures = (
+        bpy.props.BoolProperty(name="Texture Atlases",
+                               description=("Merge compatible one texture "
+                                            "materials by packing their "
+                                            "images into texture atlases.")))
+    merge_materials = (
+        bpy.props.BoolProperty(name="Merge Materials",
+                               description=("Export materials which differ "
+                                            "only by name as one material.")))
+    optimize_vertex_cache = (
+        bpy.props.BoolProperty(name="Optimize Vertex Cache",
+                               description=("Reorder the triangles of each "
+                                            "material for the GPU vertex "
+                                            "cache.")))
+    group_by_material = (
+        bpy.props.BoolProperty(name="Group by Material",
+                               description=("Write the triangles of all "
+                                            "meshes grouped by material.")))
+    merge_static_objects = (
+        bpy.props.BoolProperty(name="Merge Static Objects",
+                               description=("Write the triangles of "
+                                            "objects moved by the same bone "
+                                            "in one batch.")))
+    budget_report = (
+        bpy.props.BoolProperty(name="Budget Report",
+                               description=("Write the performance budget "
+                                            "of the asset as JSON and "
+                                            "HTML file.")))
+    compact_numbers = (
+        bpy.props.BoolProperty(name="Compact Numbers",
+                               description=("Write the vertex values "
+                                            "without trailing zeros.")))
+    remove_redundant_triangles = (
+        bpy.props.BoolProperty(name="Remove Redundant Triangles",
+                               description=("Remove triangles without area "
+                                            "and duplicated triangles.")))
     save_config = (
         bpy.props.BoolProperty(name="save current configuration",
                                description=("make the current configuration "
@@ -2500,6 +5471,76 @@ class export_trainz(bpy.types.Operator):
         self.properties.selection_method = (
             CONFIGFILE.Parser.get(CONFIGFILE.SECTION,
                                   OPTION.SELECTION_METHOD))
+        self.properties.apply_modifiers = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.APPLY_MODIFIERS))
+        for rule in VALIDATION_RULES:
+            CONFIG.rules[rule[0]] = (
+                CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                             OPTION.CHECK_PREFIX + rule[0]))
+        self.properties.validate_only = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.VALIDATE_ONLY))
+        self.properties.package_textures = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.PACKAGE_TEXTURES))
+        self.properties.atlas_textures = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.ATLAS_TEXTURES))
+        self.properties.merge_materials = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.MERGE_MATERIALS))
+        CONFIG.lod_ratios = parse_ratios(
+            CONFIGFILE.Parser.get(CONFIGFILE.SECTION,
+                                  OPTION.LOD_RATIOS))
+        self.properties.optimize_vertex_cache = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.OPTIMIZE_VERTEX_CACHE))
+        self.properties.group_by_material = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.GROUP_BY_MATERIAL))
+        self.properties.merge_static_objects = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.MERGE_STATIC_OBJECTS))
+        CONFIG.shadow_ratio = (
+            CONFIGFILE.Parser.getfloat(CONFIGFILE.SECTION,
+                                       OPTION.SHADOW_RATIO))
+        CONFIG.chunk_size = (
+            CONFIGFILE.Parser.getfloat(CONFIGFILE.SECTION,
+                                       OPTION.CHUNK_SIZE))
+        CONFIG.chunk_triangles = (
+            CONFIGFILE.Parser.getint(CONFIGFILE.SECTION,
+                                     OPTION.CHUNK_TRIANGLES))
+        CONFIG.bone_palette = (
+            CONFIGFILE.Parser.getint(CONFIGFILE.SECTION,
+                                     OPTION.BONE_PALETTE))
+        CONFIG.vertex_limit = (
+            CONFIGFILE.Parser.getint(CONFIGFILE.SECTION,
+                                     OPTION.VERTEX_LIMIT))
+        self.properties.budget_report = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.BUDGET_REPORT))
+        CONFIG.budget_profile = (
+            CONFIGFILE.Parser.get(CONFIGFILE.SECTION,
+                                  OPTION.BUDGET_PROFILE).lower())
+        ## the limits of the profile, single limits may be overridden
+        CONFIG.budget_limits = dict(BUDGET_PROFILES.get(
+            CONFIG.budget_profile, {}))
+        CONFIG.budget_limits.update(parse_limits(
+            CONFIGFILE.Parser.get(CONFIGFILE.SECTION,
+                                  OPTION.BUDGET_LIMITS)))
+        self.properties.compact_numbers = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.COMPACT_NUMBERS))
+        CONFIG.normal_digits = (
+            CONFIGFILE.Parser.getint(CONFIGFILE.SECTION,
+                                     OPTION.NORMAL_DIGITS))
+        CONFIG.uv_digits = (
+            CONFIGFILE.Parser.getint(CONFIGFILE.SECTION,
+                                     OPTION.UV_DIGITS))
+        self.properties.remove_redundant_triangles = (
+            CONFIGFILE.Parser.getboolean(CONFIGFILE.SECTION,
+                                         OPTION.REMOVE_REDUNDANT_TRIANGLES))
         #set default path
         if bpy.data.filepath == '':
             ## default the filepath to "my documents" like blender would do if
@@ -2539,6 +5580,18 @@ class export_trainz(bpy.types.Operator):
         CONFIG.only_xml = self.properties.only_xml
         CONFIG.error_correction = self.properties.error_handling
         CONFIG.selection_method = self.properties.selection_method
+        CONFIG.apply_modifiers = self.properties.apply_modifiers
+        CONFIG.validate_only = self.properties.validate_only
+        CONFIG.package_textures = self.properties.package_textures
+        CONFIG.atlas_textures = self.properties.atlas_textures
+        CONFIG.merge_materials = self.properties.merge_materials
+        CONFIG.optimize_vertex_cache = self.properties.optimize_vertex_cache
+        CONFIG.group_by_material = self.properties.group_by_material
+        CONFIG.merge_static_objects = self.properties.merge_static_objects
+        CONFIG.budget_report = self.properties.budget_report
+        CONFIG.compact_numbers = self.properties.compact_numbers
+        CONFIG.remove_redundant_triangles = (
+            self.properties.remove_redundant_triangles)
         # save config if requested
         if self.properties.save_config:
             # update config file parser
@@ -2573,6 +5626,39 @@ class export_trainz(bpy.types.Operator):
             CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
                                   OPTION.SELECTION_METHOD,
                                   str(CONFIG.selection_method))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.APPLY_MODIFIERS,
+                                  str(CONFIG.apply_modifiers))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.VALIDATE_ONLY,
+                                  str(CONFIG.validate_only))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.PACKAGE_TEXTURES,
+                                  str(CONFIG.package_textures))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.ATLAS_TEXTURES,
+                                  str(CONFIG.atlas_textures))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.MERGE_MATERIALS,
+                                  str(CONFIG.merge_materials))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.OPTIMIZE_VERTEX_CACHE,
+                                  str(CONFIG.optimize_vertex_cache))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.GROUP_BY_MATERIAL,
+                                  str(CONFIG.group_by_material))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.MERGE_STATIC_OBJECTS,
+                                  str(CONFIG.merge_static_objects))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.BUDGET_REPORT,
+                                  str(CONFIG.budget_report))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.COMPACT_NUMBERS,
+                                  str(CONFIG.compact_numbers))
+            CONFIGFILE.Parser.set(CONFIGFILE.SECTION,
+                                  OPTION.REMOVE_REDUNDANT_TRIANGLES,
+                                  str(CONFIG.remove_redundant_triangles))
             # rewrite config file
             with open(SCRIPT.PATH + CONFIG.FILENAME, "w") as f:
                 CONFIGFILE.Parser.write(f)